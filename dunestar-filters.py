@@ -1,91 +1,151 @@
 import os
 import re
+import time
+import argparse
 import json
-from typing import Dict, Tuple
+import warnings
+from typing import Dict, List, Tuple
 from lib.siglent.ssa3021x import Ssa3021xTrace, Ssa3021xTraceSet
-from astropy import units as u
-from astropy.units import Quantity
-import matplotlib.pyplot as plt
+from lib.siglent.trace_cache import TraceCache
+from lib.siglent.loader import load_trace_dir
+from lib.siglent.rejection import FIRST_TRACE, RejectionMatrix, cached_rejection_matrix, rejection_matrix
+from lib.siglent.rejection_store import RejectionStore
+from lib.result_cache import ResultCache
+from lib.siglent.trace_math import TraceMatrix
+from lib.siglent.streaming import capture_key, reduce_files
 import numpy as np
-from path_data import path_data, path_data_measurements
+from path_data import path_data, path_data_measurements, path_output
 import lib.frequency.amateur_bands as amateur_bands
 from lib.frequency.band import FrequencyBand
+from lib.frequency.band_set import BandSet
+from lib.report.figures import s12_figure
+from lib.report.render import FigureJob, render_figures, use_headless
+from lib.lazy_import import lazy_import
 
-def read_trace_data(path_dir: str):
+u = lazy_import('astropy.units')
+
+def read_trace_data(path_dir: str, cache: TraceCache = None, workers: int = None):
     trace_data = {}
-    for file in os.listdir(path_dir):
-        if re.search('\.bz2$', file) is None:
+    for result in load_trace_dir(path_dir=path_dir, pattern=r'\.bz2$', workers=workers, cache=cache):
+        key = re.sub(r'\.csv\.bz2$','',os.path.basename(result.file))
+        if result.error is not None:
+            warnings.warn(UserWarning('failed to read %s: %s' % (result.file, result.error)))
             continue
-        key = re.sub('\.csv\.bz2$','',file)
-        args = {'file': os.path.join(path_dir, file)}
-        trace_data[key] = Ssa3021xTraceSet.from_csv(**args)
+        trace_data[key] = result.trace_set
     return trace_data
 
 
-def compute_s12_losses(trace_data: Dict[str, Ssa3021xTraceSet], bands: Dict[str, FrequencyBand]) -> Dict[Tuple[str], Dict[str, Quantity]]:
+def normalize_trace_data(trace_data: Dict[str, Ssa3021xTraceSet], baseline: List[str],
+                         domain: str = 'log') -> Dict[str, Ssa3021xTraceSet]:
+    # every capture on one grid, relative to the (averaged) baseline captures, which are dropped
+    matrix = TraceMatrix.from_traces({k: x.traces[0] for (k, x) in trace_data.items()})
+    traces = matrix.subtract(baseline, domain=domain).to_traces()
+    return {k: Ssa3021xTraceSet(meta=trace_data[k].meta, traces=[x]) for (k, x) in traces.items()}
+
+
+def compute_s12_losses(trace_data: Dict[str, Ssa3021xTraceSet], bands: Dict[str, FrequencyBand]) -> RejectionMatrix:
     key_list = [x for x in sorted(trace_data.keys()) if re.search('^[0-9]+', x)]
-    s12_loss = {}
-    for i in key_list:
-        trace_i = trace_data[i].traces[0]
-        for k in key_list:
-            m_band = np.logical_and(
-                trace_i.freq.to(u.MHz) > bands[k].low(u.MHz),
-                trace_i.freq.to(u.MHz) < bands[k].high(u.MHz)
-            )
-            filtered_pwr = -1.0 * trace_i.pwr.to(u.dB(u.mW))[m_band].value
-            s12_loss[(i, k)] = {
-                'min': np.min(filtered_pwr) * u.dB(1),
-                'max': np.max(filtered_pwr) * u.dB(1),
-                'avg': np.mean(filtered_pwr)  * u.dB(1)
-            }
-    return s12_loss
-
-def export_s12_losses(s12_loss: Dict[Tuple[str], Dict[str, Quantity]]):
-    key_list = sorted(list({x[0] for x in s12_loss.keys()}))
-
-    # min rejection
-    csv_header = ','.join(['source', *list(key_list)])
-    csv_rows = []
-    for i in key_list:
-        csv_rows.append(','.join([i, *[str(s12_loss[(i, x)]['min'].value) for x in key_list]]))
-    print('Minimum filter rejection:')
-    print(csv_header)
-    for row in csv_rows:
-        print(row)
-
-    # max rejection
-    csv_header = ','.join(['source', *list(key_list)])
-    csv_rows = []
-    for i in key_list:
-        csv_rows.append(','.join([i, *[str(s12_loss[(i, x)]['max'].value) for x in key_list]]))
-    print('Maximum filter rejection:')
-    print(csv_header)
-    for row in csv_rows:
-        print(row)
+    band_set = BandSet.from_bands({k: bands[k] for k in key_list})
+    return rejection_matrix(traces={i: trace_data[i].traces[0] for i in key_list}, bands=band_set)
+
+def stream_s12_losses(path_dir: str, bands: Dict[str, FrequencyBand], workers: int = None) -> RejectionMatrix:
+    # the compute_s12_losses matrix, reduced one capture at a time instead of from traces held in memory
+    files = {capture_key(x): os.path.join(path_dir, x) for x in sorted(os.listdir(path_dir)) if x.endswith('.bz2')}
+    key_list = [x for x in sorted(files) if re.search('^[0-9]+', x)]
+    band_set = BandSet.from_bands({k: bands[k] for k in key_list})
+    reduction = reduce_files([files[k] for k in key_list], band_set, workers=workers)
+    return reduction.to_matrix(rows=key_list)
+
+def cached_s12_losses(path_dir: str, trace_data: Dict[str, Ssa3021xTraceSet], bands: Dict[str, FrequencyBand],
+                      cache: ResultCache) -> RejectionMatrix:
+    # the compute_s12_losses matrix, with rows reused from earlier runs while their capture files are unchanged;
+    # rows that do need computing take their trace from the already loaded trace_data
+    files = {capture_key(x): os.path.join(path_dir, x) for x in sorted(os.listdir(path_dir)) if x.endswith('.bz2')}
+    key_list = [x for x in sorted(trace_data) if re.search('^[0-9]+', x)]
+    band_set = BandSet.from_bands({k: bands[k] for k in key_list})
+    traces = {files[k]: trace_data[k].traces[0] for k in key_list}
+    return cached_rejection_matrix({k: files[k] for k in key_list}, band_set, cache=cache, load=traces.__getitem__,
+                                   load_key=FIRST_TRACE)
+
+def export_s12_losses(s12_loss: RejectionMatrix):
+    key_list = s12_loss.rows
+    csv_header = ','.join(['source', *list(s12_loss.columns)])
+    for (stat, title) in [('min', 'Minimum filter rejection:'), ('max', 'Maximum filter rejection:')]:
+        values = s12_loss.get(stat)
+        print(title)
+        print(csv_header)
+        for (i, row) in enumerate(key_list):
+            print(','.join([row, *[str(x) for x in values[i]]]))
+
+def s12_series(trace_data: Dict[str, Ssa3021xTraceSet]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    return {key: (trace_data[key].traces[0].freq_in(u.MHz).value, np.asarray(trace_data[key].traces[0].pwr_db))
+            for key in sorted(trace_data) if re.search('^[0-9]+', key[0]) is not None}
+
+def s12_figure_jobs(trace_data: Dict[str, Ssa3021xTraceSet]) -> List[FigureJob]:
+    # every filter on one plot, plus one plot per filter
+    series = s12_series(trace_data)
+    jobs = [FigureJob(file='dunestar-s12.png', draw=s12_figure, inputs={'series': series}, dpi=150)]
+    for (key, value) in series.items():
+        jobs.append(FigureJob(file=os.path.join('filters', 's12-%s.png' % key), draw=s12_figure, dpi=150,
+                              inputs={'series': {key: value}, 'title': 'Dunestar %s Filter: S12 Power' % key}))
+    return jobs
 
 def plot_s12_loss_vs_freq(trace_data: Dict[str, Ssa3021xTraceSet]):
-    fig = plt.figure
-    for key in sorted(trace_data):
-        if re.search('^[0-9]+', key[0]) is None:
-            continue
-        plt.plot(trace_data[key].traces[0].freq.to(u.MHz).value, 
-                trace_data[key].traces[0].pwr.to(u.dB(u.mW)).value, label=key)
-    plt.grid('both')
-    plt.xlabel('MHz')
-    plt.ylabel('dB')
-    plt.legend()
-    plt.title('Dunestar Filters: S12 Power')
+    import matplotlib.pyplot as plt
+    s12_figure(plt.figure(), s12_series(trace_data))
     plt.show()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dunestar filter S12 rejection')
+    parser.add_argument('--report', action='store_true', help='render the plots headless instead of showing them')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help='re-render figures whose inputs are unchanged')
+    parser.add_argument('--baseline', nargs='+', default=None,
+                        help='captures to subtract from every filter capture, e.g. nothing or barrel1 barrel2 barrel3')
+    parser.add_argument('--stream', action='store_true',
+                        help='reduce the captures one at a time with bounded memory; prints the tables only')
+    parser.add_argument('--no-result-cache', action='store_true', help='recompute the tables from scratch')
+    parser.add_argument('--export', nargs='?', const=os.path.join(path_output, 'dunestar', 'rejection'), default=None,
+                        help='append both tables as runs to a rejection store (.npy per run, json index, csv)')
+    args = parser.parse_args()
+    if args.stream and (args.baseline or args.report):
+        parser.error('--stream only prints the tables; it cannot be combined with --baseline or --report')
+
     path_dunestar = os.path.join(path_data_measurements, 'dunestar')
     dunestar_bands = amateur_bands.read_bands(os.path.join(path_dunestar, 'band-coverage.json'))
-    trace_data = read_trace_data(path_dir=path_dunestar)
+    if args.stream:
+        s12_loss_full = stream_s12_losses(path_dunestar, amateur_bands.bands, workers=args.workers)
+        s12_loss_cov = stream_s12_losses(path_dunestar, dunestar_bands, workers=args.workers)
+        export_s12_losses(s12_loss=s12_loss_full)
+        export_s12_losses(s12_loss=s12_loss_cov)
+    else:
+        trace_data = read_trace_data(path_dir=path_dunestar, cache=TraceCache(), workers=args.workers)
+        if args.baseline:
+            unknown = [x for x in args.baseline if x not in trace_data]
+            if unknown:
+                parser.error('unknown baseline capture(s): %s' % ', '.join(unknown))
+            trace_data = normalize_trace_data(trace_data, baseline=args.baseline)
 
-    s12_loss_full = compute_s12_losses(trace_data=trace_data, bands=amateur_bands.bands)
-    export_s12_losses(s12_loss=s12_loss_full)
+        if args.baseline or args.no_result_cache:
+            s12_loss_full = compute_s12_losses(trace_data=trace_data, bands=amateur_bands.bands)
+            s12_loss_cov = compute_s12_losses(trace_data=trace_data, bands=dunestar_bands)
+        else:
+            with ResultCache() as result_cache:
+                s12_loss_full = cached_s12_losses(path_dunestar, trace_data, amateur_bands.bands, cache=result_cache)
+                s12_loss_cov = cached_s12_losses(path_dunestar, trace_data, dunestar_bands, cache=result_cache)
+        export_s12_losses(s12_loss=s12_loss_full)
+        export_s12_losses(s12_loss=s12_loss_cov)
 
-    s12_loss_cov = compute_s12_losses(trace_data=trace_data, bands=dunestar_bands)
-    export_s12_losses(s12_loss=s12_loss_cov)
+        if args.report:
+            use_headless()
+            render_figures(s12_figure_jobs(trace_data), path_dir=os.path.join(path_output, 'dunestar'),
+                           workers=args.workers, force=args.force)
+        else:
+            plot_s12_loss_vs_freq(trace_data=trace_data)
 
-    plot_s12_loss_vs_freq(trace_data=trace_data)
+    if args.export:
+        store = RejectionStore(args.export)
+        # the pid keeps runs started in the same second apart
+        run = '%s-%d' % (time.strftime('%Y%m%dT%H%M%S'), os.getpid())
+        store.append(s12_loss_full, name=run + '-full')
+        store.append(s12_loss_cov, name=run + '-coverage')
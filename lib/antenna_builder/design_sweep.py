@@ -0,0 +1,149 @@
+from typing import Dict, Sequence, Union
+import numpy as np
+from astropy import units
+from lib.antenna_builder.length_component import LengthComponent, LengthComponentArray
+from lib.frequency.band import FrequencyBand
+from lib.frequency.band_set import BandSet
+
+SPEED_OF_LIGHT = 299792458.0
+MODES = ('quarter', 'half')
+
+
+def resonant_frequencies(length_m: np.ndarray, mode: str = 'half', harmonics: int = 3,
+                         velocity_factor: float = 0.95) -> np.ndarray:
+    # trailing axis of harmonics: a quarter-wave element resonates at odd multiples of c/4L, a half-wave
+    # element at every multiple of c/2L
+    if mode not in MODES:
+        raise ValueError('unrecognized mode: %s' % mode)
+    if mode == 'quarter':
+        n = 2*np.arange(harmonics) + 1
+        base = velocity_factor * SPEED_OF_LIGHT / 4.0
+    else:
+        n = np.arange(1, harmonics + 1)
+        base = velocity_factor * SPEED_OF_LIGHT / 2.0
+    with np.errstate(divide='ignore'):
+        return base * n / np.asarray(length_m, dtype=np.float64)[..., None]
+
+
+def pareto_front(covered: np.ndarray, detune: np.ndarray, length: np.ndarray) -> np.ndarray:
+    # indices of the configurations no other one beats on all of: more bands covered, less detuning, less wire.
+    # covered takes few values, so each level is a 2-d staircase checked against the staircase of every
+    # higher level with one searchsorted; O(n log n) overall. ties keep the first configuration.
+    keep = []
+    stair_d = np.empty(0)
+    stair_l = np.empty(0)
+    for level in np.unique(covered)[::-1]:
+        idx = np.nonzero(covered == level)[0]
+        srt = idx[np.lexsort((length[idx], detune[idx]))]
+        d = detune[srt]
+        l = length[srt]
+        prior = np.concatenate([[np.inf], np.minimum.accumulate(l)[:-1]])
+        front = l < prior
+        if len(stair_d):
+            pos = np.searchsorted(stair_d, d, side='right') - 1
+            front &= ~((pos >= 0) & (stair_l[np.maximum(pos, 0)] <= l))
+        keep.append(srt[front])
+        stair_d = np.concatenate([stair_d, d[front]])
+        stair_l = np.concatenate([stair_l, l[front]])
+        srt_stair = np.argsort(stair_d, kind='stable')
+        stair_d = stair_d[srt_stair]
+        stair_l = np.minimum.accumulate(stair_l[srt_stair])
+    return np.concatenate(keep) if keep else np.empty(0, dtype=np.intp)
+
+
+class DesignFront:
+    __slots__ = ('targets', 'component_lengths_m', 'element_lengths_m', 'covered', 'detune', 'total_length_m',
+                 'evaluated')
+
+    def __init__(self, targets: BandSet, component_lengths_m: np.ndarray, element_lengths_m: np.ndarray,
+                 covered: np.ndarray, detune: np.ndarray, total_length_m: np.ndarray, evaluated: int):
+        self.targets = targets
+        self.component_lengths_m = component_lengths_m
+        self.element_lengths_m = element_lengths_m
+        self.covered = covered
+        self.detune = detune
+        self.total_length_m = total_length_m
+        self.evaluated = evaluated
+
+    def __len__(self):
+        return len(self.covered)
+
+    @property
+    def num_covered(self) -> np.ndarray:
+        return self.covered.sum(axis=1)
+
+    def bands(self, i: int):
+        return [x for (x, c) in zip(self.targets.names, self.covered[i]) if c]
+
+    def component_lengths(self, i: int, unit: units.Unit = units.m):
+        return (self.component_lengths_m[i] * units.m).to(unit)
+
+
+def _component_grid(components, steps):
+    if isinstance(components, LengthComponentArray):
+        array = components
+    else:
+        array = LengthComponentArray.from_components(components)
+    (lo, hi) = (x.to_value(units.m) for x in array.get_lims(units.m))
+    steps = np.broadcast_to(steps, lo.shape)
+    return [np.linspace(a, b, n) if a < b else np.array([b]) for (a, b, n) in zip(lo, hi, steps)]
+
+
+def sweep_designs(components: Union[LengthComponentArray, Sequence[LengthComponent]],
+                  targets: Union[BandSet, Dict[str, FrequencyBand]], elements: Sequence[Sequence[int]] = None,
+                  mode: str = 'half', harmonics: int = 3, velocity_factor: float = 0.95, tolerance: float = 0.0,
+                  steps: Union[int, Sequence[int]] = 32, min_covered: int = 1, required: Sequence[str] = (),
+                  chunk_size: int = 1 << 16) -> DesignFront:
+    # every combination of adjustable lengths on a grid of steps values between min and max length. each
+    # element is the series of components it is built from (the segments up to a trap, say); a target band is
+    # covered when a resonance of any element falls inside it, widened by the fractional tolerance. configurations
+    # below min_covered or missing a required band are pruned chunk by chunk and only the running pareto front
+    # over (bands covered, mean detuning from band centres, total wire) is kept.
+    if not isinstance(targets, BandSet):
+        targets = BandSet.from_bands(targets)
+    grids = _component_grid(components, steps)
+    num_components = len(grids)
+    if elements is None:
+        elements = [range(num_components)]
+    membership = np.zeros((num_components, len(elements)))
+    for (k, members) in enumerate(elements):
+        membership[list(members), k] = 1.0
+    shape = tuple(len(x) for x in grids)
+    total = int(np.prod(shape))
+    low = targets.low_hz * (1 - tolerance)
+    high = targets.high_hz * (1 + tolerance)
+    center = 0.5 * (targets.low_hz + targets.high_hz)
+    required = np.isin(targets.names, list(required))
+
+    fronts = []
+    for start in range(0, total, chunk_size):
+        index = np.unravel_index(np.arange(start, min(start + chunk_size, total)), shape)
+        lengths = np.column_stack([g[i] for (g, i) in zip(grids, index)])
+        element_lengths = lengths @ membership
+        freq = resonant_frequencies(element_lengths, mode, harmonics, velocity_factor)
+        freq = freq.reshape(len(lengths), -1)[:, :, None]
+        hits = (freq >= low) & (freq <= high)
+        covered = hits.any(axis=1)
+        num_covered = covered.sum(axis=1)
+        keep = (num_covered >= min_covered) & np.all(covered | ~required, axis=1)
+        if not np.any(keep):
+            continue
+        (lengths, element_lengths, covered, num_covered) = (lengths[keep], element_lengths[keep], covered[keep],
+                                                            num_covered[keep])
+        offset = np.where(hits[keep], np.abs(freq[keep] - center) / center, np.inf).min(axis=1)
+        detune = np.where(covered, offset, 0.0).sum(axis=1) / np.maximum(num_covered, 1)
+        wire = lengths.sum(axis=1)
+        fronts.append((lengths, element_lengths, covered, detune, wire))
+        # fold the chunk into the running front so memory stays bounded by the front size
+        merged = [np.concatenate(x) for x in zip(*fronts)]
+        best = pareto_front(merged[2].sum(axis=1), merged[3], merged[4])
+        fronts = [tuple(x[best] for x in merged)]
+
+    if not fronts:
+        empty = np.empty((0, num_components))
+        return DesignFront(targets, empty, np.empty((0, len(elements))), np.empty((0, len(targets)), dtype=bool),
+                           np.empty(0), np.empty(0), total)
+    (lengths, element_lengths, covered, detune, wire) = fronts[0]
+    srt = np.lexsort((wire, detune, -covered.sum(axis=1)))
+    return DesignFront(targets=targets, component_lengths_m=lengths[srt], element_lengths_m=element_lengths[srt],
+                       covered=covered[srt], detune=detune[srt], total_length_m=wire[srt], evaluated=total)
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 import warnings
-from typing import Tuple
+import weakref
+from typing import Iterable, Tuple
+import numpy as np
 from astropy import units
 from astropy.units import Quantity
 
@@ -32,11 +34,38 @@ class LengthComponentUnit:
         if not new_unit.is_equivalent(self._equivalent_unit):
             raise ValueError('unrecognized unit: %s. must to equivalent to %s' % (new_unit, self._equivalent_unit))
         self._unit = new_unit
-        for callback in self._observers:
+        for ref in list(self._observers):
+            callback = ref()
+            if callback is None:
+                self._observers.remove(ref)
+                continue
             callback(self._unit)
 
     def bind_to(self, callback):
-        self._observers.append(callback)
+        # bound methods are held weakly so a discarded component is not kept alive by its unit; other
+        # callables are kept as given
+        if hasattr(callback, '__self__') and hasattr(callback, '__func__'):
+            self._observers.append(weakref.WeakMethod(callback))
+        else:
+            self._observers.append(lambda: callback)
+
+    def unbind(self, callback):
+        self._observers = [x for x in self._observers if x() is not None and x() != callback]
+
+    @property
+    def num_observers(self) -> int:
+        return sum(x() is not None for x in self._observers)
+
+
+def _bind_to_broadcast(owner, broadcast: LengthComponentUnit):
+    # owner adopts the broadcast unit now and follows it through owner._set_length_unit
+    if not isinstance(broadcast, LengthComponentUnit):
+        raise ValueError('broadcast=%s is not of type %s' % (broadcast, LengthComponentUnit))
+    if not broadcast.unit.is_equivalent(units.m):
+        raise ValueError('broadcast unit %s is not a recognized length unit' % broadcast.unit)
+    owner._broadcast = broadcast
+    owner._set_length_unit(broadcast.unit)
+    broadcast.bind_to(owner._set_length_unit)
 
 
 class LengthComponent(ABC):
@@ -46,19 +75,9 @@ class LengthComponent(ABC):
         if not length.unit.is_equivalent(units.m):
             raise ValueError('length unit %s not recognized' % length.unit)
         self._length = length
+        self._broadcast = None
         if broadcast:
-            self._bind_to_broadcast(broadcast, self._set_length_unit)
-        else:
-            self._broadcast = None
-
-    def _bind_to_broadcast(self, broadcast: LengthComponentUnit, callback):
-            if not isinstance(broadcast, LengthComponentUnit):
-                raise ValueError('broadcast=%s is not of type %s' % (broadcast, LengthComponentUnit))
-            if not broadcast.unit.is_equivalent(units.m):
-                raise ValueError('broadcast unit %s is not a recognized length unit' % broadcast.unit)
-            self._broadcast = broadcast
-            self._length = self._length.to(self._broadcast.unit)
-            self._broadcast.bind_to(callback)
+            _bind_to_broadcast(self, broadcast)
 
     def _set_length_unit(self, unit: units.Unit):
         self._length = self._length.to(unit)
@@ -99,13 +118,7 @@ class AdjustableLengthComponent(LengthComponent):
         super().__init__(length=max_length)
         self._min_length = min_length.to(self._length.unit)
         if broadcast:
-            self._bind_to_broadcast(broadcast, self._set_length_unit)
-        else:
-            self._broadcast = None
-
-    def _bind_to_broadcast(self, broadcast: LengthComponentUnit, callback):
-        super()._bind_to_broadcast(broadcast, callback)
-        self._min_length = self._min_length.to(self._broadcast.unit)
+            _bind_to_broadcast(self, broadcast)
 
     def _set_length_unit(self, unit: units.Unit):
         self._length = self._length.to(unit)
@@ -151,4 +164,153 @@ class AdjustableLengthComponent(LengthComponent):
         self._length = convert_quantity(self._length, new_max_length)
 
 
-    
+class LengthComponentArray:
+    # lengths and min lengths of many components in two contiguous arrays, stored in metres and shown in one
+    # shared unit. changing the unit only swaps the unit; values are converted on read with a single
+    # multiply, cached until the next change. fixed marks the components that have a single length (all of
+    # them when no min_length is given, none otherwise); their min length follows their length.
+    def __init__(self, length: Quantity, min_length: Quantity = None, broadcast: LengthComponentUnit = None,
+                 fixed=None):
+        if not isinstance(length, Quantity) or (min_length is not None and not isinstance(min_length, Quantity)):
+            raise TypeError('length and min_length must be quantities')
+        if not length.unit.is_equivalent(units.m) or \
+                (min_length is not None and not min_length.unit.is_equivalent(units.m)):
+            raise ValueError('length unit %s not recognized' % length.unit)
+        length_m = np.array(np.atleast_1d(length.to_value(units.m)), dtype=np.float64)
+        min_m = length_m.copy() if min_length is None else \
+            np.array(np.broadcast_to(min_length.to_value(units.m), length_m.shape), dtype=np.float64)
+        if length_m.ndim != 1:
+            raise ValueError('lengths must be 1-d')
+        if np.any(length_m < min_m):
+            raise ValueError('minimum length is greater than the maximum length')
+        if fixed is None:
+            fixed = min_length is None
+        fixed = np.array(np.broadcast_to(fixed, length_m.shape), dtype=bool)
+        if np.any(min_m[fixed] != length_m[fixed]):
+            raise ValueError('fixed components must have min length equal to their length')
+        self._length_m = length_m
+        self._min_m = min_m
+        self._fixed = fixed
+        self._unit = length.unit
+        self._views = {}
+        self._broadcast = None
+        if broadcast:
+            _bind_to_broadcast(self, broadcast)
+
+    @staticmethod
+    def from_components(components: Iterable[LengthComponent], broadcast: LengthComponentUnit = None):
+        components = list(components)
+        length = [x.length.to_value(units.m) for x in components]
+        min_length = [x.min_length.to_value(units.m) if isinstance(x, AdjustableLengthComponent)
+                      else x.length.to_value(units.m) for x in components]
+        fixed = [not isinstance(x, AdjustableLengthComponent) for x in components]
+        unit = components[0].length.unit if components else units.m
+        # one broadcast observer for the whole collection, rather than one per component
+        return LengthComponentArray(length=(length * units.m).to(unit), min_length=min_length * units.m,
+                                    broadcast=broadcast, fixed=fixed)
+
+    def _set_length_unit(self, unit: units.Unit):
+        self._unit = unit
+        self._views.clear()
+
+    def __len__(self):
+        return len(self._length_m)
+
+    @property
+    def unit(self) -> units.UnitBase:
+        return self._unit
+
+    @unit.setter
+    def unit(self, new_unit: units.UnitBase):
+        if not isinstance(new_unit, units.UnitBase):
+            raise TypeError('assignment must be be of type %s' % units.Unit)
+        if not new_unit.is_equivalent(units.m):
+            raise ValueError('unrecognized unit: %s. must to equivalent to %s' % (new_unit, units.m))
+        self._set_length_unit(new_unit)
+
+    @property
+    def nbytes(self) -> int:
+        return self._length_m.nbytes + self._min_m.nbytes + self._fixed.nbytes
+
+    def _view(self, key: str, values_m: np.ndarray, unit: units.UnitBase = None) -> Quantity:
+        unit = self._unit if unit is None else unit
+        x = self._views.get((key, unit))
+        if x is None:
+            x = Quantity(values_m * units.m.to(unit), unit, copy=False)
+            x.flags.writeable = False
+            self._views[(key, unit)] = x
+        return x
+
+    def get_length(self, unit: units.Unit = None) -> Quantity:
+        return self._view('length', self._length_m, unit)
+
+    def get_lims(self, unit: units.Unit = None) -> Tuple[Quantity, Quantity]:
+        return self._view('min', self._min_m, unit), self._view('length', self._length_m, unit)
+
+    @property
+    def length(self) -> Quantity:
+        return self.get_length()
+
+    @length.setter
+    def length(self, new_length: Quantity):
+        self.set_length(slice(None), new_length)
+
+    @property
+    def min_length(self) -> Quantity:
+        return self._view('min', self._min_m)
+
+    @property
+    def max_length(self) -> Quantity:
+        return self.length
+
+    @property
+    def lims(self) -> Tuple[Quantity, Quantity]:
+        return self.get_lims()
+
+    @property
+    def adjustable(self) -> np.ndarray:
+        return ~self._fixed
+
+    def _to_m(self, value: Quantity) -> np.ndarray:
+        if not isinstance(value, Quantity):
+            raise TypeError('assignment must be of type %s' % units.Quantity)
+        if not value.unit.is_equivalent(units.m):
+            raise ValueError('unrecognized unit: %s. must to equivalent to %s' % (value.unit, units.m))
+        return value.to_value(units.m)
+
+    def set_length(self, index, new_length: Quantity):
+        # fixed components keep min length equal to their length
+        values = np.broadcast_to(self._to_m(new_length), np.shape(self._length_m[index]))
+        fixed = np.asarray(self._fixed[index])
+        min_m = np.array(self._min_m[index])
+        min_m[fixed] = values[fixed]
+        if np.any(values < min_m):
+            raise ValueError('minimum length is greater than the maximum length')
+        self._length_m[index] = values
+        self._min_m[index] = min_m
+        self._views.clear()
+
+    def set_lims(self, index, new_lims: Tuple[Quantity, Quantity]):
+        if len(new_lims) != 2:
+            raise TypeError('lims must be a tuple containing a pair of quantities')
+        (lo, hi) = (self._to_m(x) for x in new_lims)
+        shape = np.shape(self._length_m[index])
+        (lo, hi) = (np.broadcast_to(lo, shape), np.broadcast_to(hi, shape))
+        if np.any(hi < lo):
+            raise ValueError('minimum length is greater than the maximum length')
+        if np.any(self._fixed[index]):
+            raise ValueError('fixed components have no length limits')
+        self._min_m[index] = lo
+        self._length_m[index] = hi
+        self._views.clear()
+
+    def component(self, i: int) -> LengthComponent:
+        # a standalone copy of one entry
+        (lo, hi) = (self._min_m[i] * units.m).to(self._unit), (self._length_m[i] * units.m).to(self._unit)
+        if self._fixed[i]:
+            return FixedLengthComponent(length=hi, broadcast=self._broadcast)
+        return AdjustableLengthComponent(min_length=lo, max_length=hi, broadcast=self._broadcast)
+
+    def total_length(self, unit: units.Unit = None) -> Quantity:
+        unit = self._unit if unit is None else unit
+        return (self._length_m.sum() * units.m).to(unit)
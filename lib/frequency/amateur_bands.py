@@ -1,6 +1,6 @@
 import os
 import json
-from astropy import units as u
+from functools import lru_cache
 from lib.frequency.band import FrequencyBand
 from path_data import path_data
 
@@ -8,8 +8,22 @@ def read_bands(file) -> dict:
     with open(file, 'r') as f:
         bands_raw = json.load(f)
 
-    return {x: FrequencyBand(low=y['lowerMhz'] * u.MHz, high=y['upperMhz'] * u.MHz) 
+    return {x: FrequencyBand.from_hz(low=y['lowerMhz'] * 1e6, high=y['upperMhz'] * 1e6)
             for (x,y) in bands_raw.items()}
-    
 
-bands = read_bands(file=os.path.join(path_data, 'bands.json'))
+
+def read_band_set(file):
+    from lib.frequency.band_set import BandSet
+    return BandSet.from_json(file)
+
+
+@lru_cache(maxsize=None)
+def get_bands() -> dict:
+    return read_bands(file=os.path.join(path_data, 'bands.json'))
+
+
+def __getattr__(name):
+    # `bands` is read on first access instead of at import time
+    if name == 'bands':
+        return get_bands()
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
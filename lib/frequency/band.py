@@ -1,61 +1,114 @@
-from sympy import Interval
-from astropy import units as u
-from astropy.units import Quantity
+from __future__ import annotations
+from lib import profiling
+from lib.lazy_import import lazy_import
+
+u = lazy_import('astropy.units')
 
 class FrequencyBand:
-    def __init__(self, low: Quantity, high: Quantity):
+    __slots__ = ('_low', '_high', '_hash', '_cache')
+
+    def __init__(self, low: u.Quantity, high: u.Quantity):
         if len(low.shape) != 0 or len(high.shape) != 0:
             raise ValueError('inputs must be scalar')
-        self._interval = Interval(start=low.to(u.Hz).value, 
-                                  end=high.to(u.Hz).value,
-                                  left_open=False,
-                                  right_open=False)
+        self._init_hz(float(low.to_value(u.Hz)), float(high.to_value(u.Hz)))
+
+    def _init_hz(self, low: float, high: float):
+        object.__setattr__(self, '_low', low)
+        object.__setattr__(self, '_high', high)
+        object.__setattr__(self, '_hash', hash((low, high)))
+        object.__setattr__(self, '_cache', {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FrequencyBand is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('FrequencyBand is immutable')
+
+    def __reduce__(self):
+        return FrequencyBand.from_hz, (self._low, self._high)
+
+    def __eq__(self, other):
+        if type(other) != FrequencyBand:
+            return NotImplemented
+        return self._low == other._low and self._high == other._high
+
+    def __hash__(self):
+        return self._hash
 
-    def low(self, unit: u.Unit = u.Hz):
-        return (float(self._interval.start) * u.Hz).to(unit)
+    @property
+    def low_hz(self) -> float:
+        return self._low
 
-    def high(self, unit: u.Unit = u.Hz):
-        return (float(self._interval.end) * u.Hz).to(unit)
+    @property
+    def high_hz(self) -> float:
+        return self._high
 
-    def tuple(self, unit: u.Unit = u.Hz):
+    def _quantity(self, value: float, unit: u.Unit, key: str):
+        if unit is None:
+            unit = u.Hz
+        cache_key = (key, unit)
+        q = self._cache.get(cache_key)
+        if q is None:
+            q = self._cache[cache_key] = _hz_quantity(value, unit)
+        return q
+
+    def low(self, unit: u.Unit = None):
+        return self._quantity(self._low, unit, 'low')
+
+    def high(self, unit: u.Unit = None):
+        return self._quantity(self._high, unit, 'high')
+
+    def tuple(self, unit: u.Unit = None):
         return self.low(unit), self.high(unit)
 
-    def bandwidth(self, unit: u.Unit = u.Hz):
-        x = self.tuple(unit=unit)
-        return x[1] - x[0]
+    def bandwidth(self, unit: u.Unit = None):
+        return self._quantity(self._high - self._low, unit, 'bandwidth')
 
-    def center(self, unit: u.Unit = u.Hz):
-        x = self.tuple(unit=unit)
-        return x[0] + 0.5*(self.bandwidth(unit=unit))
+    def center(self, unit: u.Unit = None):
+        return self._quantity(self._low + 0.5*(self._high - self._low), unit, 'center')
 
     def __str__(self):
-        return '(%g Hz, %g Hz)' % (self._interval.start, self._interval.end)
+        return '(%g Hz, %g Hz)' % (self._low, self._high)
+
+    def __repr__(self):
+        return 'FrequencyBand%s' % self
 
+    @profiling.timed('band_intersect')
     def intersect(self, x):
         if type(x) != FrequencyBand:
             raise ValueError('input must be of type FrequencyBand')
-        new_interval = self._interval.intersect(x._interval)
-        if type(new_interval) != Interval:
+        # closed intervals that only touch at an endpoint degenerate to a point, not a band
+        low = max(self._low, x._low)
+        high = min(self._high, x._high)
+        if not low < high:
             return None
-        return FrequencyBand.from_interval(x=new_interval, unit=u.Hz)
+        return FrequencyBand.from_hz(low, high)
 
-    def buffer(self, x: Quantity):
-        x_hz = x.to(u.Hz)
-        new_low = float(self._interval.start) * u.Hz - x_hz
-        new_high = float(self._interval.end) * u.Hz + x_hz
-        return FrequencyBand(low=new_low, high=new_high)
+    def buffer(self, x: u.Quantity):
+        x_hz = float(x.to_value(u.Hz))
+        return FrequencyBand.from_hz(self._low - x_hz, self._high + x_hz)
 
     def harmonic(self, n: int):
         if n < 1:
             raise ValueError('harmonic input must be positive non-zero integer')
-        new_low = float(self._interval.start) * u.Hz * n
-        new_high = float(self._interval.end) * u.Hz * n
-        return FrequencyBand(low=new_low, high=new_high)
+        return FrequencyBand.from_hz(self._low * n, self._high * n)
 
     @staticmethod
-    def from_interval(x: Interval, unit: u.Unit):
+    def from_hz(low: float, high: float):
+        band = FrequencyBand.__new__(FrequencyBand)
+        band._init_hz(float(low), float(high))
+        return band
+
+    @staticmethod
+    def from_interval(x, unit: u.Unit):
         return FrequencyBand(low=float(x.start) * unit, high=float(x.end) * unit)
 
+@profiling.timed('band_units')
+def _hz_quantity(value: float, unit: u.Unit):
+    q = (value * u.Hz).to(unit)
+    q.flags.writeable = False
+    return q
+
 if __name__ == '__main__':
     x = FrequencyBand(low=1.0 * u.MHz, high=5.0 * u.MHz)
     y = FrequencyBand(low=2.5 * u.MHz, high=7.0 * u.MHz)
@@ -72,4 +125,4 @@ if __name__ == '__main__':
     print(b)
 
     c = x.harmonic(3)
-    print(c)
\ No newline at end of file
+    print(c)
@@ -0,0 +1,70 @@
+from typing import Tuple
+import numpy as np
+from lib.frequency.band_set import BandSet
+from lib.lazy_import import lazy_import
+
+u = lazy_import('astropy.units')
+
+NO_BAND = -1
+
+
+class BandIndex:
+    # the sorted unique band edges split the axis into atoms: atom 2i is the open gap below edge i and atom
+    # 2i + 1 is edge i itself. every atom is covered by a fixed set of bands, stored in csr form, so a lookup
+    # is one searchsorted plus a gather and closed band edges are honoured exactly.
+    __slots__ = ('bands', '_edges', '_indptr', '_members')
+
+    def __init__(self, bands: BandSet):
+        self.bands = bands
+        edges = np.unique(np.concatenate([bands.low_hz, bands.high_hz]))
+        valid = np.nonzero(bands.low_hz <= bands.high_hz)[0]
+        first = 2*np.searchsorted(edges, bands.low_hz[valid]) + 1
+        last = 2*np.searchsorted(edges, bands.high_hz[valid]) + 1
+        count = last - first + 1
+        atom = np.repeat(first - np.cumsum(count) + count, count) + np.arange(count.sum())
+        member = np.repeat(valid, count)
+        srt = np.lexsort((member, atom))
+        self._edges = edges
+        self._members = member[srt]
+        self._indptr = np.zeros(2*len(edges) + 2, dtype=np.intp)
+        np.cumsum(np.bincount(atom, minlength=2*len(edges) + 1), out=self._indptr[1:])
+
+    @staticmethod
+    def from_json(file: str):
+        return BandIndex(BandSet.from_json(file))
+
+    def _atoms(self, freq) -> np.ndarray:
+        # duck-typed so plain arrays never pull in astropy
+        if hasattr(freq, 'to_value'):
+            freq = freq.to_value(u.Hz)
+        freq = np.asarray(freq, dtype=np.float64)
+        if len(self._edges) == 0:
+            return np.zeros(freq.shape, dtype=np.intp)
+        i = np.searchsorted(self._edges, freq, side='left')
+        on_edge = self._edges[np.minimum(i, len(self._edges) - 1)] == freq
+        return 2*i + on_edge
+
+    def count(self, freq) -> np.ndarray:
+        atoms = self._atoms(freq)
+        return self._indptr[atoms + 1] - self._indptr[atoms]
+
+    def matches(self, freq) -> Tuple[np.ndarray, np.ndarray]:
+        atoms = np.ravel(self._atoms(freq))
+        start = self._indptr[atoms]
+        count = self._indptr[atoms + 1] - start
+        point = np.repeat(np.arange(len(atoms)), count)
+        pos = np.repeat(start - np.cumsum(count) + count, count) + np.arange(count.sum())
+        return point, self._members[pos]
+
+    def first(self, freq) -> np.ndarray:
+        atoms = self._atoms(freq)
+        start = self._indptr[atoms]
+        found = self._indptr[atoms + 1] > start
+        if len(self._members) == 0:
+            return np.full(atoms.shape, NO_BAND)
+        return np.where(found, self._members[np.minimum(start, len(self._members) - 1)], NO_BAND)
+
+    def labels(self, freq, no_band: str = None) -> np.ndarray:
+        # NO_BAND indexes the trailing no_band entry
+        names = np.array([*self.bands.names, no_band], dtype=object)
+        return names[self.first(freq)]
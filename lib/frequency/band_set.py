@@ -0,0 +1,185 @@
+from __future__ import annotations
+import json
+from typing import Dict, Iterable, NamedTuple, Sequence
+import numpy as np
+from lib import profiling
+from lib.frequency.band import FrequencyBand
+from lib.lazy_import import lazy_import
+
+u = lazy_import('astropy.units')
+
+
+def _frozen(x) -> np.ndarray:
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    x.flags.writeable = False
+    return x
+
+
+def _overlap_join(a_low: np.ndarray, a_high: np.ndarray, b_low: np.ndarray, b_high: np.ndarray):
+    # sweep-line join: sort a by low edge and keep a running max of its high edges, then every
+    # b interval selects its candidates [start, stop) with two binary searches. the candidate
+    # count only exceeds the true overlap count where intervals in a are nested.
+    empty = np.zeros(0, dtype=np.intp)
+    if len(a_low) == 0 or len(b_low) == 0:
+        return empty, empty
+    srt = np.argsort(a_low, kind='stable')
+    low = a_low[srt]
+    high = a_high[srt]
+    high_max = np.maximum.accumulate(high)
+    # closed intervals: only a positive-width overlap counts, matching FrequencyBand.intersect
+    stop = np.searchsorted(low, b_high, side='left')
+    start = np.searchsorted(high_max, b_low, side='right')
+    count = np.maximum(stop - start, 0)
+    total = int(count.sum())
+    if total == 0:
+        return empty, empty
+    right = np.repeat(np.arange(len(b_low)), count)
+    pos = np.repeat(start - (np.cumsum(count) - count), count) + np.arange(total)
+    keep = high[pos] > b_low[right]
+    left = srt[pos[keep]]
+    right = right[keep]
+    order = np.lexsort((right, left))
+    return left[order], right[order]
+
+
+class BandOverlap(NamedTuple):
+    left: np.ndarray
+    right: np.ndarray
+    low_hz: np.ndarray
+    high_hz: np.ndarray
+
+    def __len__(self):
+        return len(self.left)
+
+    @property
+    def bandwidth_hz(self) -> np.ndarray:
+        return self.high_hz - self.low_hz
+
+
+class BandSet:
+    __slots__ = ('_names', '_low', '_high', '_order')
+
+    def __init__(self, names: Sequence[str], low_hz, high_hz, order=None):
+        low_hz = _frozen(low_hz)
+        high_hz = _frozen(high_hz)
+        if low_hz.ndim != 1 or low_hz.shape != high_hz.shape:
+            raise ValueError('low and high must be 1-d arrays of the same length')
+        if len(names) != len(low_hz):
+            raise ValueError('expected %d names, got %d' % (len(low_hz), len(names)))
+        if order is None:
+            order = np.ones(len(low_hz), dtype=np.int64)
+        order = np.ascontiguousarray(order, dtype=np.int64)
+        if order.shape != low_hz.shape:
+            raise ValueError('order must be a 1-d array of the same length as the bands')
+        order.flags.writeable = False
+        self._names = tuple(names)
+        self._low = low_hz
+        self._high = high_hz
+        self._order = order
+
+    @staticmethod
+    def from_bands(bands: Dict[str, FrequencyBand]):
+        names = list(bands.keys())
+        low = np.fromiter((x.low_hz for x in bands.values()), dtype=np.float64, count=len(names))
+        high = np.fromiter((x.high_hz for x in bands.values()), dtype=np.float64, count=len(names))
+        return BandSet(names=names, low_hz=low, high_hz=high)
+
+    @staticmethod
+    def from_dict(bands_raw: dict):
+        names = list(bands_raw.keys())
+        low = np.array([bands_raw[x]['lowerMhz'] for x in names], dtype=np.float64) * 1e6
+        high = np.array([bands_raw[x]['upperMhz'] for x in names], dtype=np.float64) * 1e6
+        return BandSet(names=names, low_hz=low, high_hz=high)
+
+    @staticmethod
+    def from_json(file: str):
+        with open(file, 'r') as f:
+            return BandSet.from_dict(json.load(f))
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self.index(key)
+        if isinstance(key, (int, np.integer)):
+            return FrequencyBand.from_hz(self._low[key], self._high[key])
+        key = np.arange(len(self))[key]
+        return BandSet(names=[self._names[i] for i in key], low_hz=self._low[key],
+                       high_hz=self._high[key], order=self._order[key])
+
+    def index(self, name: str) -> int:
+        try:
+            return self._names.index(name)
+        except ValueError:
+            raise ValueError('unrecognized band: %s' % name) from None
+
+    def __str__(self):
+        return '\n'.join('%s: (%g Hz, %g Hz)' % x for x in zip(self._names, self._low, self._high))
+
+    @property
+    def names(self):
+        return self._names
+
+    @property
+    def order(self) -> np.ndarray:
+        return self._order
+
+    @property
+    def low_hz(self) -> np.ndarray:
+        return self._low
+
+    @property
+    def high_hz(self) -> np.ndarray:
+        return self._high
+
+    def low(self, unit: u.Unit = None) -> u.Quantity:
+        return (self._low * u.Hz).to(u.Hz if unit is None else unit)
+
+    def high(self, unit: u.Unit = None) -> u.Quantity:
+        return (self._high * u.Hz).to(u.Hz if unit is None else unit)
+
+    def bandwidth(self, unit: u.Unit = None) -> u.Quantity:
+        return ((self._high - self._low) * u.Hz).to(u.Hz if unit is None else unit)
+
+    def center(self, unit: u.Unit = None) -> u.Quantity:
+        return ((self._low + 0.5*(self._high - self._low)) * u.Hz).to(u.Hz if unit is None else unit)
+
+    def to_dict(self) -> Dict[str, FrequencyBand]:
+        if len(set(self._names)) != len(self._names):
+            raise ValueError('band names are not unique')
+        return {x: FrequencyBand.from_hz(lo, hi) for (x, lo, hi) in zip(self._names, self._low, self._high)}
+
+    def buffer(self, x: u.Quantity):
+        x_hz = float(x.to_value(u.Hz))
+        return BandSet(names=self._names, low_hz=self._low - x_hz, high_hz=self._high + x_hz, order=self._order)
+
+    def harmonics(self, orders: Iterable[int]):
+        orders = np.asarray(list(orders), dtype=np.int64)
+        if np.any(orders < 1):
+            raise ValueError('harmonic input must be positive non-zero integer')
+        # band-major layout: all requested orders of band 0, then band 1, ...
+        low = np.multiply.outer(self._low, orders).ravel()
+        high = np.multiply.outer(self._high, orders).ravel()
+        order = np.multiply.outer(self._order, orders).ravel()
+        names = [x for x in self._names for _ in range(len(orders))]
+        return BandSet(names=names, low_hz=low, high_hz=high, order=order)
+
+    def overlapping(self, band: FrequencyBand):
+        mask = np.logical_and(self._low < band.high_hz, self._high > band.low_hz)
+        return self[mask]
+
+    @profiling.timed('band_intersect', nbytes=lambda x: x.left.nbytes + x.right.nbytes)
+    def intersect(self, other) -> BandOverlap:
+        if isinstance(other, FrequencyBand):
+            other = BandSet(names=[''], low_hz=[other.low_hz], high_hz=[other.high_hz])
+        if not isinstance(other, BandSet):
+            raise ValueError('input must be of type BandSet or FrequencyBand')
+        left, right = _overlap_join(self._low, self._high, other._low, other._high)
+        return BandOverlap(left=left,
+                           right=right,
+                           low_hz=np.maximum(self._low[left], other._low[right]),
+                           high_hz=np.minimum(self._high[left], other._high[right]))
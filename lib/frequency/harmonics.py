@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, Tuple
+import numpy as np
+from lib.frequency.band import FrequencyBand
+from lib.frequency.band_set import BandSet
+
+# part of every cached_harmonic_overlaps key; bump it when harmonic_overlaps changes what it computes
+HARMONICS_VERSION = 1
+
+
+class HarmonicOverlaps:
+    __slots__ = ('rx_bands', 'tx_bands', 'rx', 'tx', 'order', 'low_hz', 'high_hz')
+
+    def __init__(self, rx_bands: BandSet, tx_bands: BandSet, rx: np.ndarray, tx: np.ndarray,
+                 order: np.ndarray, low_hz: np.ndarray, high_hz: np.ndarray):
+        self.rx_bands = rx_bands
+        self.tx_bands = tx_bands
+        self.rx = rx
+        self.tx = tx
+        self.order = order
+        self.low_hz = low_hz
+        self.high_hz = high_hz
+
+    def __len__(self):
+        return len(self.rx)
+
+    def __iter__(self):
+        for (i, k, n, lo, hi) in zip(self.rx, self.tx, self.order, self.low_hz, self.high_hz):
+            yield self.rx_bands.names[i], self.tx_bands.names[k], int(n), FrequencyBand.from_hz(lo, hi)
+
+    @property
+    def bandwidth_hz(self) -> np.ndarray:
+        return self.high_hz - self.low_hz
+
+    def select(self, mask):
+        return HarmonicOverlaps(rx_bands=self.rx_bands, tx_bands=self.tx_bands, rx=self.rx[mask],
+                                tx=self.tx[mask], order=self.order[mask], low_hz=self.low_hz[mask],
+                                high_hz=self.high_hz[mask])
+
+    def for_rx(self, rx_band: str):
+        return self.select(self.rx == self.rx_bands.index(rx_band))
+
+    def for_tx(self, tx_band: str):
+        return self.select(self.tx == self.tx_bands.index(tx_band))
+
+    def to_dict(self) -> Dict[Tuple[str, str, int], FrequencyBand]:
+        return {(rx_id, tx_id, n): x for (rx_id, tx_id, n, x) in self}
+
+
+def harmonic_overlaps(rx_bands: BandSet, tx_bands: BandSet, orders: Iterable[int]) -> HarmonicOverlaps:
+    orders = list(orders)
+    harmonics = tx_bands.harmonics(orders)
+    overlap = rx_bands.intersect(harmonics)
+    # BandSet.harmonics lays out every requested order of a band contiguously
+    return HarmonicOverlaps(rx_bands=rx_bands,
+                            tx_bands=tx_bands,
+                            rx=overlap.left,
+                            tx=overlap.right // max(1, len(orders)),
+                            order=harmonics.order[overlap.right],
+                            low_hz=overlap.low_hz,
+                            high_hz=overlap.high_hz)
+
+
+def cached_harmonic_overlaps(rx_bands: BandSet, tx_bands: BandSet, orders: Iterable[int],
+                             cache) -> HarmonicOverlaps:
+    # harmonic_overlaps memoized in a ResultCache under the band definitions and orders
+    from lib.result_cache import fingerprint
+    orders = [int(x) for x in orders]
+    key = fingerprint('harmonic-overlaps', HARMONICS_VERSION, list(rx_bands.names), rx_bands.low_hz, rx_bands.high_hz, rx_bands.order,
+                      list(tx_bands.names), tx_bands.low_hz, tx_bands.high_hz, tx_bands.order, orders)
+
+    def compute():
+        x = harmonic_overlaps(rx_bands, tx_bands, orders)
+        return {'rx': x.rx, 'tx': x.tx, 'order': x.order, 'low_hz': x.low_hz, 'high_hz': x.high_hz}
+
+    return HarmonicOverlaps(rx_bands=rx_bands, tx_bands=tx_bands, **cache.memoize(key, compute))
@@ -0,0 +1,145 @@
+import itertools
+from typing import List
+import numpy as np
+from lib.frequency.band import FrequencyBand
+from lib.frequency.band_set import BandSet, BandOverlap, _overlap_join
+
+
+def _magnitudes(num_tx: int, budget: int):
+    if num_tx == 0:
+        yield ()
+        return
+    for m in range(1, budget - num_tx + 2):
+        for rest in _magnitudes(num_tx - 1, budget - m):
+            yield (m, *rest)
+
+
+def coefficient_patterns(num_tx: int, max_order: int, min_order: int = 2) -> np.ndarray:
+    # every vector of non-zero integer coefficients with min_order <= sum(|c|) <= max_order. a vector
+    # and its negation describe the same product, so only vectors with a positive first entry are kept.
+    patterns = []
+    for mags in _magnitudes(num_tx, max_order):
+        if sum(mags) < min_order:
+            continue
+        for signs in itertools.product((1, -1), repeat=num_tx - 1):
+            patterns.append((mags[0], *[s * m for (s, m) in zip(signs, mags[1:])]))
+    return np.array(patterns, dtype=np.int64).reshape(-1, num_tx)
+
+
+def _merged(low: np.ndarray, high: np.ndarray):
+    # union of the victim bands as sorted, disjoint intervals
+    srt = np.argsort(low)
+    low = low[srt]
+    high = np.maximum.accumulate(high[srt])
+    start = np.concatenate([[True], low[1:] > high[:-1]])
+    stop = np.concatenate([start[1:], [True]])
+    return low[start], high[stop]
+
+
+def _touches(low: np.ndarray, high: np.ndarray, union_low: np.ndarray, union_high: np.ndarray) -> np.ndarray:
+    i = np.searchsorted(union_low, high, side='left') - 1
+    return np.logical_and(i >= 0, union_high[np.maximum(i, 0)] > low)
+
+
+class IntermodProducts:
+    __slots__ = ('tx_bands', 'victim_bands', 'tx', 'coeff', 'order', 'low_hz', 'high_hz', 'overlaps')
+
+    def __init__(self, tx_bands: BandSet, victim_bands: BandSet, tx: np.ndarray, coeff: np.ndarray,
+                 order: np.ndarray, low_hz: np.ndarray, high_hz: np.ndarray, overlaps: BandOverlap = None):
+        self.tx_bands = tx_bands
+        self.victim_bands = victim_bands
+        self.tx = tx
+        self.coeff = coeff
+        self.order = order
+        self.low_hz = low_hz
+        self.high_hz = high_hz
+        self.overlaps = overlaps
+
+    def __len__(self):
+        return len(self.order)
+
+    def band(self, i: int) -> FrequencyBand:
+        return FrequencyBand.from_hz(self.low_hz[i], self.high_hz[i])
+
+    def describe(self, i: int) -> str:
+        terms = []
+        for (k, c) in zip(self.tx[i], self.coeff[i]):
+            if c == 0:
+                continue
+            sign = '-' if c < 0 else ('+' if terms else '')
+            terms.append('%s%s%s' % (sign, '' if abs(c) == 1 else '%d*' % abs(c), self.tx_bands.names[k]))
+        return ''.join(terms)
+
+
+def intermod_products(tx_bands: BandSet, max_order: int, victim_bands: BandSet = None, min_order: int = 2,
+                      max_transmitters: int = None, chunk_size: int = 1 << 20) -> IntermodProducts:
+    if max_order < min_order or min_order < 1:
+        raise ValueError('orders must satisfy 1 <= min_order <= max_order')
+    num_k = min(len(tx_bands), max_order, max_transmitters or max_order)
+    if victim_bands is not None and len(victim_bands):
+        union_low, union_high = _merged(victim_bands.low_hz, victim_bands.high_hz)
+    else:
+        union_low = union_high = None
+
+    found_tx: List[np.ndarray] = []
+    found_coeff: List[np.ndarray] = []
+    found_low: List[np.ndarray] = []
+    found_high: List[np.ndarray] = []
+    for k in range(1, num_k + 1):
+        patterns = coefficient_patterns(num_tx=k, max_order=max_order, min_order=min_order)
+        if len(patterns) == 0:
+            continue
+        p_pos = np.maximum(patterns, 0).T.astype(np.float64)
+        p_neg = np.maximum(-patterns, 0).T.astype(np.float64)
+        combos = itertools.combinations(range(len(tx_bands)), k)
+        rows = max(1, chunk_size // len(patterns))
+        while True:
+            chunk = np.fromiter(itertools.chain.from_iterable(itertools.islice(combos, rows)), dtype=np.intp)
+            if len(chunk) == 0:
+                break
+            chunk = chunk.reshape(-1, k)
+            lo = tx_bands.low_hz[chunk]
+            hi = tx_bands.high_hz[chunk]
+            # interval arithmetic: positive terms take the same edge, negative terms the opposite one
+            low = (lo @ p_pos - hi @ p_neg).ravel()
+            high = (hi @ p_pos - lo @ p_neg).ravel()
+            # products are observed at |f|; a band straddling zero reaches down to dc
+            flip = high <= 0
+            low[flip], high[flip] = -high[flip], -low[flip]
+            straddle = low < 0
+            high[straddle] = np.maximum(-low[straddle], high[straddle])
+            low[straddle] = 0.0
+            if union_low is not None:
+                keep = np.nonzero(_touches(low, high, union_low, union_high))[0]
+            else:
+                keep = np.arange(len(low))
+            if len(keep) == 0:
+                continue
+            combo_i, pattern_i = np.divmod(keep, len(patterns))
+            tx = np.full((len(keep), num_k), -1, dtype=np.intp)
+            coeff = np.zeros((len(keep), num_k), dtype=np.int64)
+            tx[:, :k] = chunk[combo_i]
+            coeff[:, :k] = patterns[pattern_i]
+            found_tx.append(tx)
+            found_coeff.append(coeff)
+            found_low.append(low[keep])
+            found_high.append(high[keep])
+
+    if found_tx:
+        tx = np.concatenate(found_tx)
+        coeff = np.concatenate(found_coeff)
+        low = np.concatenate(found_low)
+        high = np.concatenate(found_high)
+    else:
+        tx = np.zeros((0, num_k), dtype=np.intp)
+        coeff = np.zeros((0, num_k), dtype=np.int64)
+        low = high = np.zeros(0)
+    products = IntermodProducts(tx_bands=tx_bands, victim_bands=victim_bands, tx=tx, coeff=coeff,
+                                order=np.abs(coeff).sum(axis=1), low_hz=low, high_hz=high)
+    if victim_bands is not None:
+        victim, product = _overlap_join(victim_bands.low_hz, victim_bands.high_hz, low, high)
+        products.overlaps = BandOverlap(left=product,
+                                        right=victim,
+                                        low_hz=np.maximum(low[product], victim_bands.low_hz[victim]),
+                                        high_hz=np.minimum(high[product], victim_bands.high_hz[victim]))
+    return products
@@ -0,0 +1,19 @@
+import importlib
+import types
+
+
+class _LazyModule(types.ModuleType):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_name'] = name
+
+    def __getattr__(self, attr: str):
+        # only reached for names not copied over yet, i.e. on first use
+        module = importlib.import_module(self.__dict__['_lazy_name'])
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    # stand-in for `import name` that defers the actual import until an attribute is first accessed
+    return _LazyModule(name)
@@ -0,0 +1,179 @@
+import io
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# AC3H_PROFILE=1 prints the summary table to stderr at exit; any other value is a file the json profile is
+# written to at exit. only the process that first saw it reports; worker processes send their stats back to it
+# through call_profiled / merge_profile.
+ENV_VAR = 'AC3H_PROFILE'
+OWNER_ENV_VAR = 'AC3H_PROFILE_PID'
+
+
+class StageStats:
+    __slots__ = ('count', 'seconds', 'nbytes')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.nbytes = 0
+
+
+class Profiler:
+    # call count, cumulative wall time and bytes processed per named stage. stages may nest (bz2 reads happen
+    # inside the csv stages), so their times are inclusive and do not add up to the run time.
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+
+    def add(self, stage: str, seconds: float, nbytes: int = 0):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = StageStats()
+        stats.count += 1
+        stats.seconds += seconds
+        stats.nbytes += nbytes
+
+    def merge(self, other: 'Profiler') -> 'Profiler':
+        for (stage, theirs) in other.stages.items():
+            mine = self.stages.get(stage)
+            if mine is None:
+                mine = self.stages[stage] = StageStats()
+            mine.count += theirs.count
+            mine.seconds += theirs.seconds
+            mine.nbytes += theirs.nbytes
+        return self
+
+    @staticmethod
+    def from_dict(x: dict) -> 'Profiler':
+        profiler = Profiler()
+        for (stage, values) in x['stages'].items():
+            stats = profiler.stages[stage] = StageStats()
+            (stats.count, stats.seconds, stats.nbytes) = (values['count'], values['seconds'], values['bytes'])
+        return profiler
+
+    def to_dict(self) -> dict:
+        return {'stages': {stage: {'count': x.count, 'seconds': x.seconds, 'bytes': x.nbytes}
+                           for (stage, x) in self.stages.items()}}
+
+    def dump(self, file: str):
+        with open(file, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def summary(self) -> str:
+        lines = ['%-20s %10s %12s %12s %10s %10s' % ('stage', 'calls', 'total ms', 'mean us', 'MB', 'MB/s')]
+        for (stage, x) in sorted(self.stages.items(), key=lambda item: -item[1].seconds):
+            mb = x.nbytes / 1e6
+            lines.append('%-20s %10d %12.3f %12.3f %10s %10s' % (
+                stage, x.count, 1e3 * x.seconds, 1e6 * x.seconds / max(x.count, 1),
+                '%.3f' % mb if x.nbytes else '-', '%.1f' % (mb / x.seconds) if x.nbytes and x.seconds else '-'))
+        return '\n'.join(lines)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def current() -> Optional[Profiler]:
+    # the active profiler, None when instrumentation is off; hot paths check this once per call
+    return _profiler
+
+
+@contextmanager
+def profiled(profiler: Profiler = None):
+    # records every instrumented stage inside the block into profiler (a new one by default)
+    global _profiler
+    previous = _profiler
+    _profiler = profiler if profiler is not None else Profiler()
+    try:
+        yield _profiler
+    finally:
+        _profiler = previous
+
+
+def timed(stage: str, nbytes: Callable = None):
+    # decorator recording each call of the function as stage; nbytes(result) gives the bytes processed. when
+    # instrumentation is off the only cost is the wrapper call and one global lookup.
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler
+            if profiler is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            profiler.add(stage, time.perf_counter() - start, nbytes(result) if nbytes else 0)
+            return result
+        return wrapper
+    return decorator
+
+
+def call_profiled(profile: bool, fn: Callable, *args):
+    # runs fn(*args) in a worker process, under a profiler of its own when profile is set, and returns
+    # (result, stats) for merge_profile in the parent
+    if not profile:
+        return fn(*args), None
+    with profiled() as profiler:
+        return fn(*args), profiler.to_dict()
+
+
+def merge_profile(result_and_stats):
+    # the result of call_profiled, with the worker's stats added to the active profiler
+    (result, stats) = result_and_stats
+    if stats is not None and _profiler is not None:
+        _profiler.merge(Profiler.from_dict(stats))
+    return result
+
+
+class TimedReader(io.RawIOBase):
+    # raw stream wrapper recording every read of the wrapped stream as stage, with the bytes it returned
+    def __init__(self, raw, stage: str, profiler: Profiler):
+        super().__init__()
+        self.raw = raw
+        self.stage = stage
+        self.profiler = profiler
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        start = time.perf_counter()
+        n = self.raw.readinto(b)
+        self.profiler.add(self.stage, time.perf_counter() - start, n or 0)
+        return n
+
+    def seekable(self):
+        return self.raw.seekable()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # a compressed stream decompresses everything it skips over, and going back restarts from the beginning
+        start = time.perf_counter()
+        pos = self.raw.tell()
+        result = self.raw.seek(offset, whence)
+        self.profiler.add(self.stage, time.perf_counter() - start, result - pos if result >= pos else result)
+        return result
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+
+def _report_at_exit(target: str):
+    if _profiler is None:
+        return
+    if target == '1':
+        print(_profiler.summary(), file=sys.stderr)
+    else:
+        _profiler.dump(target)
+
+
+if os.environ.get(ENV_VAR) and os.environ.setdefault(OWNER_ENV_VAR, str(os.getpid())) == str(os.getpid()):
+    _profiler = Profiler()
+    atexit.register(_report_at_exit, os.environ[ENV_VAR])
@@ -0,0 +1,108 @@
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from lib.frequency.harmonics import HarmonicOverlaps
+
+# draw functions take a figure and plain arrays, so a render job pickles cheaply and fingerprints stably
+
+BAR_HEIGHT = 0.9
+
+
+def bar_collection(low: np.ndarray, high: np.ndarray, row: np.ndarray, colors, height: float = BAR_HEIGHT):
+    # one PolyCollection of axis-aligned rectangles instead of a Rectangle patch per bar
+    from matplotlib.collections import PolyCollection
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    bottom = np.asarray(row, dtype=np.float64) + (1 - height)/2
+    top = bottom + height
+    verts = np.stack([np.column_stack([low, bottom]), np.column_stack([high, bottom]),
+                      np.column_stack([high, top]), np.column_stack([low, top])], axis=1)
+    return PolyCollection(verts, facecolors=colors, edgecolors=colors, linewidths=0)
+
+
+def harmonic_panels(overlaps: HarmonicOverlaps) -> Tuple[List[str], List[dict]]:
+    # per victim rx band, highest first: overlaps sorted widest first, one bar row each. tx bands are indexed
+    # by ascending center frequency, which also picks their colour.
+    tx_order = np.argsort(overlaps.tx_bands.low_hz + overlaps.tx_bands.high_hz, kind='stable')
+    tx_rank = np.empty(len(tx_order), dtype=np.intp)
+    tx_rank[tx_order] = np.arange(len(tx_order))
+    used_tx = np.unique(tx_rank[overlaps.tx])
+    tx_names = [overlaps.tx_bands.names[tx_order[k]] for k in used_tx]
+    tx_color = np.full(len(tx_order), -1)
+    tx_color[used_tx] = np.arange(len(used_tx))
+    rx_used = np.unique(overlaps.rx)
+    rx_center = overlaps.rx_bands.low_hz + overlaps.rx_bands.high_hz
+    rx_used = rx_used[np.argsort(-rx_center[rx_used], kind='stable')]
+    panels = []
+    for i in rx_used:
+        sel = np.nonzero(overlaps.rx == i)[0]
+        sel = sel[np.argsort(-overlaps.bandwidth_hz[sel], kind='stable')]
+        panels.append({'rx': overlaps.rx_bands.names[i],
+                       'rx_low_mhz': overlaps.rx_bands.low_hz[i] / 1e6,
+                       'rx_high_mhz': overlaps.rx_bands.high_hz[i] / 1e6,
+                       'tx': tx_color[tx_rank[overlaps.tx[sel]]],
+                       'order': overlaps.order[sel],
+                       'low_mhz': overlaps.low_hz[sel] / 1e6,
+                       'high_mhz': overlaps.high_hz[sel] / 1e6})
+    return tx_names, panels
+
+
+def draw_harmonic_panel(ax, panel: dict, num_rows: int, c_map: str = 'tab20', fontsize='xx-small'):
+    import matplotlib.pyplot as plt
+    cmap = plt.get_cmap(c_map)
+    rows = np.arange(len(panel['tx']))
+    ax.add_collection(bar_collection(panel['low_mhz'], panel['high_mhz'], rows, cmap(panel['tx'])))
+    for (k, (lo, hi, n)) in enumerate(zip(panel['low_mhz'], panel['high_mhz'], panel['order'])):
+        ax.text((lo + hi)/2, k + 0.5, '%d' % n, horizontalalignment='center', verticalalignment='center',
+                fontsize=fontsize)
+    ax.set_xlim([panel['rx_low_mhz'], panel['rx_high_mhz']])
+    ax.set_ylim([0, num_rows])
+    ax.set_yticks([])
+    ax.set_title(panel['rx'], fontsize=8)
+    ax.tick_params(axis='both', which='major', labelsize=5)
+    ax.grid(axis='x', linestyle=':')
+
+
+def _legend(ax, tx_names: Sequence[str], tx: Sequence[int], c_map: str, **kwargs):
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+    cmap = plt.get_cmap(c_map)
+    handles = [Patch(fc=cmap(k), ec=cmap(k), lw=0, label=tx_names[k]) for k in tx]
+    legend = ax.legend(handles=handles, fontsize='x-small', title='Harmonic Bands', **kwargs)
+    plt.setp(legend.get_title(), fontsize='x-small')
+
+
+def harmonic_overlap_figure(fig, tx_names: Sequence[str], panels: Sequence[dict], c_map: str = 'tab20'):
+    # every victim band on one page, two columns with the legend in place of the last panel
+    if not panels:
+        ax = fig.subplots()
+        ax.set_axis_off()
+        ax.text(0.5, 0.5, 'no harmonic overlaps', horizontalalignment='center', verticalalignment='center')
+        return
+    num_rows = max(1, max(len(x['tx']) for x in panels))
+    axs = np.ravel(fig.subplots(round(np.ceil(len(panels)/2)), 2, squeeze=False))
+    fig.tight_layout()
+    for (ax, panel) in zip(axs, panels):
+        draw_harmonic_panel(ax, panel, num_rows, c_map=c_map)
+    for ax in axs[len(panels):]:
+        ax.remove()
+    _legend(axs[len(panels) - 1], tx_names, range(len(tx_names)), c_map, ncol=3, bbox_to_anchor=(2.0, 1.5))
+
+
+def harmonic_panel_figure(fig, tx_names: Sequence[str], panel: dict, c_map: str = 'tab20'):
+    # one victim band; colours match the overview, the legend lists only the bands that reach it
+    ax = fig.subplots()
+    draw_harmonic_panel(ax, panel, max(1, len(panel['tx'])), c_map=c_map, fontsize='small')
+    ax.set_xlabel('MHz', fontsize=6)
+    _legend(ax, tx_names, np.unique(panel['tx']), c_map, loc='upper right')
+
+
+def s12_figure(fig, series: Dict[str, Tuple[np.ndarray, np.ndarray]], title: str = 'Dunestar Filters: S12 Power'):
+    # series maps a label to (freq_mhz, pwr_dbm)
+    ax = fig.subplots()
+    for (label, (freq_mhz, pwr_dbm)) in series.items():
+        ax.plot(freq_mhz, pwr_dbm, label=label)
+    ax.grid(which='both')
+    ax.set_xlabel('MHz')
+    ax.set_ylabel('dB')
+    ax.legend()
+    ax.set_title(title)
@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import inspect
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+from path_data import path_output
+
+MANIFEST = '.render-manifest.json'
+RENDER_VERSION = 1
+
+
+class FigureJob(NamedTuple):
+    # draw(fig, **inputs) must be a module-level function so jobs pickle into worker processes
+    file: str
+    draw: Callable
+    inputs: dict
+    size: Tuple[float, float] = (7.0, 5.0)
+    dpi: int = 250
+
+
+class RenderResult(NamedTuple):
+    file: str
+    rendered: bool
+    error: Optional[Exception]
+
+
+def use_headless():
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _module_source(name: str) -> str:
+    module = sys.modules.get(name)
+    try:
+        return inspect.getsource(module)
+    except (OSError, TypeError):
+        return name
+
+
+def job_fingerprint(job: FigureJob) -> str:
+    # covers the inputs, the figure settings and the whole module defining the draw function, so editing a plot
+    # or any helper next to it re-renders it. RENDER_VERSION covers changes to the rendering itself.
+    h = hashlib.sha256()
+    h.update(('%d\0%s.%s\0' % (RENDER_VERSION, job.draw.__module__, job.draw.__qualname__)).encode('utf-8'))
+    h.update(_module_source(job.draw.__module__).encode('utf-8'))
+    h.update(pickle.dumps((job.inputs, tuple(job.size), job.dpi), protocol=4))
+    return h.hexdigest()
+
+
+def render_figure(job: FigureJob, file: str):
+    use_headless()
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=job.size)
+    try:
+        job.draw(fig, **job.inputs)
+        fig.savefig(file, dpi=job.dpi)
+    finally:
+        plt.close(fig)
+
+
+def _render_one(job: FigureJob, file: str) -> RenderResult:
+    try:
+        render_figure(job, file)
+        return RenderResult(file=file, rendered=True, error=None)
+    except Exception as e:
+        return RenderResult(file=file, rendered=False, error=e)
+
+
+def render_figures(jobs: Iterable[FigureJob], path_dir: str = None, workers: int = None,
+                   force: bool = False) -> List[RenderResult]:
+    # renders into path_dir, skipping figures whose file exists and whose fingerprint is unchanged since the
+    # last run; the fingerprints are kept in a manifest next to the figures
+    path_dir = path_dir or path_output
+    jobs = list(jobs)
+    path_manifest = os.path.join(path_dir, MANIFEST)
+    try:
+        with open(path_manifest, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    results = [None] * len(jobs)
+    todo = []
+    for (i, job) in enumerate(jobs):
+        file = os.path.join(path_dir, job.file)
+        key = job_fingerprint(job)
+        if not force and manifest.get(job.file) == key and os.path.exists(file):
+            results[i] = RenderResult(file=file, rendered=False, error=None)
+            continue
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        manifest.pop(job.file, None)
+        todo.append((i, job, file, key))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(todo))
+    if workers <= 1:
+        rendered = [_render_one(job, file) for (_, job, file, _) in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_headless) as executor:
+            rendered = list(executor.map(_render_one, [x[1] for x in todo], [x[2] for x in todo]))
+
+    for ((i, job, _, key), result) in zip(todo, rendered):
+        results[i] = result
+        if result.error is None:
+            manifest[job.file] = key
+    if todo:
+        os.makedirs(path_dir, exist_ok=True)
+        with open(path_manifest, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+    return results
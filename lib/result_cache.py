@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+import numpy as np
+from path_data import path_output
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks on windows; index writes stay atomic but concurrent runs are not serialized
+    fcntl = None
+
+RESULT_CACHE_VERSION = 1
+
+
+def fingerprint(*parts) -> str:
+    # parts are json-serializable or numpy arrays; arrays contribute their dtype, shape and bytes
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(('%s%s' % (part.dtype.str, part.shape)).encode('utf-8'))
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def json_fingerprint(file: str) -> str:
+    # the parsed content, so reformatting a band definition file does not invalidate results
+    with open(file, 'r') as f:
+        return fingerprint(json.load(f))
+
+
+class ResultCache:
+    # computed arrays in one .npz per key, with a json index of sizes and last use. storing evicts the least
+    # recently used entries until the total fits max_bytes. puts and hits only touch the in-memory index; it is
+    # written once by flush (or leaving a with block), merged under a lock with what other runs wrote since it
+    # was read. entries stored without a flush are not listed for other runs.
+    def __init__(self, path_cache: str = None, max_bytes: int = 256 << 20, enabled: bool = True):
+        self.path_cache = path_cache or os.path.join(path_output, 'result-cache')
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._removed = set()
+        self._dirty = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    @property
+    def _path_index(self) -> str:
+        return os.path.join(self.path_cache, 'index.json')
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.path_cache, key + '.npz')
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            try:
+                with open(self._path_index, 'r') as f:
+                    self._index = json.load(f)
+                if self._index.get('version') != RESULT_CACHE_VERSION:
+                    raise ValueError('stale index')
+            except (OSError, ValueError):
+                self._index = {'version': RESULT_CACHE_VERSION, 'entries': {}, 'files': {}}
+        return self._index
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.path_cache, exist_ok=True)
+        with open(self._path_index + '.lock', 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _merge_index(self):
+        # entries stored by other runs since the index was read; a shared entry keeps the later use
+        try:
+            with open(self._path_index, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get('version') != RESULT_CACHE_VERSION:
+            return
+        mine = self._load_index()
+        for (key, entry) in index['entries'].items():
+            if key in self._removed:
+                continue
+            if key in mine['entries']:
+                mine['entries'][key]['last_used'] = max(mine['entries'][key]['last_used'], entry['last_used'])
+            else:
+                mine['entries'][key] = entry
+        for (path, entry) in index['files'].items():
+            mine['files'].setdefault(path, entry)
+
+    def _write_index(self):
+        with self._locked():
+            self._merge_index()
+            self._evict()
+            path_tmp = '%s.%d.tmp' % (self._path_index, os.getpid())
+            with open(path_tmp, 'w') as f:
+                json.dump(self._index, f)
+            os.replace(path_tmp, self._path_index)
+        self._dirty = False
+
+    def flush(self):
+        # writes the last-use times of hits and newly hashed files, if anything changed since the last write
+        if self.enabled and self._dirty:
+            self._write_index()
+
+    def file_key(self, file: str) -> str:
+        # sha256 of the file content, rehashed only when its size or mtime changes
+        from lib.siglent.trace_cache import file_hash
+        stat = os.stat(file)
+        files = self._load_index()['files']
+        path = os.path.abspath(file)
+        known = files.get(path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+        digest = file_hash(file)
+        files[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+        self._dirty = True
+        return digest
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        if not self.enabled:
+            return None
+        entries = self._load_index()['entries']
+        if key not in entries:
+            self.misses += 1
+            return None
+        try:
+            with np.load(self._path(key), allow_pickle=False) as data:
+                arrays = {k: data[k] for k in data.files}
+        except (OSError, ValueError):
+            entries.pop(key, None)
+            self._removed.add(key)
+            self._dirty = True
+            self.misses += 1
+            return None
+        entries[key]['last_used'] = time.time()
+        self._dirty = True
+        self.hits += 1
+        return arrays
+
+    def put(self, key: str, arrays: Dict[str, np.ndarray]):
+        if not self.enabled:
+            return
+        os.makedirs(self.path_cache, exist_ok=True)
+        path = self._path(key)
+        path_tmp = '%s.%d.tmp.npz' % (path, os.getpid())
+        np.savez(path_tmp, **arrays)
+        os.replace(path_tmp, path)
+        self._load_index()['entries'][key] = {'size': os.path.getsize(path), 'last_used': time.time()}
+        self._removed.discard(key)
+        self._evict(keep=key)
+        self._dirty = True
+
+    def memoize(self, key: str, compute: Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, arrays)
+        return arrays
+
+    @property
+    def nbytes(self) -> int:
+        return sum(x['size'] for x in self._load_index()['entries'].values())
+
+    def _evict(self, keep: str = None):
+        entries = self._load_index()['entries']
+        total = self.nbytes
+        for key in sorted(entries, key=lambda x: entries[x]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= entries.pop(key)['size']
+            self._removed.add(key)
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+    def clear(self):
+        self._index = None
+        self._removed = set()
+        self._dirty = False
+        if os.path.exists(self.path_cache):
+            shutil.rmtree(self.path_cache)
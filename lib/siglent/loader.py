@@ -0,0 +1,58 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional
+from lib import profiling
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from lib.siglent.trace_cache import TraceCache
+
+
+class TraceLoadResult(NamedTuple):
+    file: str
+    trace_set: Optional[Ssa3021xTraceSet]
+    error: Optional[Exception]
+
+
+def _load_one(file: str, cache: TraceCache, fill_only: bool = False) -> TraceLoadResult:
+    try:
+        if fill_only and cache is not None and cache.enabled:
+            # a pool worker only fills the cache; the parent maps the entry instead of unpickling arrays
+            cache.load(file)
+            return TraceLoadResult(file=file, trace_set=None, error=None)
+        trace_set = cache.load(file) if cache is not None else Ssa3021xTraceSet.from_csv(file)
+        return TraceLoadResult(file=file, trace_set=trace_set, error=None)
+    except Exception as e:
+        return TraceLoadResult(file=file, trace_set=None, error=e)
+
+
+def _map_cached(result: TraceLoadResult, cache: TraceCache) -> TraceLoadResult:
+    # a bad or evicted entry fails only its own file, like a parse error in a worker
+    if result.error is not None:
+        return result
+    try:
+        return result._replace(trace_set=cache.load(result.file))
+    except Exception as e:
+        return result._replace(trace_set=None, error=e)
+
+
+def load_trace_sets(files: Iterable[str], workers: int = None, cache: TraceCache = None) -> List[TraceLoadResult]:
+    files = list(files)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(files))
+    if workers <= 1:
+        return [_load_one(file, cache) for file in files]
+    profile = profiling.current() is not None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = [profiling.merge_profile(x) for x in
+                   executor.map(profiling.call_profiled, [profile] * len(files), [_load_one] * len(files), files,
+                                [cache] * len(files), [True] * len(files))]
+    if cache is not None and cache.enabled:
+        results = [_map_cached(x, cache) for x in results]
+    return results
+
+
+def load_trace_dir(path_dir: str, pattern: str = r'\.bz2$', workers: int = None,
+                   cache: TraceCache = None) -> List[TraceLoadResult]:
+    files = sorted(x for x in os.listdir(path_dir) if re.search(pattern, x))
+    return load_trace_sets([os.path.join(path_dir, x) for x in files], workers=workers, cache=cache)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+from lib.frequency.band_set import BandSet
+from lib.lazy_import import lazy_import
+from lib.result_cache import ResultCache, fingerprint
+from lib.siglent.ssa3021x import Ssa3021xTrace, Ssa3021xTraceSet
+
+u = lazy_import('astropy.units')
+
+# part of every cached_rejection_matrix key; bump it when rejection_matrix changes what it computes
+REJECTION_VERSION = 1
+# the load_key of the default loader, the first trace of each capture as recorded
+FIRST_TRACE = 'first-trace'
+
+
+class RejectionMatrix:
+    __slots__ = ('rows', 'columns', 'stats', 'values')
+
+    def __init__(self, rows: Sequence[str], columns: Sequence[str], stats: Sequence[str], values: np.ndarray):
+        if values.shape != (len(rows), len(columns), len(stats)):
+            raise ValueError('values shape %s does not match the labels' % (values.shape,))
+        self.rows = tuple(rows)
+        self.columns = tuple(columns)
+        self.stats = tuple(stats)
+        self.values = values
+
+    def get(self, stat: str) -> np.ndarray:
+        if stat not in self.stats:
+            raise ValueError('unrecognized statistic: %s' % stat)
+        return self.values[:, :, self.stats.index(stat)]
+
+    def to_dict(self) -> Dict[Tuple[str, str], Dict[str, u.Quantity]]:
+        return {(row, col): {stat: self.values[i, k, m] * u.dB(1) for (m, stat) in enumerate(self.stats)}
+                for (i, row) in enumerate(self.rows) for (k, col) in enumerate(self.columns)}
+
+
+def stat_names(percentiles: Iterable[float] = ()) -> List[str]:
+    return ['min', 'max', 'avg', *['p%g' % q for q in percentiles]]
+
+
+def _sorted_axis(trace: Ssa3021xTrace) -> Tuple[np.ndarray, np.ndarray]:
+    freq = trace.freq_hz
+    pwr = trace.pwr_db
+    if np.any(freq[1:] < freq[:-1]):
+        srt = np.argsort(freq, kind='stable')
+        return freq[srt], pwr[srt]
+    return freq, pwr
+
+
+def _band_stats(values: np.ndarray, start: np.ndarray, stop: np.ndarray, percentiles: Sequence[float],
+                max_block: int = 1 << 24) -> np.ndarray:
+    # values is (traces x points) on one shared frequency axis; start/stop are per band slice bounds
+    num_traces, num_points = values.shape
+    count = stop - start
+    empty = count <= 0
+    out = np.full((num_traces, len(start), 3 + len(percentiles)), np.nan)
+    if np.all(empty):
+        return out
+    # reduceat over interleaved [start, stop) pairs; a trailing sentinel column keeps stop == n in range
+    padded = np.concatenate([values, np.zeros((num_traces, 1))], axis=1)
+    idx = np.ravel(np.column_stack([start, stop]))
+    out[:, :, 0] = np.minimum.reduceat(padded, idx, axis=1)[:, 0::2]
+    out[:, :, 1] = np.maximum.reduceat(padded, idx, axis=1)[:, 0::2]
+    csum = np.concatenate([np.zeros((num_traces, 1)), np.cumsum(values, axis=1)], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out[:, :, 2] = (csum[:, stop] - csum[:, start]) / count
+    if len(percentiles):
+        width = max(1, int(count.max()))
+        block = max(1, max_block // (num_traces * width))
+        for b in range(0, len(start), block):
+            pos = start[b:b+block, None] + np.arange(width)
+            mask = pos >= stop[b:b+block, None]
+            segment = values[:, np.minimum(pos, num_points - 1)]
+            # empty bands keep one dummy point so nanpercentile never sees an all-nan slice
+            mask[empty[b:b+block], 0] = False
+            segment[:, mask] = np.nan
+            out[:, b:b+block, 3:] = np.moveaxis(np.nanpercentile(segment, percentiles, axis=2), 0, 2)
+    out[:, empty, :] = np.nan
+    return out
+
+
+def rejection_matrix(traces: Dict[str, Ssa3021xTrace], bands: BandSet,
+                     percentiles: Sequence[float] = ()) -> RejectionMatrix:
+    rows = list(traces.keys())
+    percentiles = list(percentiles)
+    values = np.full((len(rows), len(bands), 3 + len(percentiles)), np.nan)
+
+    # traces sharing a frequency axis are reduced together as one (traces x points) array
+    groups: List[Tuple[np.ndarray, List[int], List[np.ndarray]]] = []
+    for (i, key) in enumerate(rows):
+        freq, pwr = _sorted_axis(traces[key])
+        for (axis, members, pwrs) in groups:
+            if axis.shape == freq.shape and np.array_equal(axis, freq):
+                members.append(i)
+                pwrs.append(pwr)
+                break
+        else:
+            groups.append((freq, [i], [pwr]))
+
+    for (axis, members, pwrs) in groups:
+        # band edges are exclusive, a point sitting exactly on an edge is not counted
+        start = np.searchsorted(axis, bands.low_hz, side='right')
+        stop = np.searchsorted(axis, bands.high_hz, side='left')
+        # rejection is the negated received power
+        values[members] = _band_stats(-np.vstack(pwrs), start, stop, percentiles)
+    return RejectionMatrix(rows=rows, columns=bands.names, stats=stat_names(percentiles), values=values)
+
+
+def _first_trace(file: str) -> Ssa3021xTrace:
+    with Ssa3021xTraceSet.from_csv(file, lazy=True).traces as traces:
+        return traces[0]
+
+
+def cached_rejection_matrix(files: Dict[str, str], bands: BandSet, cache: ResultCache,
+                            percentiles: Sequence[float] = (),
+                            load: Callable[[str], Ssa3021xTrace] = _first_trace,
+                            load_key: str = None) -> RejectionMatrix:
+    # rejection_matrix over the trace loaded from each row's file, cached per row under the file content hash.
+    # each row entry keeps its cells by band edges, so a changed file recomputes only its row and a new or
+    # changed band only its column; a trace is loaded only when its row has cells to compute. load_key names
+    # what load returns for a file and is part of the row key, so a custom load must give one.
+    if load_key is None:
+        if load is not _first_trace:
+            raise ValueError('a custom load needs a load_key naming the trace it returns')
+        load_key = FIRST_TRACE
+    rows = list(files.keys())
+    percentiles = list(percentiles)
+    columns = np.array([fingerprint(float(lo), float(hi)) for (lo, hi) in zip(bands.low_hz, bands.high_hz)])
+    values = np.full((len(rows), len(bands), 3 + len(percentiles)), np.nan)
+    for (i, row) in enumerate(rows):
+        key = fingerprint('rejection-row', REJECTION_VERSION, load_key, cache.file_key(files[row]), percentiles)
+        entry = cache.get(key) or {'columns': np.empty(0, dtype=columns.dtype),
+                                   'values': np.empty((0, 3 + len(percentiles)))}
+        known = dict(zip(entry['columns'], range(len(entry['columns']))))
+        missing = np.array([x not in known for x in columns], dtype=bool)
+        if np.any(missing):
+            computed = rejection_matrix({row: load(files[row])}, bands[missing], percentiles).values[0]
+            entry = {'columns': np.concatenate([entry['columns'], columns[missing]]),
+                     'values': np.concatenate([entry['values'], computed])}
+            known = dict(zip(entry['columns'], range(len(entry['columns']))))
+            cache.put(key, entry)
+        values[i] = entry['values'][[known[x] for x in columns]]
+    return RejectionMatrix(rows=rows, columns=bands.names, stats=stat_names(percentiles), values=values)
@@ -0,0 +1,177 @@
+import io
+import os
+import re
+import csv
+import json
+import time
+from typing import List, Sequence, Union
+import numpy as np
+from lib.siglent.rejection import RejectionMatrix
+
+STORE_VERSION = 1
+HEADER_SIZE = 256
+CSV_FIELDS = ('run', 'source', 'band', 'stat', 'rejection_db')
+# run names become file names, so no path separators and no leading dot
+RUN_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def _npy_header(shape: tuple, dtype: np.dtype) -> bytes:
+    # a format 1.0 .npy header padded to a fixed size, so the row count can be rewritten in place
+    descr = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': tuple(shape)}
+    header = repr(descr).encode('latin1')
+    pad = HEADER_SIZE - 10 - len(header) - 1
+    if pad < 0:
+        raise ValueError('shape %s does not fit the npy header' % (shape,))
+    header += b' ' * pad + b'\n'
+    return np.lib.format.MAGIC_PREFIX + b'\x01\x00' + np.uint16(len(header)).astype('<u2').tobytes() + header
+
+
+class RejectionRunWriter:
+    # streams the rows of one run to an .npy file (rows x columns x stats) and, optionally, its csv lines to a
+    # file of its own. on close the run is listed in the sidecar and its lines are appended to the store's csv in
+    # one write, so an interrupted or aborted run is never read back and never touches other runs' lines.
+    def __init__(self, store: 'RejectionStore', name: str, columns: Sequence[str], stats: Sequence[str],
+                 dtype=np.float64):
+        self.store = store
+        self.name = name
+        self.columns = tuple(columns)
+        self.stats = tuple(stats)
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.rows: List[str] = []
+        self.file = 'run-%s.npy' % name
+        self._f = open(os.path.join(store.path_dir, self.file), 'wb')
+        self._f.write(_npy_header((0, len(self.columns), len(self.stats)), self.dtype))
+        self._csv = None
+        if store.write_csv:
+            self._csv = open(self._path_csv_tmp, 'w+', newline='')
+            self._csv_writer = csv.writer(self._csv)
+
+    @property
+    def _path_csv_tmp(self) -> str:
+        return os.path.join(self.store.path_dir, 'run-%s.csv.tmp' % self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, row: str, values: np.ndarray):
+        values = np.asarray(values, dtype=self.dtype)
+        if values.shape != (len(self.columns), len(self.stats)):
+            raise ValueError('row shape %s does not match the labels' % (values.shape,))
+        self._f.write(values.tobytes())
+        self.rows.append(row)
+        if self._csv is not None:
+            self._csv_writer.writerows((self.name, row, col, stat, repr(float(values[k, m])))
+                                       for (k, col) in enumerate(self.columns) for (m, stat) in enumerate(self.stats))
+
+    def append_matrix(self, matrix: RejectionMatrix):
+        if matrix.columns != self.columns or matrix.stats != self.stats:
+            raise ValueError('matrix labels do not match the run')
+        for (i, row) in enumerate(matrix.rows):
+            self.append(row, matrix.values[i])
+
+    def close(self):
+        self._f.seek(0)
+        self._f.write(_npy_header((len(self.rows), len(self.columns), len(self.stats)), self.dtype))
+        self._f.close()
+        if self._csv is not None:
+            self._csv.seek(0)
+            lines = self._csv.read()
+            self._csv.close()
+            os.remove(self._path_csv_tmp)
+            self.store._append_csv(lines)
+        self.store._add_run({'name': self.name, 'file': self.file, 'rows': self.rows, 'columns': list(self.columns),
+                             'stats': list(self.stats), 'dtype': self.dtype.str, 'created': time.time()})
+
+    def abort(self):
+        self._f.close()
+        os.remove(os.path.join(self.store.path_dir, self.file))
+        if self._csv is not None:
+            self._csv.close()
+            os.remove(self._path_csv_tmp)
+
+
+class RejectionStore:
+    # a directory of runs, each a (rows x columns x stats) .npy that np.load can memory map, listed with its
+    # labels in index.json. runs accumulate; rejection.csv holds every run in long form for text tooling.
+    def __init__(self, path_dir: str, write_csv: bool = True):
+        self.path_dir = path_dir
+        self.write_csv = write_csv
+        os.makedirs(path_dir, exist_ok=True)
+
+    @property
+    def _path_index(self) -> str:
+        return os.path.join(self.path_dir, 'index.json')
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._path_index, 'r') as f:
+                index = json.load(f)
+        except OSError:
+            return {'version': STORE_VERSION, 'runs': []}
+        if index.get('version') != STORE_VERSION:
+            raise ValueError('unsupported rejection store version: %s' % index.get('version'))
+        return index
+
+    def _append_csv(self, lines: str):
+        # a single append, so runs closing at the same time do not interleave their lines
+        path_csv = os.path.join(self.path_dir, 'rejection.csv')
+        if not os.path.exists(path_csv):
+            header = io.StringIO(newline='')
+            csv.writer(header).writerow(CSV_FIELDS)
+            lines = header.getvalue() + lines
+        with open(path_csv, 'ab', buffering=0) as f:
+            f.write(lines.encode('utf-8'))
+
+    def _add_run(self, run: dict):
+        index = self._load_index()
+        index['runs'].append(run)
+        path_tmp = self._path_index + '.tmp'
+        with open(path_tmp, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(path_tmp, self._path_index)
+
+    @property
+    def runs(self) -> List[dict]:
+        return self._load_index()['runs']
+
+    def _run(self, run: Union[int, str]) -> dict:
+        runs = self.runs
+        if isinstance(run, str):
+            for x in runs:
+                if x['name'] == run:
+                    return x
+            raise ValueError('unrecognized run: %s' % run)
+        return runs[run]
+
+    def writer(self, columns: Sequence[str], stats: Sequence[str], name: str = None,
+               dtype=np.float64) -> RejectionRunWriter:
+        names = [x['name'] for x in self.runs]
+        name = name or '%04d' % len(names)
+        if not RUN_NAME_PATTERN.match(name):
+            raise ValueError('invalid run name: %r' % name)
+        if name in names:
+            raise ValueError('run already exists: %s' % name)
+        return RejectionRunWriter(self, name, columns=columns, stats=stats, dtype=dtype)
+
+    def append(self, matrix: RejectionMatrix, name: str = None, dtype=np.float64) -> str:
+        with self.writer(matrix.columns, matrix.stats, name=name, dtype=dtype) as writer:
+            writer.append_matrix(matrix)
+        return writer.name
+
+    def values(self, run: Union[int, str] = -1, mmap: bool = True) -> np.ndarray:
+        entry = self._run(run)
+        file = os.path.join(self.path_dir, entry['file'])
+        if not entry['rows']:
+            return np.empty((0, len(entry['columns']), len(entry['stats'])), dtype=entry['dtype'])
+        return np.load(file, mmap_mode='r' if mmap else None, allow_pickle=False)
+
+    def matrix(self, run: Union[int, str] = -1, mmap: bool = True) -> RejectionMatrix:
+        entry = self._run(run)
+        return RejectionMatrix(rows=entry['rows'], columns=entry['columns'], stats=entry['stats'],
+                               values=self.values(run, mmap=mmap))
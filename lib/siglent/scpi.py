@@ -0,0 +1,190 @@
+import asyncio
+import collections
+import warnings
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+from lib.siglent.ssa3021x import Ssa3021xTrace, Ssa3021xTraceSet
+
+SCPI_PORT = 5025
+TRACE_NAMES = ('Trace A', 'Trace B', 'Trace C', 'Trace D')
+
+# scpi mnemonics and the strings the instrument writes into its csv exports
+AVERAGE_TYPES = {'LOGPOWER': 'Log Pwr', 'POWER': 'Pwr', 'VOLTAGE': 'Voltage'}
+TRACE_TYPES = {'WRITE': 'Clear Write', 'MAXHOLD': 'Max Hold', 'MINHOLD': 'Min Hold', 'VIEW': 'View',
+               'BLANK': 'Blank', 'AVERAGE': 'Average'}
+POWER_UNITS = {'DBM': 'dBm', 'DBW': 'dBW'}
+
+
+def decode_trace(payload: bytes) -> np.ndarray:
+    # an ieee 488.2 definite-length block holds little-endian float32 (:FORMat REAL), anything else is the
+    # comma-separated ascii form
+    if payload[:1] == b'#':
+        digits = int(payload[1:2])
+        return np.frombuffer(payload[2+digits:], dtype='<f4').astype(np.float64)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        return np.fromstring(payload.replace(b',', b' '), dtype=np.float64, sep=' ')
+
+
+def encode_block(data: bytes) -> bytes:
+    length = b'%d' % len(data)
+    return b'#%d%s%s' % (len(length), length, data)
+
+
+class Ssa3021xClient:
+    # one tcp connection to the raw scpi port. queries are written as soon as they are issued and a single
+    # reader task matches responses to them in order, so concurrent queries are pipelined on the socket.
+    def __init__(self, host: str, port: int = SCPI_PORT, timeout: float = 10.0, binary: bool = True):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.binary = binary
+        self._reader = None
+        self._writer = None
+        self._pending = collections.deque()
+        self._reader_task = None
+        self._meta = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port),
+                                                            self.timeout)
+        self._reader_task = asyncio.ensure_future(self._read_responses())
+        await self.write(':FORMat:TRACe:DATA %s' % ('REAL' if self.binary else 'ASCii'))
+        return self
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._writer = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _read_response(self) -> bytes:
+        first = await self._reader.readexactly(1)
+        if first == b'\n':
+            return b''
+        if first != b'#':
+            return (first + await self._reader.readuntil(b'\n')).rstrip(b'\r\n')
+        digits = await self._reader.readexactly(1)
+        length = await self._reader.readexactly(int(digits))
+        data = await self._reader.readexactly(int(length))
+        await self._reader.readuntil(b'\n')
+        return b'#' + digits + length + data
+
+    async def _read_responses(self):
+        try:
+            while True:
+                response = await self._read_response()
+                if not self._pending:
+                    raise ValueError('unexpected response from %s: %r' % (self.host, response[:40]))
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            error = e if not isinstance(e, asyncio.IncompleteReadError) else ConnectionError('connection closed')
+            while self._pending:
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_exception(error)
+
+    async def write(self, command: str):
+        self._writer.write(command.encode('ascii') + b'\n')
+        await self._writer.drain()
+
+    def _send(self, command: str) -> asyncio.Future:
+        # the write and the pending entry happen together so responses line up with queries
+        if self._reader_task is None or self._reader_task.done():
+            raise ConnectionError('not connected to %s' % self.host)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        self._writer.write(command.encode('ascii') + b'\n')
+        return future
+
+    async def query(self, command: str) -> bytes:
+        future = self._send(command)
+        await self._writer.drain()
+        return await asyncio.wait_for(future, self.timeout)
+
+    async def query_many(self, commands: Iterable[str]) -> List[bytes]:
+        futures = [self._send(x) for x in commands]
+        await self._writer.drain()
+        return list(await asyncio.wait_for(asyncio.gather(*futures), self.timeout))
+
+    async def read_meta(self, traces: Sequence[int] = (1,)) -> Tuple[dict, List[dict]]:
+        # the settings a csv export records, under the same keys and values
+        responses = await self.query_many(['*IDN?', ':UNIT:POWer?', ':SWEep:POINts?', ':FREQuency:STARt?',
+                                           ':FREQuency:STOP?', ':AVERage:TYPE?',
+                                           *[':TRACe%d:MODE?' % n for n in traces]])
+        (idn, unit, points, start, stop, average, *modes) = [x.decode('ascii').strip() for x in responses]
+        if unit.upper() not in POWER_UNITS:
+            raise ValueError('unrecognized power unit: %s' % unit)
+        idn = idn.split(',')
+        # the export records model and firmware version
+        meta = {'Machine Module': [idn[1], idn[3]] if len(idn) > 3 else idn[0],
+                'Y Axis Unit': POWER_UNITS[unit.upper()],
+                'Number of Points': int(points),
+                'Start Frequency': float(start),
+                'Stop Frequency': float(stop),
+                'Average Type': AVERAGE_TYPES.get(average.upper(), average)}
+        trace_meta = [{'Trace Name': TRACE_NAMES[n - 1], 'Trace Type': TRACE_TYPES.get(x.upper(), x)}
+                      for (n, x) in zip(traces, modes)]
+        self._meta = (meta, trace_meta, tuple(traces))
+        return meta, trace_meta
+
+    def _freq_hz(self, meta: dict) -> np.ndarray:
+        # the instrument exports whole-hz frequencies of a linear sweep
+        return np.round(np.linspace(meta['Start Frequency'], meta['Stop Frequency'], meta['Number of Points']))
+
+    def _trace_set(self, meta: dict, trace_meta: List[dict], payloads: Sequence[bytes]) -> Ssa3021xTraceSet:
+        freq_hz = self._freq_hz(meta)
+        traces = []
+        for (x, payload) in zip(trace_meta, payloads):
+            pwr = decode_trace(payload)
+            if len(pwr) != len(freq_hz):
+                raise ValueError('expected %d points, got %d' % (len(freq_hz), len(pwr)))
+            traces.append(Ssa3021xTrace.from_arrays(meta=dict(x), freq_hz=freq_hz, pwr=pwr,
+                                                    pwr_unit=meta['Y Axis Unit']))
+        return Ssa3021xTraceSet(meta=dict(meta), traces=traces)
+
+    async def _cached_meta(self, traces: Sequence[int], refresh: bool) -> Tuple[dict, List[dict]]:
+        if refresh or self._meta is None or self._meta[2] != tuple(traces):
+            return await self.read_meta(traces)
+        return self._meta[:2]
+
+    async def fetch(self, traces: Sequence[int] = (1,), refresh_meta: bool = False) -> Ssa3021xTraceSet:
+        (meta, trace_meta) = await self._cached_meta(traces, refresh_meta)
+        payloads = await self.query_many([':TRACe:DATA? %d' % n for n in traces])
+        return self._trace_set(meta, trace_meta, payloads)
+
+    async def sweeps(self, count: int, traces: Sequence[int] = (1,), depth: int = 4):
+        # keeps depth sweeps of queries in flight, so the instrument never waits on the network or decoding
+        (meta, trace_meta) = await self._cached_meta(traces, False)
+        in_flight = collections.deque()
+        requested = 0
+        while requested < count or in_flight:
+            while requested < count and len(in_flight) < depth:
+                in_flight.append([self._send(':TRACe:DATA? %d' % n) for n in traces])
+                requested += 1
+            await self._writer.drain()
+            payloads = await asyncio.wait_for(asyncio.gather(*in_flight.popleft()), self.timeout)
+            yield self._trace_set(meta, trace_meta, payloads)
+
+
+async def acquire(addresses: Iterable, traces: Sequence[int] = (1,), binary: bool = True,
+                  timeout: float = 10.0) -> Dict[str, Ssa3021xTraceSet]:
+    # one trace set from each of several analyzers at once; addresses are hosts or (host, port) pairs
+    addresses = [x if isinstance(x, tuple) else (x, SCPI_PORT) for x in addresses]
+
+    async def one(host, port):
+        async with Ssa3021xClient(host, port, timeout=timeout, binary=binary) as client:
+            return await client.fetch(traces)
+
+    results = await asyncio.gather(*[one(*x) for x in addresses])
+    return {'%s:%d' % x: result for (x, result) in zip(addresses, results)}
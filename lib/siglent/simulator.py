@@ -0,0 +1,133 @@
+import asyncio
+import itertools
+import re
+from typing import Callable, Iterable, List, Pattern, Tuple
+import numpy as np
+from lib.siglent.scpi import AVERAGE_TYPES, POWER_UNITS, TRACE_NAMES, TRACE_TYPES, encode_block
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+
+
+def _mnemonic(table: dict, value: str) -> str:
+    return {v: k for (k, v) in table.items()}.get(value, value)
+
+
+class Ssa3021xSimulator:
+    # serves the scpi subset Ssa3021xClient uses over tcp. each :TRACe:DATA? returns the next capture in turn,
+    # so a list of exported captures plays back as a continuous sweep.
+    def __init__(self, trace_sets: Iterable[Ssa3021xTraceSet]):
+        self.trace_sets = list(trace_sets)
+        if not self.trace_sets:
+            raise ValueError('the simulator needs at least one capture')
+        self.meta = self.trace_sets[0].meta
+        for x in self.trace_sets:
+            if any(x.meta[k] != self.meta[k] for k in ('Number of Points', 'Start Frequency', 'Stop Frequency',
+                                                        'Y Axis Unit')):
+                raise ValueError('captures served together must share their sweep settings')
+        self.queries = 0
+        self._server = None
+        module = self.meta.get('Machine Module', 'SSA3021X')
+        (model, version) = module if isinstance(module, list) else (module, '0')
+        settings = {
+            r'\*IDN\?': 'Siglent Technologies,%s,SIMULATOR,%s' % (model, version),
+            r'UNIT:POW(ER)?\?': _mnemonic(POWER_UNITS, self.meta['Y Axis Unit']),
+            r'SWE(EP)?:POIN(TS)?\?': '%d' % self.meta['Number of Points'],
+            r'FREQ(UENCY)?:STAR(T)?\?': '%.9E' % self.meta['Start Frequency'],
+            r'FREQ(UENCY)?:STOP\?': '%.9E' % self.meta['Stop Frequency'],
+            r'AVER(AGE)?:TYPE\?': _mnemonic(AVERAGE_TYPES, self.meta.get('Average Type')),
+        }
+        self._handlers: List[Tuple[Pattern, Callable]] = [
+            *[(re.compile(k), lambda state, command, arg, value=v: value) for (k, v) in settings.items()],
+            (re.compile(r'TRAC(E)?(\d)?:MODE\?'), self._trace_mode),
+            (re.compile(r'TRAC(E)?(\d)?:DATA\?'), self._trace_data),
+            (re.compile(r'FORM(AT)?(:TRAC(E)?)?(:DATA)?'), self._format),
+            (re.compile(r'SYST(EM)?:ERR(OR)?\?'), self._error),
+        ]
+
+    @staticmethod
+    def from_csv(files: Iterable[str]):
+        return Ssa3021xSimulator([Ssa3021xTraceSet.from_csv(x) for x in files])
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _trace(self, state: dict, n: int):
+        if not 1 <= n <= len(TRACE_NAMES):
+            raise ValueError('trace %d out of range' % n)
+        counter = state['sweeps'].setdefault(n, itertools.count())
+        trace_set = self.trace_sets[next(counter) % len(self.trace_sets)]
+        return trace_set.traces[min(n, len(trace_set.traces)) - 1]
+
+    def _trace_number(self, command: str, arg: str) -> int:
+        # :TRACe2:MODE? and :TRACe:DATA? 2 both name a trace
+        suffix = re.search(r'TRAC(E)?(\d)', command)
+        return int(suffix.group(2)) if suffix else int(arg or 1)
+
+    def _trace_mode(self, state: dict, command: str, arg: str) -> str:
+        trace_set = self.trace_sets[0]
+        n = self._trace_number(command, arg)
+        return _mnemonic(TRACE_TYPES, trace_set.traces[min(n, len(trace_set.traces)) - 1].meta.get('Trace Type'))
+
+    def _trace_data(self, state: dict, command: str, arg: str):
+        pwr = self._trace(state, self._trace_number(command, arg)).pwr_dbm
+        if self.meta['Y Axis Unit'] == 'dBW':
+            pwr = pwr - 30.0
+        if state['format'] == 'REAL':
+            return encode_block(np.asarray(pwr, dtype='<f4').tobytes())
+        return ','.join('%.2f' % x for x in pwr) + ','
+
+    def _format(self, state: dict, command: str, arg: str):
+        state['format'] = 'REAL' if arg.upper().startswith('REAL') else 'ASCII'
+
+    def _error(self, state: dict, command: str, arg: str) -> str:
+        return state['errors'].pop(0) if state['errors'] else '0,"No error"'
+
+    def _handle(self, state: dict, line: str):
+        # returns the response to a query, None for a command. a query the simulator cannot answer still gets
+        # an empty line so the client's responses stay in step; the error goes to the error queue.
+        (command, _, arg) = line.strip().partition(' ')
+        command = command.upper().lstrip(':')
+        try:
+            for (pattern, handler) in self._handlers:
+                if pattern.fullmatch(command):
+                    response = handler(state, command, arg.strip())
+                    break
+            else:
+                raise ValueError('Undefined header')
+        except ValueError as e:
+            state['errors'].append('-113,"%s"' % e)
+            response = None
+        if command.endswith('?'):
+            self.queries += 1
+            return b'' if response is None else response
+        return None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        state = {'format': 'ASCII', 'sweeps': {}, 'errors': []}
+        try:
+            async for raw in reader:
+                for line in raw.decode('ascii').split(';'):
+                    if not line.strip():
+                        continue
+                    response = self._handle(state, line)
+                    if response is not None:
+                        writer.write((response.encode('ascii') if isinstance(response, str) else response) + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
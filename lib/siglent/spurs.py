@@ -0,0 +1,148 @@
+from typing import Iterable, Sequence, Union
+import numpy as np
+from lib.frequency.band_index import BandIndex, NO_BAND
+from lib.frequency.band_set import BandSet
+from lib.siglent.ssa3021x import Ssa3021xTrace
+from lib.siglent.trace_math import TraceMatrix
+
+
+def _running_mean(values: np.ndarray, weights: np.ndarray, window: int) -> np.ndarray:
+    # weighted centred moving average along the last axis from cumulative sums, O(n) for any window
+    half = window // 2
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    csum = np.pad(np.cumsum(values * weights, axis=-1), pad)
+    wsum = np.pad(np.cumsum(weights, axis=-1), pad)
+    n = values.shape[-1]
+    hi = np.minimum(np.arange(n) + half + 1, n)
+    lo = np.maximum(np.arange(n) - half, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (csum[..., hi] - csum[..., lo]) / (wsum[..., hi] - wsum[..., lo])
+
+
+def _running_max(x: np.ndarray, window: int) -> np.ndarray:
+    # centred moving maximum of an odd window along the last axis, -inf beyond the ends. van Herk / Gil-Werman:
+    # prefix and suffix maxima within blocks of window bins, so O(n) for any window.
+    half = window // 2
+    n = x.shape[-1]
+    m = -(-(n + 2*half) // window) * window
+    padded = np.full(x.shape[:-1] + (m,), -np.inf)
+    padded[..., half:half+n] = x
+    blocks = padded.reshape(x.shape[:-1] + (m // window, window))
+    prefix = np.maximum.accumulate(blocks, axis=-1).reshape(padded.shape)
+    suffix = np.maximum.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+    # the window starting at padded bin j ends at j + window - 1, in the same block or the next one
+    return np.maximum(suffix[..., :n], prefix[..., window-1:window-1+n])
+
+
+def noise_floor(pwr_dbm: np.ndarray, window: int = 51, clip_db: float = 3.0, passes: int = 3) -> np.ndarray:
+    # local floor in dbm along the last axis: a moving average that drops points more than a fixed clip_db above
+    # the previous estimate on each pass (a fixed threshold, not a sigma clip), so spurs do not lift it
+    pwr_dbm = np.asarray(pwr_dbm, dtype=np.float64)
+    weights = np.isfinite(pwr_dbm).astype(np.float64)
+    values = np.where(weights > 0, pwr_dbm, 0.0)
+    floor = _running_mean(values, weights, window)
+    for _ in range(passes - 1):
+        keep = weights * (pwr_dbm <= floor + clip_db)
+        update = _running_mean(values, keep, window)
+        floor = np.where(np.isfinite(update), update, floor)
+    return floor
+
+
+def find_peaks(pwr_dbm: np.ndarray, floor_dbm: np.ndarray, threshold_db: float = 6.0,
+               min_distance: int = 1) -> np.ndarray:
+    # (sweep, bin) index pairs of local maxima at least threshold_db above the floor; a plateau reports its
+    # first bin and, with min_distance > 1, only the highest peak within min_distance bins is kept
+    pwr_dbm = np.atleast_2d(pwr_dbm)
+    floor_dbm = np.broadcast_to(floor_dbm, pwr_dbm.shape)
+    x = np.where(np.isfinite(pwr_dbm), pwr_dbm, -np.inf)
+    left = np.pad(x, ((0, 0), (1, 0)), constant_values=-np.inf)[:, :-1]
+    right = np.pad(x, ((0, 0), (0, 1)), constant_values=-np.inf)[:, 1:]
+    peak = (x > left) & (x >= right) & (x >= floor_dbm + threshold_db)
+    if min_distance > 1:
+        peak &= x >= _running_max(x, 2*min_distance - 1)
+    return np.argwhere(peak)
+
+
+class SpurPeaks:
+    # one entry per detected peak; source indexes tx_bands (NO_BAND when no harmonic explains the peak)
+    __slots__ = ('names', 'tx_bands', 'sweep', 'bin', 'freq_hz', 'pwr_dbm', 'floor_dbm', 'source', 'order',
+                 'offset_hz')
+
+    def __init__(self, names, tx_bands, sweep, bin, freq_hz, pwr_dbm, floor_dbm, source, order, offset_hz):
+        self.names = tuple(names)
+        self.tx_bands = tx_bands
+        self.sweep = sweep
+        self.bin = bin
+        self.freq_hz = freq_hz
+        self.pwr_dbm = pwr_dbm
+        self.floor_dbm = floor_dbm
+        self.source = source
+        self.order = order
+        self.offset_hz = offset_hz
+
+    def __len__(self):
+        return len(self.sweep)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.describe(i)
+
+    @property
+    def excess_db(self) -> np.ndarray:
+        return self.pwr_dbm - self.floor_dbm
+
+    @property
+    def attributed(self) -> np.ndarray:
+        return self.source != NO_BAND
+
+    def describe(self, i: int) -> dict:
+        source = self.tx_bands.names[self.source[i]] if self.tx_bands is not None and self.attributed[i] else None
+        return {'trace': self.names[self.sweep[i]], 'freq_hz': float(self.freq_hz[i]),
+                'pwr_dbm': float(self.pwr_dbm[i]), 'excess_db': float(self.excess_db[i]),
+                'source': source, 'order': int(self.order[i]) if source else None,
+                'offset_hz': float(self.offset_hz[i]) if source else None}
+
+
+def attribute_harmonics(freq_hz: np.ndarray, tx_bands: BandSet, orders: Iterable[int] = range(2, 11),
+                        tolerance: float = 0.0, tolerance_hz: float = 0.0):
+    # per frequency, the tx band and order whose harmonic (BandSet.harmonics, FrequencyBand.harmonic for a whole
+    # set) contains it after widening by tolerance (fractional) and tolerance_hz. several candidates resolve to
+    # the lowest order, then the smallest distance outside the unwidened harmonic band.
+    orders = list(orders)
+    freq_hz = np.asarray(freq_hz, dtype=np.float64)
+    harmonics = tx_bands.harmonics(orders)
+    widened = BandSet(names=harmonics.names, low_hz=harmonics.low_hz * (1 - tolerance) - tolerance_hz,
+                      high_hz=harmonics.high_hz * (1 + tolerance) + tolerance_hz, order=harmonics.order)
+    (point, band) = BandIndex(widened).matches(freq_hz)
+    offset = np.maximum(np.maximum(harmonics.low_hz[band] - freq_hz[point], freq_hz[point] - harmonics.high_hz[band]),
+                        0.0)
+    source = np.full(len(freq_hz), NO_BAND)
+    order = np.zeros(len(freq_hz), dtype=np.int64)
+    best_offset = np.full(len(freq_hz), np.nan)
+    # first candidate per point after sorting by (point, order, offset)
+    srt = np.lexsort((offset, harmonics.order[band], point))
+    first = srt[np.concatenate([[True], point[srt][1:] != point[srt][:-1]])] if len(srt) else srt
+    source[point[first]] = band[first] // len(orders)
+    order[point[first]] = harmonics.order[band[first]]
+    best_offset[point[first]] = offset[first]
+    return source, order, best_offset
+
+
+def detect_spurs(traces: Union[TraceMatrix, Sequence[Ssa3021xTrace]], tx_bands: BandSet = None,
+                 orders: Iterable[int] = range(2, 11), window: int = 51, threshold_db: float = 6.0,
+                 min_distance: int = 3, tolerance: float = 0.0, tolerance_hz: float = 0.0) -> SpurPeaks:
+    # all sweeps at once: traces on different axes are first resampled onto a common grid
+    if not isinstance(traces, TraceMatrix):
+        traces = TraceMatrix.from_traces(traces)
+    floor = noise_floor(traces.values, window=window)
+    (sweep, bin) = find_peaks(traces.values, floor, threshold_db=threshold_db, min_distance=min_distance).T
+    freq = traces.freq_hz[bin]
+    if tx_bands is None:
+        (source, order, offset) = (np.full(len(freq), NO_BAND), np.zeros(len(freq), dtype=np.int64),
+                                   np.full(len(freq), np.nan))
+    else:
+        (source, order, offset) = attribute_harmonics(freq, tx_bands, orders, tolerance=tolerance,
+                                                      tolerance_hz=tolerance_hz)
+    return SpurPeaks(names=traces.names, tx_bands=tx_bands, sweep=sweep, bin=bin, freq_hz=freq,
+                     pwr_dbm=traces.values[sweep, bin], floor_dbm=floor[sweep, bin], source=source, order=order,
+                     offset_hz=offset)
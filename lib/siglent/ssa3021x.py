@@ -1,11 +1,28 @@
+from __future__ import annotations
 import os
 import re
-from astropy import units as u
 import bz2
 import io
-from typing import Dict
-import numpy as np
+import time
+import itertools
+import warnings
+from typing import BinaryIO, Dict, Tuple
+from lib import profiling
+from lib.lazy_import import lazy_import
 
+u = lazy_import('astropy.units')
+np = lazy_import('numpy')
+
+Y_AXIS_UNITS = ('dBm', 'dBW')
+# power units a trace can hold: the absolute ones a capture may carry, plus dB for power relative to a baseline
+PWR_UNITS = Y_AXIS_UNITS + ('dB',)
+
+def _check_y_axis_unit(meta: dict):
+    if meta.get('Y Axis Unit') not in Y_AXIS_UNITS:
+        raise ValueError('unsupported Y Axis Unit %r, expected one of %s' % (meta.get('Y Axis Unit'),
+                                                                           ', '.join(Y_AXIS_UNITS)))
+
+@profiling.timed('meta_dict')
 def meta_dict(meta_lines: list) -> dict:
     meta = {x[0]: x[1:] for x in meta_lines}
     for key in meta.keys():
@@ -25,9 +42,142 @@ def meta_dict(meta_lines: list) -> dict:
     return meta
 
 class Ssa3021xTrace:
-    def __init__(self, meta: dict, freq: u.Quantity, pwr: u.Quantity):
-        self.freq = freq.to(u.Hz)
-        self.pwr = pwr.to(u.dB(u.mW))
+    # raw arrays plus their units. a linear sweep keeps its frequency axis as (start, step, n) and builds the
+    # array on every request rather than holding it; power may be held as float32, and its unit-bearing views
+    # are cached (counted in nbytes when they need memory of their own).
+    __slots__ = ('meta', '_freq_hz', '_freq_axis', '_pwr', '_pwr_unit', '_views')
+
+    def __init__(self, meta: dict, freq: u.Quantity, pwr: u.Quantity, pwr_dtype=None, linear_freq: bool = True):
+        pwr = _convert(pwr, u.dB(u.mW))
+        self._init_arrays(meta, _convert(freq, u.Hz).value, pwr.value, 'dBm', pwr_dtype, linear_freq)
+
+    @staticmethod
+    def from_arrays(meta: dict, freq_hz, pwr, pwr_unit: str = 'dBm', pwr_dtype=None, linear_freq: bool = True):
+        if pwr_unit not in PWR_UNITS:
+            raise ValueError('unrecognized power unit: %s' % pwr_unit)
+        trace = Ssa3021xTrace.__new__(Ssa3021xTrace)
+        trace._init_arrays(meta, freq_hz, pwr, pwr_unit, pwr_dtype, linear_freq)
+        return trace
+
+    def _init_arrays(self, meta, freq_hz, pwr, pwr_unit, pwr_dtype, linear_freq):
+        freq_hz = np.asarray(freq_hz, dtype=np.float64)
+        pwr = np.asarray(pwr, dtype=pwr_dtype)
+        if freq_hz.ndim != 1 or freq_hz.shape != pwr.shape:
+            raise ValueError('freq and pwr must be 1-d arrays of the same length')
+        self.meta = meta
+        self._freq_axis = _linear_axis(freq_hz) if linear_freq else None
+        # no copy when the inputs are already in the stored units, so memory-mapped arrays stay mapped
+        self._freq_hz = None if self._freq_axis else _read_only(freq_hz)
+        self._pwr = _read_only(pwr)
+        self._pwr_unit = pwr_unit
+        self._views = {}
+
+    def __len__(self):
+        return len(self._pwr)
+
+    @property
+    def freq_axis(self):
+        return self._freq_axis
+
+    @property
+    def pwr_unit(self) -> str:
+        return self._pwr_unit
+
+    @property
+    def nbytes(self) -> int:
+        # cached views over the stored arrays (or over each other) cost nothing extra
+        owned = [self._pwr]
+        for x in self._views.values():
+            if not any(np.may_share_memory(x, y) for y in owned):
+                owned.append(x)
+        return sum(x.nbytes for x in owned) + (self._freq_hz.nbytes if self._freq_hz is not None else 0)
+
+    @property
+    def freq_hz(self) -> np.ndarray:
+        if self._freq_hz is not None:
+            return self._freq_hz
+        (start, step, n, rounded) = self._freq_axis
+        x = start + step * np.arange(n)
+        if rounded:
+            x = np.round(x)
+        return _read_only(x)
+
+    @property
+    def relative(self) -> bool:
+        return self._pwr_unit == 'dB'
+
+    @property
+    def pwr_dbm(self) -> np.ndarray:
+        if self._pwr_unit == 'dBm':
+            return self._pwr
+        if self.relative:
+            raise ValueError('relative power in dB has no absolute dBm value')
+        x = self._views.get('pwr_dbm')
+        if x is None:
+            x = self._views['pwr_dbm'] = _read_only(self._pwr + 30.0)
+        return x
+
+    @property
+    def pwr_db(self) -> np.ndarray:
+        # power on the trace's own decibel scale: dBm for absolute traces, dB for relative ones
+        return self._pwr if self.relative else self.pwr_dbm
+
+    def freq_in(self, unit: u.Unit = None) -> u.Quantity:
+        unit = u.Hz if unit is None else unit
+        return _convert(u.Quantity(self.freq_hz, u.Hz, copy=False), unit)
+
+    def pwr_in(self, unit: u.Unit = None) -> u.Quantity:
+        scale = u.dB if self.relative else u.dB(u.mW)
+        unit = scale if unit is None else unit
+        key = ('pwr', unit)
+        x = self._views.get(key)
+        if x is None:
+            x = self._views[key] = _convert(u.Decibel(self.pwr_db, scale, copy=False), unit)
+        return x
+
+    @property
+    def freq(self) -> u.Quantity:
+        return self.freq_in(u.Hz)
+
+    @property
+    def pwr(self) -> u.Quantity:
+        return self.pwr_in()
+
+    def clear_views(self):
+        self._views.clear()
+
+
+@profiling.timed('trace_units', nbytes=lambda x: x.nbytes)
+def _convert(x: u.Quantity, unit: u.Unit) -> u.Quantity:
+    if x.unit == unit:
+        return x
+    x = x.to(unit)
+    x.flags.writeable = False
+    return x
+
+
+def _read_only(x: np.ndarray) -> np.ndarray:
+    # a read-only view, so the caller's own array keeps its flags
+    x = x.view()
+    x.flags.writeable = False
+    return x
+
+
+def _linear_axis(freq_hz: np.ndarray):
+    # (start, step, n, rounded) when the axis is a linear sweep, reproduced exactly by the stored parameters.
+    # the instrument exports whole-hz frequencies, so a rounded linear sweep also qualifies.
+    n = len(freq_hz)
+    if n < 2:
+        return None
+    start = float(freq_hz[0])
+    step = (float(freq_hz[-1]) - start) / (n - 1)
+    x = start + step * np.arange(n)
+    if np.array_equal(x, freq_hz):
+        return start, step, n, False
+    if np.array_equal(np.round(x), freq_hz):
+        return start, step, n, True
+    return None
+
 
 class Ssa3021xTraceSet:
     def __init__(self, meta: dict, traces: Dict[str, str]):
@@ -35,39 +185,230 @@ class Ssa3021xTraceSet:
         self.traces = traces
 
     @staticmethod
-    def from_csv(file: str):
+    def from_csv(file: str, lazy: bool = False, pwr_dtype=None):
         if not os.path.exists(file):
             raise ValueError('unrecognized filepath: %s' % file)
-        if re.search(r'\.bz2$', file):
-            with open(file, 'rb') as f:
-                buf = io.StringIO(bz2.decompress(f.read()).decode('utf-8'))
-                lines = [x.rstrip().split(',') for x in buf.readlines()]
-        else:
-            with open(file, 'r') as f:
-                lines = [x.rstrip().split(',') for x in f.readlines()]
-        trace_indx = [i for (i, x) in enumerate(lines) if x[0] == 'Trace Data']
-        meta = meta_dict(meta_lines=lines[0:trace_indx[0]])
-        if meta['Y Axis Unit'] == 'dBm':
-            y_units = u.dB(u.mW)
-        elif meta['Y Axis Unit'] == 'dBW':
-            y_units = u.dB(u.W)
-        else:
-            raise ValueError('fixme')
+        if not lazy:
+            with _open_binary(file) as f:
+                return Ssa3021xTraceSet._parse(f, pwr_dtype=pwr_dtype)
+        # only the header is read here; the file is reopened when a trace is first decoded
+        with _open_binary(file) as f:
+            (header, trace_meta, offset) = _first_block(f)
+        meta = meta_dict(meta_lines=header)
+        _check_y_axis_unit(meta)
+        traces = Ssa3021xLazyTraces(file=file, num_points=meta['Number of Points'], y_axis_unit=meta['Y Axis Unit'],
+                                    first_block=(trace_meta, offset), pwr_dtype=pwr_dtype)
+        return Ssa3021xTraceSet(meta=meta, traces=traces)
 
+    @staticmethod
+    def read_meta(file: str) -> dict:
+        if not os.path.exists(file):
+            raise ValueError('unrecognized filepath: %s' % file)
+        with _open_binary(file) as f:
+            return meta_dict(meta_lines=_first_block(f)[0])
+
+    @staticmethod
+    def _parse(f: BinaryIO, pwr_dtype=None):
+        meta = None
         traces = []
-        for i in trace_indx:
-            for k in range(10):
-                if lines[i-k][0] == 'Trace Name':
-                    trace_name = lines[i-k][1]
-                    trace_meta = meta_dict(meta_lines=lines[i-k:i])
-                    break
-                if k == 9:
-                    raise ValueError('fixme')
-            
-            k = 1
-
-            freq, val = zip(*[lines[i+1+k] for k in range(meta['Number of Points'])])
-            freq = np.array([float(x) for x in freq]) * u.Hz
-            val = np.array([float(x) for x in val]) * y_units
-            traces.append(Ssa3021xTrace(meta=trace_meta, freq=freq, pwr=val))
-        return Ssa3021xTraceSet(meta=meta, traces=traces)
\ No newline at end of file
+        for (header, trace_meta, _) in _blocks(f):
+            if meta is None:
+                meta = meta_dict(meta_lines=header)
+                _check_y_axis_unit(meta)
+            freq, val = read_points(f, meta['Number of Points'])
+            traces.append(Ssa3021xTrace.from_arrays(meta=trace_meta, freq_hz=freq, pwr=val,
+                                                    pwr_unit=meta['Y Axis Unit'], pwr_dtype=pwr_dtype))
+        if meta is None:
+            raise ValueError('no Trace Data found')
+        return Ssa3021xTraceSet(meta=meta, traces=traces)
+
+
+class Ssa3021xLazyTraces:
+    # sequence of traces that records where each Trace Data block starts and decodes a trace on first access.
+    # the file is opened on the first decode and then read forward, so decoding every trace in order
+    # decompresses a .bz2 capture once; only going back to an earlier trace (including after len() scanned to
+    # the end) rewinds it. the stream is closed once every trace is decoded, or by close() / leaving a with
+    # block, after which a further access reopens it.
+    def __init__(self, file: str, num_points: int, y_axis_unit: str, first_block: Tuple[dict, int],
+                 pwr_dtype=None):
+        self._f = None
+        self.file = file
+        self.num_points = num_points
+        self.y_axis_unit = y_axis_unit
+        self.pwr_dtype = pwr_dtype
+        self._blocks = [first_block]
+        # offset just past the data rows of each block, once they have been read or skipped
+        self._ends = {}
+        self._complete = False
+        self._traces = {}
+
+    def _stream(self, offset: int) -> BinaryIO:
+        if self._f is None:
+            self._f = _open_binary(self.file)
+        if self._f.tell() != offset:
+            self._f.seek(offset)
+        return self._f
+
+    def _skip(self, i: int) -> BinaryIO:
+        # the stream positioned past the data rows of block i
+        if i in self._ends:
+            return self._stream(self._ends[i])
+        f = self._stream(self._blocks[i][1])
+        for _ in itertools.islice(f, self.num_points):
+            pass
+        self._ends[i] = f.tell()
+        return f
+
+    def _scan(self, stop_index: int = None):
+        if self._complete or (stop_index is not None and stop_index < len(self._blocks)):
+            return
+        f = self._skip(len(self._blocks) - 1)
+        for (_, trace_meta, offset) in _blocks(f):
+            self._blocks.append((trace_meta, offset))
+            if stop_index is not None and stop_index < len(self._blocks):
+                return
+            self._skip(len(self._blocks) - 1)
+        self._complete = True
+        if len(self._traces) == len(self._blocks):
+            self.close()
+
+    def _index(self, i: int) -> int:
+        if i < 0:
+            i += len(self)
+        self._scan(stop_index=i)
+        if not 0 <= i < len(self._blocks):
+            raise IndexError('trace index out of range')
+        return i
+
+    def __len__(self):
+        self._scan()
+        return len(self._blocks)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        i = self._index(i)
+        if i not in self._traces:
+            (trace_meta, offset) = self._blocks[i]
+            f = self._stream(offset)
+            freq, val = read_points(f, self.num_points)
+            self._ends[i] = f.tell()
+            self._traces[i] = Ssa3021xTrace.from_arrays(meta=trace_meta, freq_hz=freq, pwr=val,
+                                                        pwr_unit=self.y_axis_unit, pwr_dtype=self.pwr_dtype)
+            if self._complete and len(self._traces) == len(self._blocks):
+                self.close()
+        return self._traces[i]
+
+    def __iter__(self):
+        i = 0
+        while True:
+            try:
+                yield self[i]
+            except IndexError:
+                return
+            i += 1
+
+    def meta(self, i: int) -> dict:
+        return self._blocks[self._index(i)][0]
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+def _open_binary(file: str) -> BinaryIO:
+    if re.search(r'\.bz2$', file):
+        # BZ2File iterates lines through python-level readline calls; a buffered reader on top is far faster
+        raw = bz2.BZ2File(file, 'rb')
+        profiler = profiling.current()
+        if profiler is not None:
+            raw = profiling.TimedReader(raw, 'bz2', profiler)
+        return io.BufferedReader(raw, buffer_size=1 << 16)
+    return open(file, 'rb')
+
+
+def _blocks(f: BinaryIO):
+    # yields (header lines, trace meta, offset of the first data row) for each Trace Data block. header
+    # lines are everything before the first block; the caller reads or skips the data rows itself.
+    header = []
+    trace_lines = []
+    first = True
+    profiler = profiling.current()
+    if profiler is not None:
+        (start, pos) = (time.perf_counter(), f.tell())
+    for raw in iter(f.readline, b''):
+        line = raw.decode('utf-8').rstrip().split(',')
+        if line[0] == 'Trace Name':
+            trace_lines = []
+        trace_lines.append(line)
+        if line[0] != 'Trace Data':
+            if first:
+                header.append(line)
+            continue
+        if trace_lines[0][0] != 'Trace Name' or len(trace_lines) > 10:
+            raise ValueError('malformed trace header: Trace Data must follow a Trace Name line within 10 lines')
+        (meta, offset) = (meta_dict(meta_lines=trace_lines[:-1]), f.tell())
+        if profiler is not None:
+            profiler.add('line_split.header', time.perf_counter() - start, offset - pos)
+        yield header, meta, offset
+        if profiler is not None:
+            (start, pos) = (time.perf_counter(), f.tell())
+        first = False
+        trace_lines = []
+
+
+def _first_block(f: BinaryIO):
+    for block in _blocks(f):
+        return block
+    raise ValueError('no Trace Data found')
+
+
+def _check_rows(text: bytes, n: int) -> bool:
+    # every one of the n lines holds exactly one comma, so a row with an extra column next to a row missing one
+    # cannot shift the values of the rows after them
+    raw = np.frombuffer(text, dtype=np.uint8)
+    commas = np.flatnonzero(raw == ord(','))
+    if len(commas) != n:
+        return False
+    newlines = np.flatnonzero(raw == ord('\n'))
+    return bool(np.all(np.searchsorted(newlines, commas) == np.arange(n)))
+
+
+def read_points(f: BinaryIO, num_points: int, chunk_lines: int = 1 << 16) -> Tuple[np.ndarray, np.ndarray]:
+    # reads num_points "freq,pwr" rows into preallocated arrays, a bounded block of lines at a time
+    freq = np.empty(num_points, dtype=np.float64)
+    pwr = np.empty(num_points, dtype=np.float64)
+    pos = 0
+    profiler = profiling.current()
+    while pos < num_points:
+        n = min(chunk_lines, num_points - pos)
+        if profiler is not None:
+            start = time.perf_counter()
+        text = b''.join(itertools.islice(f, n))
+        if not _check_rows(text, n):
+            raise ValueError('malformed or truncated Trace Data: expected %d "freq,pwr" rows' % num_points)
+        try:
+            # numpy reports text it could not parse to the end only through a DeprecationWarning
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', DeprecationWarning)
+                values = np.fromstring(text.replace(b',', b' '), dtype=np.float64, sep=' ')
+        except DeprecationWarning:
+            values = None
+        if profiler is not None:
+            profiler.add('line_split.points', time.perf_counter() - start, len(text))
+        if values is None or len(values) != 2*n:
+            raise ValueError('malformed or truncated Trace Data: expected %d "freq,pwr" rows' % num_points)
+        freq[pos:pos+n] = values[0::2]
+        pwr[pos:pos+n] = values[1::2]
+        pos += n
+    return freq, pwr
@@ -0,0 +1,160 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+import numpy as np
+from lib import profiling
+from lib.frequency.band_set import BandSet
+from lib.siglent.rejection import RejectionMatrix, _sorted_axis, stat_names
+from lib.siglent.ssa3021x import Ssa3021xTrace, Ssa3021xTraceSet
+
+
+def capture_key(file: str) -> str:
+    return re.sub(r'\.csv(\.bz2)?$', '', os.path.basename(file))
+
+
+def iter_trace_chunks(files: Iterable[str], chunk_size: int = 16, trace_index: int = 0,
+                      key: Callable[[str], str] = capture_key) -> Iterator[List[Tuple[str, Ssa3021xTrace]]]:
+    # lists of at most chunk_size (key, trace) pairs; files are opened lazily, so only the selected trace of
+    # each capture is decoded and at most one chunk is held at a time
+    chunk = []
+    for file in files:
+        with Ssa3021xTraceSet.from_csv(file, lazy=True).traces as traces:
+            selected = traces if trace_index is None else [traces[trace_index]]
+            for trace in selected:
+                chunk.append((key(file), trace))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+class BandReduction:
+    # per (row, band) count, min, max and sum of the rejection (negated power) of every point strictly inside
+    # the band, plus a fixed-bin histogram for percentiles (uint32 counts, 8 kB per band and row by default).
+    # all of it adds up, so partial reductions over any split of the input merge to the same result in any
+    # order; percentiles resolve to the histogram step, interpolated within a bin.
+    def __init__(self, bands: BandSet, hist_range_db: Tuple[float, float] = (-50.0, 150.0),
+                 hist_step_db: float = 0.1):
+        self.bands = bands
+        self.hist_range_db = tuple(hist_range_db)
+        self.hist_step_db = hist_step_db
+        self.num_bins = int(np.ceil((hist_range_db[1] - hist_range_db[0]) / hist_step_db))
+        self.rows: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def _row(self, key: str) -> Dict[str, np.ndarray]:
+        row = self.rows.get(key)
+        if row is None:
+            n = len(self.bands)
+            row = self.rows[key] = {'count': np.zeros(n, dtype=np.int64), 'min': np.full(n, np.inf),
+                                    'max': np.full(n, -np.inf), 'sum': np.zeros(n),
+                                    'hist': np.zeros((n, self.num_bins), dtype=np.uint32)}
+        return row
+
+    def update(self, key: str, trace: Ssa3021xTrace):
+        (freq, pwr) = _sorted_axis(trace)
+        values = -np.asarray(pwr, dtype=np.float64)
+        # band edges are exclusive, as in rejection_matrix
+        start = np.searchsorted(freq, self.bands.low_hz, side='right')
+        stop = np.searchsorted(freq, self.bands.high_hz, side='left')
+        count = np.maximum(stop - start, 0)
+        if not count.any():
+            self._row(key)
+            return
+        band = np.repeat(np.arange(len(count)), count)
+        pos = np.repeat(start - np.cumsum(count) + count, count) + np.arange(count.sum())
+        x = values[pos]
+        row = self._row(key)
+        row['count'] += count
+        # each band's points are contiguous in x, so the non-empty bands reduce in place from their offsets
+        found = np.flatnonzero(count)
+        offset = (np.cumsum(count) - count)[found]
+        row['min'][found] = np.minimum(row['min'][found], np.minimum.reduceat(x, offset))
+        row['max'][found] = np.maximum(row['max'][found], np.maximum.reduceat(x, offset))
+        row['sum'] += np.bincount(band, weights=x, minlength=len(count))
+        b = np.clip(((x - self.hist_range_db[0]) / self.hist_step_db).astype(np.intp), 0, self.num_bins - 1)
+        hist = np.bincount(band * self.num_bins + b, minlength=len(count) * self.num_bins)
+        row['hist'] += hist.reshape(len(count), self.num_bins).astype(row['hist'].dtype)
+
+    def update_chunk(self, chunk: Iterable[Tuple[str, Ssa3021xTrace]]):
+        for (key, trace) in chunk:
+            self.update(key, trace)
+
+    def merge(self, other: 'BandReduction') -> 'BandReduction':
+        if other.bands.names != self.bands.names or other.hist_range_db != self.hist_range_db \
+                or other.hist_step_db != self.hist_step_db:
+            raise ValueError('only reductions over the same bands and histogram can be merged')
+        for (key, theirs) in other.rows.items():
+            mine = self._row(key)
+            mine['count'] += theirs['count']
+            np.minimum(mine['min'], theirs['min'], out=mine['min'])
+            np.maximum(mine['max'], theirs['max'], out=mine['max'])
+            mine['sum'] += theirs['sum']
+            mine['hist'] += theirs['hist']
+        return self
+
+    def _order_stat(self, hist: np.ndarray, cdf: np.ndarray, rank: np.ndarray) -> np.ndarray:
+        # the rank-th smallest value (1-based), with the points of a bin spread evenly across it
+        k = np.minimum((cdf < rank[:, None]).sum(axis=1), self.num_bins - 1)
+        inside = hist[np.arange(len(k)), k]
+        before = cdf[np.arange(len(k)), k] - inside
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(inside > 0, (rank - before - 0.5) / inside, 0.5)
+        return self.hist_range_db[0] + (k + frac) * self.hist_step_db
+
+    def _percentile(self, hist: np.ndarray, count: np.ndarray, q: float) -> np.ndarray:
+        # interpolates between neighbouring order statistics like np.percentile
+        cdf = np.cumsum(hist, axis=1, dtype=np.int64)
+        h = q / 100.0 * np.maximum(count - 1, 0)
+        lower = self._order_stat(hist, cdf, np.floor(h) + 1)
+        upper = self._order_stat(hist, cdf, np.minimum(np.floor(h) + 2, np.maximum(count, 1)))
+        return lower + (h - np.floor(h)) * (upper - lower)
+
+    def to_matrix(self, rows: Sequence[str] = None, percentiles: Sequence[float] = ()) -> RejectionMatrix:
+        rows = sorted(self.rows) if rows is None else list(rows)
+        percentiles = list(percentiles)
+        values = np.full((len(rows), len(self.bands), 3 + len(percentiles)), np.nan)
+        for (i, key) in enumerate(rows):
+            row = self.rows.get(key)
+            if row is None:
+                continue
+            found = row['count'] > 0
+            values[i, found, 0] = row['min'][found]
+            values[i, found, 1] = row['max'][found]
+            values[i, found, 2] = row['sum'][found] / row['count'][found]
+            for (m, q) in enumerate(percentiles):
+                p = self._percentile(row['hist'], row['count'], q)
+                values[i, found, 3 + m] = np.clip(p, row['min'], row['max'])[found]
+        return RejectionMatrix(rows=rows, columns=self.bands.names, stats=stat_names(percentiles), values=values)
+
+
+def _reduce_files(files: List[str], bands: BandSet, trace_index: int, key: Callable[[str], str],
+                  chunk_size: int, hist_range_db: Tuple[float, float], hist_step_db: float) -> BandReduction:
+    reduction = BandReduction(bands, hist_range_db=hist_range_db, hist_step_db=hist_step_db)
+    for chunk in iter_trace_chunks(files, chunk_size=chunk_size, trace_index=trace_index, key=key):
+        reduction.update_chunk(chunk)
+    return reduction
+
+
+def reduce_files(files: Iterable[str], bands: BandSet, workers: int = None, trace_index: int = 0,
+                 key: Callable[[str], str] = capture_key, chunk_size: int = 16,
+                 hist_range_db: Tuple[float, float] = (-50.0, 150.0), hist_step_db: float = 0.1) -> BandReduction:
+    # each worker reduces an interleaved share of the files and the partial reductions are merged; key must
+    # be a module-level function to reach the workers
+    files = list(files)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(files)))
+    args = (bands, trace_index, key, chunk_size, tuple(hist_range_db), hist_step_db)
+    if workers == 1:
+        return _reduce_files(files, *args)
+    profile = profiling.current() is not None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(profiling.call_profiled, profile, _reduce_files, files[w::workers], *args)
+                   for w in range(workers)]
+        partials = [profiling.merge_profile(x.result()) for x in futures]
+    result = partials[0]
+    for partial in partials[1:]:
+        result.merge(partial)
+    return result
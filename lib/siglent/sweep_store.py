@@ -0,0 +1,246 @@
+import os
+import time
+from typing import Dict, Iterable, NamedTuple, Sequence, Tuple
+import numpy as np
+from lib.siglent.ssa3021x import Ssa3021xTrace
+
+AVERAGE_TYPES = ('Log Pwr', 'Pwr', 'Voltage')
+
+
+class SweepStats(NamedTuple):
+    count: int
+    max: np.ndarray
+    min: np.ndarray
+    avg_log: np.ndarray
+    avg_pwr: np.ndarray
+    avg_voltage: np.ndarray
+    percentiles: Dict[float, np.ndarray]
+
+    def average(self, average_type: str = 'Log Pwr') -> np.ndarray:
+        return {'Log Pwr': self.avg_log, 'Pwr': self.avg_pwr, 'Voltage': self.avg_voltage}[average_type]
+
+
+def _mw(pwr_dbm: np.ndarray) -> np.ndarray:
+    return np.power(10.0, pwr_dbm / 10.0)
+
+
+def _stats(pwr_dbm: np.ndarray, percentiles: Sequence[float]) -> SweepStats:
+    # exact statistics over a (sweeps x bins) block
+    if len(pwr_dbm) == 0:
+        empty = np.full(pwr_dbm.shape[1], np.nan)
+        return SweepStats(0, empty, empty, empty, empty, empty, {q: empty for q in percentiles})
+    pwr_dbm = pwr_dbm.astype(np.float64)
+    mw = _mw(pwr_dbm)
+    return SweepStats(count=len(pwr_dbm),
+                      max=pwr_dbm.max(axis=0),
+                      min=pwr_dbm.min(axis=0),
+                      avg_log=pwr_dbm.mean(axis=0),
+                      avg_pwr=10.0 * np.log10(mw.mean(axis=0)),
+                      avg_voltage=20.0 * np.log10(np.sqrt(mw).mean(axis=0)),
+                      percentiles={q: np.percentile(pwr_dbm, q, axis=0) for q in percentiles})
+
+
+def _open_array(file: str, dtype, shape: tuple) -> Tuple[np.ndarray, bool]:
+    # an existing .npy is mapped as it is, a missing one is created; the flag says whether it existed
+    if os.path.exists(file):
+        x = np.load(file, mmap_mode='r+')
+        if x.shape != shape or x.dtype != np.dtype(dtype):
+            raise ValueError('%s holds %s %s, the store needs %s %s' % (file, x.dtype, x.shape, np.dtype(dtype),
+                                                                      shape))
+        return x, True
+    return np.lib.format.open_memmap(file, mode='w+', dtype=dtype, shape=shape), False
+
+
+class SweepStore:
+    # sweeps go into a fixed-capacity ring buffer (in memory or a memory-mapped file) for time-window queries,
+    # while max/min hold, the three SSA3021X average types and a per-bin power histogram are updated in
+    # O(bins) per sweep over the whole history. a store reopened from path rebuilds those from the sweeps the
+    # files still hold.
+    def __init__(self, freq_hz, capacity: int = 1024, pwr_dtype=np.float32, path: str = None,
+                 average_type: str = 'Log Pwr', hist_range_db: Tuple[float, float] = (-160.0, 40.0),
+                 hist_step_db: float = 0.5):
+        if capacity < 1:
+            raise ValueError('capacity must be positive')
+        if average_type not in AVERAGE_TYPES:
+            raise ValueError('unrecognized average type: %s' % average_type)
+        self.freq_hz = np.asarray(freq_hz, dtype=np.float64)
+        num_bins = len(self.freq_hz)
+        self.capacity = capacity
+        self.average_type = average_type
+        reopened = False
+        if path is None:
+            self._ring = np.empty((capacity, num_bins), dtype=pwr_dtype)
+            self._times = np.full(capacity, np.nan)
+        else:
+            os.makedirs(path, exist_ok=True)
+            (self._ring, ring_existed) = _open_array(os.path.join(path, 'sweeps.npy'), pwr_dtype,
+                                                     (capacity, num_bins))
+            (self._times, reopened) = _open_array(os.path.join(path, 'times.npy'), np.float64, (capacity,))
+            if not (ring_existed and reopened):
+                self._times[:] = np.nan
+                reopened = False
+        self._head = 0
+        self.count = 0
+        self.latest = np.full(num_bins, np.nan)
+        self._max = np.full(num_bins, -np.inf)
+        self._min = np.full(num_bins, np.inf)
+        self._sum_dbm = np.zeros(num_bins)
+        self._sum_mw = np.zeros(num_bins)
+        self._sum_sqrt_mw = np.zeros(num_bins)
+        if hist_step_db:
+            self._hist_lo = hist_range_db[0]
+            self._hist_step = hist_step_db
+            num_hist = int(np.ceil((hist_range_db[1] - hist_range_db[0]) / hist_step_db))
+            self._hist = np.zeros((num_bins, num_hist), dtype=np.uint32)
+        else:
+            self._hist = None
+        if reopened:
+            times = np.asarray(self._times)
+            rows = np.nonzero(~np.isnan(times))[0]
+            rows = rows[np.argsort(times[rows], kind='stable')]
+            for row in rows:
+                self._accumulate(np.asarray(self._ring[row], dtype=np.float64))
+            if len(rows):
+                self._head = (rows[-1] + 1) % capacity
+
+    @staticmethod
+    def from_trace(trace: Ssa3021xTrace, set_meta: dict = None, **kwargs):
+        if set_meta and 'average_type' not in kwargs and set_meta.get('Average Type') in AVERAGE_TYPES:
+            kwargs['average_type'] = set_meta['Average Type']
+        return SweepStore(freq_hz=trace.freq_hz, **kwargs)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._ring is None
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError('the sweep store is closed')
+
+    def flush(self):
+        # writes the buffered sweeps of a file-backed store through to its files; a no-op in memory
+        self._check_open()
+        for x in (self._ring, self._times):
+            if isinstance(x, np.memmap):
+                x.flush()
+
+    def close(self):
+        # flushes and releases the buffered sweeps; the whole-history statistics stay readable
+        if self.closed:
+            return
+        self.flush()
+        self._ring = None
+        self._times = None
+
+    def append(self, sweep, timestamp: float = None):
+        self._check_open()
+        if isinstance(sweep, Ssa3021xTrace):
+            if len(sweep) != len(self.freq_hz) or sweep.freq_hz[0] != self.freq_hz[0] \
+                    or sweep.freq_hz[-1] != self.freq_hz[-1]:
+                raise ValueError('sweep frequency axis does not match the store')
+            sweep = sweep.pwr_dbm
+        pwr = np.asarray(sweep, dtype=np.float64)
+        if pwr.shape != self.freq_hz.shape:
+            raise ValueError('expected %d bins, got %s' % (len(self.freq_hz), pwr.shape))
+        self._ring[self._head] = pwr
+        self._times[self._head] = time.time() if timestamp is None else timestamp
+        self._head = (self._head + 1) % self.capacity
+        self._accumulate(pwr)
+
+    def _accumulate(self, pwr: np.ndarray):
+        self.count += 1
+        # a copy, so a caller reusing its acquisition buffer does not change it afterwards
+        self.latest[:] = pwr
+        np.maximum(self._max, pwr, out=self._max)
+        np.minimum(self._min, pwr, out=self._min)
+        self._sum_dbm += pwr
+        mw = _mw(pwr)
+        self._sum_mw += mw
+        self._sum_sqrt_mw += np.sqrt(mw)
+        if self._hist is not None:
+            idx = ((pwr - self._hist_lo) / self._hist_step).astype(np.intp)
+            np.clip(idx, 0, self._hist.shape[1] - 1, out=idx)
+            self._hist[np.arange(len(idx)), idx] += 1
+
+    def extend(self, sweeps: Iterable, timestamps: Iterable[float] = None):
+        if timestamps is None:
+            for sweep in sweeps:
+                self.append(sweep)
+        else:
+            for (sweep, timestamp) in zip(sweeps, timestamps):
+                self.append(sweep, timestamp)
+
+    @property
+    def max_hold(self) -> np.ndarray:
+        return self._max.copy() if self.count else np.full(len(self.freq_hz), np.nan)
+
+    @property
+    def min_hold(self) -> np.ndarray:
+        return self._min.copy() if self.count else np.full(len(self.freq_hz), np.nan)
+
+    def average(self, average_type: str = None) -> np.ndarray:
+        average_type = average_type or self.average_type
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if average_type == 'Log Pwr':
+                return self._sum_dbm / self.count
+            elif average_type == 'Pwr':
+                return 10.0 * np.log10(self._sum_mw / self.count)
+            elif average_type == 'Voltage':
+                return 20.0 * np.log10(self._sum_sqrt_mw / self.count)
+        raise ValueError('unrecognized average type: %s' % average_type)
+
+    def percentile(self, q: float) -> np.ndarray:
+        # over the whole history from the per-bin histogram, resolved to the histogram step (upper bin edge)
+        if self._hist is None:
+            raise ValueError('the power histogram is disabled')
+        if self.count == 0:
+            return np.full(len(self.freq_hz), np.nan)
+        cdf = np.cumsum(self._hist, axis=1)
+        rank = np.ceil(q / 100.0 * self.count)
+        idx = np.argmax(cdf >= max(rank, 1), axis=1)
+        return self._hist_lo + (idx + 1) * self._hist_step
+
+    def view(self, trace_type: str) -> np.ndarray:
+        # the statistic the analyzer itself would show for a 'Trace Type' setting
+        if trace_type == 'Max Hold':
+            return self.max_hold
+        elif trace_type == 'Min Hold':
+            return self.min_hold
+        elif trace_type == 'Average':
+            return self.average()
+        elif trace_type in ('Clear Write', 'View'):
+            return self.latest.copy()
+        raise ValueError('unrecognized trace type: %s' % trace_type)
+
+    def window(self, start: float = None, stop: float = None, percentiles: Sequence[float] = ()) -> SweepStats:
+        # exact statistics over buffered sweeps with start <= timestamp <= stop
+        self._check_open()
+        times = np.asarray(self._times)
+        mask = ~np.isnan(times)
+        if start is not None:
+            mask &= times >= start
+        if stop is not None:
+            mask &= times <= stop
+        rows = np.nonzero(mask)[0]
+        return _stats(np.asarray(self._ring[rows]), percentiles)
+
+    def sweeps(self, start: float = None, stop: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        # buffered (timestamps, sweeps) in time order
+        self._check_open()
+        times = np.asarray(self._times)
+        order = np.argsort(times[~np.isnan(times)], kind='stable')
+        rows = np.nonzero(~np.isnan(times))[0][order]
+        if start is not None:
+            rows = rows[times[rows] >= start]
+        if stop is not None:
+            rows = rows[times[rows] <= stop]
+        return times[rows], np.asarray(self._ring[rows])
@@ -0,0 +1,127 @@
+import os
+import json
+import shutil
+import hashlib
+from typing import Optional
+import numpy as np
+from lib.siglent.ssa3021x import Ssa3021xTrace, Ssa3021xTraceSet
+from path_data import path_output
+
+CACHE_VERSION = 2
+
+
+def file_fingerprint(file: str, content_hash: bool = True) -> dict:
+    stat = os.stat(file)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if content_hash:
+        fingerprint['sha256'] = file_hash(file)
+    return fingerprint
+
+
+def file_hash(file: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class TraceCache:
+    def __init__(self, path_cache: str = None, enabled: bool = True, verify_hash: bool = False):
+        self.path_cache = path_cache or os.path.join(path_output, 'trace-cache')
+        self.enabled = enabled
+        self.verify_hash = verify_hash
+
+    def _paths(self, file: str):
+        file = os.path.abspath(file)
+        key = '%s-%s' % (os.path.basename(file), hashlib.sha1(file.encode('utf-8')).hexdigest()[:16])
+        base = os.path.join(self.path_cache, key)
+        return base + '.json', base + '.npy'
+
+    def load(self, file: str) -> Ssa3021xTraceSet:
+        if not self.enabled:
+            return Ssa3021xTraceSet.from_csv(file)
+        trace_set = self.lookup(file)
+        if trace_set is None:
+            trace_set = self.rebuild(file)
+        return trace_set
+
+    def lookup(self, file: str) -> Optional[Ssa3021xTraceSet]:
+        if not os.path.exists(file):
+            raise ValueError('unrecognized filepath: %s' % file)
+        path_json, path_npy = self._paths(file)
+        try:
+            with open(path_json, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != CACHE_VERSION or not self._is_current(file, path_json, entry):
+            return None
+        try:
+            data = np.load(path_npy, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # the mapped arrays are used as they are, linear axes are not re-detected
+        traces = [Ssa3021xTrace.from_arrays(meta=trace_meta, freq_hz=data[i, 0], pwr=data[i, 1],
+                                            pwr_unit=entry['pwr_unit'], linear_freq=False)
+                  for (i, trace_meta) in enumerate(entry['trace_meta'])]
+        return Ssa3021xTraceSet(meta=entry['meta'], traces=traces)
+
+    def _is_current(self, file: str, path_json: str, entry: dict) -> bool:
+        source = entry['source']
+        stat = os.stat(file)
+        if stat.st_size != source['size']:
+            return False
+        if stat.st_mtime_ns == source['mtime_ns'] and not self.verify_hash:
+            return True
+        # same size but touched (or verification requested): the content hash decides
+        if file_hash(file) != source['sha256']:
+            return False
+        if stat.st_mtime_ns != source['mtime_ns']:
+            entry['source']['mtime_ns'] = stat.st_mtime_ns
+            self._write_json(path_json, entry)
+        return True
+
+    def store(self, file: str, trace_set: Ssa3021xTraceSet):
+        path_json, path_npy = self._paths(file)
+        os.makedirs(self.path_cache, exist_ok=True)
+        num_points = len(trace_set.traces[0].freq) if trace_set.traces else 0
+        data = np.empty((len(trace_set.traces), 2, num_points), dtype=np.float64)
+        for (i, trace) in enumerate(trace_set.traces):
+            data[i, 0] = trace.freq_hz
+            data[i, 1] = trace.pwr_dbm
+        entry = {
+            'version': CACHE_VERSION,
+            'source': {'path': os.path.abspath(file), **file_fingerprint(file)},
+            'pwr_unit': 'dBm',
+            'meta': trace_set.meta,
+            'trace_meta': [trace.meta for trace in trace_set.traces],
+        }
+        # the json entry is written last, so a partially written cache entry is never treated as valid
+        self.invalidate(file)
+        path_tmp = path_npy + '.tmp'
+        with open(path_tmp, 'wb') as f:
+            np.save(f, data)
+        os.replace(path_tmp, path_npy)
+        self._write_json(path_json, entry)
+
+    @staticmethod
+    def _write_json(path_json: str, entry: dict):
+        path_tmp = path_json + '.tmp'
+        with open(path_tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(path_tmp, path_json)
+
+    def rebuild(self, file: str) -> Ssa3021xTraceSet:
+        trace_set = Ssa3021xTraceSet.from_csv(file)
+        self.store(file, trace_set)
+        return self.lookup(file) or trace_set
+
+    def invalidate(self, file: str):
+        for path in self._paths(file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        if os.path.exists(self.path_cache):
+            shutil.rmtree(self.path_cache)
@@ -0,0 +1,157 @@
+from typing import Dict, List, Sequence, Tuple, Union
+import numpy as np
+from lib.siglent.ssa3021x import Ssa3021xTrace
+
+DOMAINS = ('log', 'pwr')
+
+
+def common_grid(traces: Sequence[Ssa3021xTrace], num_points: int = None, overlap: bool = True) -> np.ndarray:
+    # a linear grid over the span every trace covers (overlap) or any trace covers, at the finest input density
+    starts = np.array([x.freq_hz[0] for x in traces])
+    stops = np.array([x.freq_hz[-1] for x in traces])
+    (start, stop) = (starts.max(), stops.min()) if overlap else (starts.min(), stops.max())
+    if stop < start:
+        raise ValueError('the traces share no frequency span')
+    if num_points is None:
+        num_points = max(len(x) for x in traces)
+    return np.linspace(start, stop, num_points)
+
+
+def _interp_rows(axis: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    # linear interpolation of every row of values (rows x len(axis)) at grid in one pass; nan outside the axis
+    if axis.shape == grid.shape and np.array_equal(axis, grid):
+        return values.astype(np.float64)
+    i = np.clip(np.searchsorted(axis, grid, side='right'), 1, len(axis) - 1)
+    (x0, x1) = (axis[i - 1], axis[i])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(x1 > x0, (grid - x0) / (x1 - x0), 0.0)
+    out = values[:, i - 1] * (1 - w) + values[:, i] * w
+    out[:, (grid < axis[0]) | (grid > axis[-1])] = np.nan
+    return out
+
+
+class TraceMatrix:
+    # power of many traces on one frequency grid, one row per trace: absolute in dBm, or relative to a baseline
+    # in dB once subtracted
+    __slots__ = ('names', 'freq_hz', 'values', 'unit')
+
+    def __init__(self, names: Sequence[str], freq_hz: np.ndarray, values: np.ndarray, unit: str = 'dBm'):
+        if values.shape != (len(names), len(freq_hz)):
+            raise ValueError('values shape %s does not match the labels' % (values.shape,))
+        if unit not in ('dBm', 'dB'):
+            raise ValueError('unrecognized power unit: %s' % unit)
+        self.names = tuple(names)
+        self.freq_hz = freq_hz
+        self.values = values
+        self.unit = unit
+
+    @staticmethod
+    def from_traces(traces: Union[Dict[str, Ssa3021xTrace], Sequence[Ssa3021xTrace]], freq_hz: np.ndarray = None,
+                    num_points: int = None, overlap: bool = True):
+        if not isinstance(traces, dict):
+            traces = {str(i): x for (i, x) in enumerate(traces)}
+        names = list(traces.keys())
+        relative = {x.relative for x in traces.values()}
+        if len(relative) > 1:
+            raise ValueError('cannot mix absolute and relative power traces')
+        if freq_hz is None:
+            freq_hz = common_grid(list(traces.values()), num_points=num_points, overlap=overlap)
+        freq_hz = np.asarray(freq_hz, dtype=np.float64)
+        values = np.empty((len(names), len(freq_hz)))
+
+        # traces sharing a frequency axis are interpolated together, with one set of weights
+        groups: List[Tuple[np.ndarray, List[int]]] = []
+        for (i, key) in enumerate(names):
+            axis = traces[key].freq_hz
+            for (group_axis, members) in groups:
+                if group_axis.shape == axis.shape and np.array_equal(group_axis, axis):
+                    members.append(i)
+                    break
+            else:
+                groups.append((axis, [i]))
+        for (axis, members) in groups:
+            pwr = np.vstack([traces[names[i]].pwr_db for i in members])
+            if np.any(axis[1:] < axis[:-1]):
+                srt = np.argsort(axis, kind='stable')
+                (axis, pwr) = (axis[srt], pwr[:, srt])
+            values[members] = _interp_rows(axis, pwr, freq_hz)
+        return TraceMatrix(names=names, freq_hz=freq_hz, values=values, unit='dB' if relative == {True} else 'dBm')
+
+    def __len__(self):
+        return len(self.names)
+
+    def _rows(self, rows) -> np.ndarray:
+        if rows is None:
+            return np.arange(len(self.names))
+        if isinstance(rows, str):
+            rows = [rows]
+        return np.array([self._index(x) if isinstance(x, str) else x for x in rows], dtype=np.intp)
+
+    def _index(self, name: str) -> int:
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise KeyError('unrecognized trace: %s' % name) from None
+
+    def row(self, name: str) -> np.ndarray:
+        return self.values[self._index(name)]
+
+    def select(self, rows):
+        idx = self._rows(rows)
+        return TraceMatrix(names=[self.names[i] for i in idx], freq_hz=self.freq_hz, values=self.values[idx],
+                           unit=self.unit)
+
+    def average(self, rows=None, domain: str = 'log') -> np.ndarray:
+        # log averages the dbm values; pwr averages milliwatts and converts back
+        if domain not in DOMAINS:
+            raise ValueError('unrecognized averaging domain: %s' % domain)
+        values = self.values[self._rows(rows)]
+        if domain == 'log':
+            return values.mean(axis=0)
+        return 10.0 * np.log10(np.power(10.0, values / 10.0).mean(axis=0))
+
+    def subtract(self, baseline, domain: str = 'log', drop_baseline: bool = True):
+        # baseline is a row name, several rows averaged in domain, or an array on the grid (in the matrix unit).
+        # the result is relative power in dB, one broadcast subtraction for every row.
+        if isinstance(baseline, np.ndarray):
+            reference = baseline
+            keep = np.arange(len(self.names))
+        else:
+            rows = self._rows(baseline)
+            reference = self.average(rows, domain=domain)
+            keep = np.setdiff1d(np.arange(len(self.names)), rows) if drop_baseline else np.arange(len(self.names))
+        return TraceMatrix(names=[self.names[i] for i in keep], freq_hz=self.freq_hz,
+                           values=self.values[keep] - reference, unit='dB')
+
+    def difference_matrix(self, stat: str = 'rms', band: Tuple[float, float] = None,
+                          max_block: int = 1 << 24) -> np.ndarray:
+        # (rows x rows) of stat over bins of row i minus row j, on the bins every row has and inside band (hz).
+        # mean and rms come from row sums and a gram matrix; max abs is blocked to bound memory.
+        mask = np.all(np.isfinite(self.values), axis=0)
+        if band is not None:
+            mask &= (self.freq_hz >= band[0]) & (self.freq_hz <= band[1])
+        values = self.values[:, mask]
+        n = values.shape[1]
+        if n == 0:
+            return np.full((len(self.names), len(self.names)), np.nan)
+        if stat == 'mean':
+            mean = values.mean(axis=1)
+            return mean[:, None] - mean[None, :]
+        elif stat == 'rms':
+            # centring the columns leaves differences unchanged and keeps the gram expansion well conditioned
+            values = values - values.mean(axis=0)
+            norm = np.einsum('ij,ij->i', values, values)
+            sq = (norm[:, None] + norm[None, :] - 2.0 * values @ values.T) / n
+            return np.sqrt(np.maximum(sq, 0.0))
+        elif stat == 'max':
+            out = np.empty((len(values), len(values)))
+            block = max(1, max_block // max(1, len(values) * n))
+            for b in range(0, len(values), block):
+                out[b:b+block] = np.abs(values[b:b+block, None, :] - values[None, :, :]).max(axis=2)
+            return out
+        raise ValueError('unrecognized statistic: %s' % stat)
+
+    def to_traces(self, pwr_dtype=None) -> Dict[str, Ssa3021xTrace]:
+        return {name: Ssa3021xTrace.from_arrays(meta={'Trace Name': name}, freq_hz=self.freq_hz, pwr=self.values[i],
+                                                pwr_unit=self.unit, pwr_dtype=pwr_dtype)
+                for (i, name) in enumerate(self.names)}
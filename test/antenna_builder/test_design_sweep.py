@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from astropy import units
+import lib.frequency.amateur_bands as amateur_bands
+from lib.antenna_builder.design_sweep import SPEED_OF_LIGHT, pareto_front, resonant_frequencies, sweep_designs
+from lib.antenna_builder.length_component import AdjustableLengthComponent, FixedLengthComponent
+
+
+def test_resonant_frequencies():
+    f = resonant_frequencies(np.array([10.0]), mode='quarter', harmonics=3, velocity_factor=1.0)
+    assert np.allclose(f[0], SPEED_OF_LIGHT / 40.0 * np.array([1, 3, 5]))
+    f = resonant_frequencies(np.array([10.0]), mode='half', harmonics=2, velocity_factor=1.0)
+    assert np.allclose(f[0], SPEED_OF_LIGHT / 20.0 * np.array([1, 2]))
+    with pytest.raises(ValueError):
+        resonant_frequencies(np.array([1.0]), mode='full')
+
+
+def test_pareto_front_matches_brute_force():
+    rng = np.random.default_rng(0)
+    (covered, detune, length) = (rng.integers(0, 4, 500), rng.random(500), rng.random(500))
+    front = set(pareto_front(covered, detune, length))
+    for i in range(500):
+        dominated = np.any((covered >= covered[i]) & (detune <= detune[i]) & (length <= length[i]) &
+                           ((covered > covered[i]) | (detune < detune[i]) | (length < length[i])))
+        assert (i in front) != dominated
+
+
+def test_sweep_designs_trap_vertical():
+    bands = {x: amateur_bands.bands[x] for x in ('10m', '15m', '20m', '40m')}
+    components = [AdjustableLengthComponent(min_length=3.0 * units.m, max_length=6.0 * units.m),
+                  FixedLengthComponent(length=0.1 * units.m),
+                  AdjustableLengthComponent(min_length=1.0 * units.m, max_length=8.0 * units.m)]
+    front = sweep_designs(components, bands, elements=[[0], [0, 1, 2]], mode='quarter', steps=40,
+                          required=['20m'], chunk_size=256)
+    assert front.evaluated == 40 * 40
+    assert len(front) > 0
+    assert np.all(front.covered[:, list(front.targets.names).index('20m')])
+    assert np.all(np.diff(front.num_covered) <= 0)
+    # every reported band really has a resonance inside it
+    for i in range(len(front)):
+        freq = resonant_frequencies(front.element_lengths_m[i], mode='quarter', harmonics=3).ravel()
+        for name in front.bands(i):
+            k = front.targets.index(name)
+            assert np.any((freq >= front.targets.low_hz[k]) & (freq <= front.targets.high_hz[k]))
+    assert np.isclose(front.component_lengths(0, units.cm).value.sum(), front.total_length_m[0] * 100)
+    assert len(sweep_designs(components, bands, min_covered=5)) == 0
@@ -1,6 +1,7 @@
 import pytest
 from astropy import units
-from lib.antenna_builder.length_component import LengthComponentUnit, LengthComponent, AdjustableLengthComponent
+from lib.antenna_builder.length_component import LengthComponentUnit, LengthComponent, AdjustableLengthComponent, \
+    LengthComponentArray
 
 def test_component_unit_assignment():
     x = LengthComponentUnit(unit=units.m)
@@ -112,3 +113,56 @@ def test_adjustable_component_lims_type_errors(error_makers):
     with pytest.raises(TypeError):
         x = AdjustableLengthComponent(min_length= 1.0 * units.m, max_length=10.0 * units.m)
         x.lims = error_makers
+
+
+def test_broadcast_observers_are_weak():
+    import gc
+    x = LengthComponentUnit(unit=units.m)
+    y = LengthComponent(length=1.0 * units.km, broadcast=x)
+    z = LengthComponentArray(length=[1.0, 2.0] * units.m, broadcast=x)
+    assert x.num_observers == 2
+    del y, z
+    gc.collect()
+    assert x.num_observers == 0
+    x.unit = units.cm
+
+
+def test_length_component_array():
+    x = LengthComponentUnit(unit=units.m)
+    components = [LengthComponent(length=1.0 * units.m),
+                  AdjustableLengthComponent(min_length=0.5 * units.m, max_length=2.0 * units.m)]
+    y = LengthComponentArray.from_components(components, broadcast=x)
+    assert len(y) == 2
+    assert list(y.adjustable) == [False, True]
+    assert (y.length == [1.0, 2.0] * units.m).all()
+    assert (y.min_length == [1.0, 0.5] * units.m).all()
+
+    x.unit = units.cm
+    assert y.unit == units.cm and y.length.unit == units.cm
+    assert y.length[1].value == pytest.approx(200.0)
+    assert y.total_length(units.m).value == pytest.approx(3.0)
+
+    y.set_length(0, 3.0 * units.m)
+    assert y.min_length[0].value == pytest.approx(300.0)
+    y.set_lims([1], (10.0 * units.cm, 1.0 * units.m))
+    assert y.lims[1][1].value == pytest.approx(100.0)
+    assert isinstance(y.component(1), AdjustableLengthComponent)
+    with pytest.raises(ValueError):
+        y.set_length(1, 1.0 * units.cm)
+    with pytest.raises(ValueError):
+        y.set_lims([0], (10.0 * units.cm, 1.0 * units.m))
+
+    # an adjustable component sitting at its minimum stays adjustable and keeps its minimum
+    y.set_length(1, 10.0 * units.cm)
+    assert list(y.adjustable) == [False, True]
+    y.set_length(1, 50.0 * units.cm)
+    assert y.min_length[1].value == pytest.approx(10.0)
+    assert isinstance(y.component(1), AdjustableLengthComponent)
+    z = LengthComponentArray.from_components([AdjustableLengthComponent(min_length=1.0 * units.m,
+                                                                        max_length=2.0 * units.m)])
+    z.set_length(0, 1.0 * units.m)
+    assert list(z.adjustable) == [True]
+    with pytest.raises(ValueError):
+        y.unit = units.second
+    with pytest.raises(TypeError):
+        y.set_length(0, 1.0)
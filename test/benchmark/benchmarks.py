@@ -0,0 +1,179 @@
+import os
+import re
+import bz2
+import gc
+import time
+import platform
+import tempfile
+import tracemalloc
+import statistics
+import importlib.util
+from typing import Callable, Dict, List
+import numpy as np
+from astropy import units as u
+from lib.frequency.band import FrequencyBand
+from lib.frequency.band_set import BandSet
+from lib.frequency.harmonics import harmonic_overlaps
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from path_data import path_root, path_data, path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def load_script(name: str):
+    # top-level scripts are not importable by name (dunestar-filters.py has a dash), load them from their path
+    spec = importlib.util.spec_from_file_location(re.sub(r'\W', '_', name), os.path.join(path_root, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(name: str, func: Callable, repeat: int = 5, items: int = None, nbytes: int = None, **params) -> dict:
+    func()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = min(times)
+    return {
+        'name': name,
+        'params': params,
+        'repeat': repeat,
+        'seconds_min': best,
+        'seconds_median': statistics.median(times),
+        'items': items,
+        'items_per_second': items / best if items and best > 0 else None,
+        'bytes': nbytes,
+        'bytes_per_second': nbytes / best if nbytes and best > 0 else None,
+        'peak_bytes': peak,
+    }
+
+
+def synthetic_csv(path_dir: str, num_points: int, compress: bool) -> str:
+    with open(os.path.join(path_dunestar, 'nothing.csv.bz2'), 'rb') as f:
+        lines = bz2.decompress(f.read()).decode('utf-8').splitlines(keepends=True)
+    header = lines[:lines.index('Trace Data\n') + 1]
+    header = [re.sub(r'^Number of Points,.*', 'Number of Points,%d' % num_points, x) for x in header]
+    freq = np.linspace(1.0e6, 3.0e7, num_points)
+    pwr = -60.0 + 10.0 * np.sin(np.arange(num_points) / 50.0)
+    body = '\n'.join('%d,%.2f' % x for x in zip(freq, pwr)) + '\n'
+    content = (''.join(header) + body).encode('utf-8')
+    file = os.path.join(path_dir, 'synthetic-%d.csv' % num_points)
+    if compress:
+        file += '.bz2'
+        content = bz2.compress(content)
+    with open(file, 'wb') as f:
+        f.write(content)
+    return file
+
+
+def bench_parse_bundled(repeat: int) -> List[dict]:
+    results = []
+    for file in sorted(x for x in os.listdir(path_dunestar) if x.endswith('.bz2')):
+        path = os.path.join(path_dunestar, file)
+        num_points = Ssa3021xTraceSet.read_meta(path)['Number of Points']
+        results.append(measure('parse_bundled', lambda: Ssa3021xTraceSet.from_csv(path), repeat=repeat,
+                               items=num_points, nbytes=os.path.getsize(path), file=file))
+    return results
+
+
+def bench_parse_synthetic(repeat: int, max_exponent: int) -> List[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as path_dir:
+        for exponent in range(3, max_exponent + 1):
+            for compress in (False, True):
+                path = synthetic_csv(path_dir, 10**exponent, compress)
+                results.append(measure('parse_synthetic', lambda: Ssa3021xTraceSet.from_csv(path), repeat=repeat,
+                                       items=10**exponent, nbytes=os.path.getsize(path),
+                                       num_points=10**exponent, bz2=compress))
+    return results
+
+
+def bench_band_algebra(repeat: int, max_harmonic: int) -> List[dict]:
+    bands = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    band_dict = bands.to_dict()
+    orders = range(2, max_harmonic + 1)
+
+    def objects():
+        for rx_band in band_dict.values():
+            for tx_band in band_dict.values():
+                for n in orders:
+                    rx_band.intersect(tx_band.harmonic(n))
+
+    def band_set():
+        bands.intersect(bands.harmonics(orders))
+
+    pairs = len(bands)**2 * len(orders)
+    return [measure('band_intersect_harmonic_objects', objects, repeat=repeat, items=pairs, max_harmonic=max_harmonic),
+            measure('band_intersect_harmonic_bandset', band_set, repeat=repeat, items=pairs, max_harmonic=max_harmonic)]
+
+
+def bench_harmonic_overlaps(repeat: int, max_harmonic: int) -> List[dict]:
+    # the tx/rx selection harmonics.py plots
+    bands = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    tx_bands = bands.overlapping(FrequencyBand(low=1.5 * u.MHz, high=60.0 * u.MHz))
+    rx_bands = bands.overlapping(FrequencyBand(low=1.5 * u.MHz, high=500.0 * u.MHz))
+    results = []
+    for n in sorted({12, max_harmonic}):
+        orders = range(2, n + 1)
+        results.append(measure('harmonic_overlaps', lambda: harmonic_overlaps(rx_bands, tx_bands, orders),
+                               repeat=repeat, items=len(tx_bands) * len(orders), max_harmonic=n))
+    return results
+
+
+def bench_s12(repeat: int) -> List[dict]:
+    dunestar_filters = load_script('dunestar-filters')
+    trace_data = dunestar_filters.read_trace_data(path_dir=path_dunestar, workers=1)
+    band_sets = {'bands': BandSet.from_json(os.path.join(path_data, 'bands.json')).to_dict(),
+                 'band-coverage': BandSet.from_json(os.path.join(path_dunestar, 'band-coverage.json')).to_dict()}
+    num_points = sum(len(x.traces[0].freq) for x in trace_data.values())
+    return [measure('compute_s12_losses', lambda: dunestar_filters.compute_s12_losses(trace_data, bands),
+                    repeat=repeat, items=num_points, bands=key)
+            for (key, bands) in band_sets.items()]
+
+
+def run(repeat: int = 5, max_exponent: int = 6, max_harmonic: int = 100, select: str = None) -> Dict:
+    suites = {
+        'parse_bundled': lambda: bench_parse_bundled(repeat),
+        'parse_synthetic': lambda: bench_parse_synthetic(repeat, max_exponent),
+        'band_algebra': lambda: bench_band_algebra(repeat, max_harmonic),
+        'harmonic_overlaps': lambda: bench_harmonic_overlaps(repeat, max_harmonic),
+        's12': lambda: bench_s12(repeat),
+    }
+    results = []
+    for (key, suite) in suites.items():
+        if select and not re.search(select, key):
+            continue
+        results.extend(suite())
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def result_key(result: dict) -> str:
+    return '%s(%s)' % (result['name'], ','.join('%s=%s' % x for x in sorted(result['params'].items())))
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 1.25) -> List[dict]:
+    # ratio > threshold on the best time flags a regression
+    reference = {result_key(x): x for x in baseline['results']}
+    rows = []
+    for x in current['results']:
+        ref = reference.get(result_key(x))
+        if ref is None:
+            continue
+        ratio = x['seconds_min'] / ref['seconds_min'] if ref['seconds_min'] > 0 else float('inf')
+        rows.append({'benchmark': result_key(x), 'baseline': ref['seconds_min'], 'current': x['seconds_min'],
+                     'ratio': ratio, 'regression': ratio > threshold})
+    return rows
@@ -0,0 +1,14 @@
+import json
+import benchmarks
+
+
+def test_benchmarks_smoke():
+    results = benchmarks.run(repeat=1, max_exponent=3, max_harmonic=12, select='parse_synthetic|harmonic|s12')
+    names = {x['name'] for x in results['results']}
+    assert names == {'parse_synthetic', 'harmonic_overlaps', 'compute_s12_losses'}
+    assert all(x['seconds_min'] >= 0 and x['peak_bytes'] > 0 for x in results['results'])
+
+    results = json.loads(json.dumps(results))
+    rows = benchmarks.compare(results, results)
+    assert len(rows) == len(results['results'])
+    assert not any(x['regression'] for x in rows)
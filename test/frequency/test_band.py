@@ -0,0 +1,35 @@
+import pickle
+import pytest
+from astropy import units
+from lib.frequency.band import FrequencyBand
+
+def test_band_intersect():
+    x = FrequencyBand(low=1.0 * units.MHz, high=5.0 * units.MHz)
+    y = FrequencyBand(low=2.5 * units.MHz, high=7.0 * units.MHz)
+    z = FrequencyBand(low=5.0 * units.MHz, high=7.5 * units.MHz)
+
+    assert x.intersect(y) == FrequencyBand(low=2.5 * units.MHz, high=5.0 * units.MHz)
+    assert x.intersect(z) is None
+    assert y.intersect(z).tuple(units.MHz) == (5.0 * units.MHz, 7.0 * units.MHz)
+    with pytest.raises(ValueError):
+        x.intersect((1.0 * units.MHz, 2.0 * units.MHz))
+
+
+def test_band_harmonic_buffer():
+    x = FrequencyBand(low=1.0 * units.MHz, high=5.0 * units.MHz)
+    assert x.harmonic(3) == FrequencyBand(low=3.0 * units.MHz, high=15.0 * units.MHz)
+    assert x.buffer(500 * units.kHz) == FrequencyBand(low=0.5 * units.MHz, high=5.5 * units.MHz)
+    assert x.center(units.MHz) == 3.0 * units.MHz
+    assert x.bandwidth(units.kHz) == 4000.0 * units.kHz
+    with pytest.raises(ValueError):
+        x.harmonic(0)
+
+
+def test_band_immutable_hashable():
+    x = FrequencyBand(low=1.0 * units.MHz, high=5.0 * units.MHz)
+    with pytest.raises(AttributeError):
+        x._low = 0.0
+    with pytest.raises(ValueError):
+        x.low(units.MHz)[...] = 0.0
+    assert {x: 1}[FrequencyBand(low=1.0e6 * units.Hz, high=5.0e6 * units.Hz)] == 1
+    assert pickle.loads(pickle.dumps(x)) == x
@@ -0,0 +1,27 @@
+import numpy as np
+from astropy import units
+from lib.frequency.band_index import BandIndex, NO_BAND
+from lib.frequency.band_set import BandSet
+
+
+def test_band_index_overlapping_closed_bands():
+    bands = BandSet(names=['a', 'b', 'c'], low_hz=[1.0e6, 3.0e6, 5.0e6], high_hz=[5.0e6, 4.0e6, 7.0e6])
+    index = BandIndex(bands)
+    freq = np.array([0.5e6, 1.0e6, 3.5e6, 5.0e6, 6.0e6, 7.0e6, 8.0e6])
+
+    point, band = index.matches(freq)
+    assert list(zip(point, band)) == [(1, 0), (2, 0), (2, 1), (3, 0), (3, 2), (4, 2), (5, 2)]
+    assert index.count(freq).tolist() == [0, 1, 2, 2, 1, 1, 0]
+    assert index.first(freq).tolist() == [NO_BAND, 0, 0, 0, 2, 2, NO_BAND]
+    assert index.labels(freq * units.Hz, no_band='-').tolist() == ['-', 'a', 'a', 'a', 'c', 'c', '-']
+
+    rng = np.random.default_rng(0)
+    freq = rng.uniform(0.0, 8.0e6, 1000)
+    expected = np.logical_and(freq[:, None] >= bands.low_hz, freq[:, None] <= bands.high_hz)
+    assert np.array_equal(np.stack(index.matches(freq)), np.stack(np.nonzero(expected)))
+
+
+def test_band_index_empty():
+    index = BandIndex(BandSet(names=[], low_hz=[], high_hz=[]))
+    assert index.first([1.0, 2.0]).tolist() == [NO_BAND, NO_BAND]
+    assert len(index.matches([1.0])[0]) == 0
@@ -0,0 +1,41 @@
+import os
+import numpy as np
+import pytest
+from astropy import units
+from lib.frequency.band import FrequencyBand
+from lib.frequency.band_set import BandSet
+from lib.frequency.amateur_bands import read_bands
+from path_data import path_data
+
+
+def test_band_set_matches_frequency_band():
+    bands = read_bands(os.path.join(path_data, 'bands.json'))
+    band_set = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    assert band_set.to_dict() == bands
+
+    harmonics = band_set.harmonics(range(2, 13))
+    overlap = band_set.intersect(harmonics)
+    result = {(band_set.names[i], harmonics.names[j], int(harmonics.order[j])): FrequencyBand.from_hz(lo, hi)
+              for (i, j, lo, hi) in zip(*overlap)}
+    expected = {}
+    for (rx_id, rx_band) in bands.items():
+        for (tx_id, tx_band) in bands.items():
+            for n in range(2, 13):
+                x = rx_band.intersect(tx_band.harmonic(n))
+                if x:
+                    expected[(rx_id, tx_id, n)] = x
+    assert result == expected
+
+
+def test_band_set_ops():
+    x = BandSet(names=['a', 'b'], low_hz=[1.0e6, 5.0e6], high_hz=[5.0e6, 7.5e6])
+    assert len(x.intersect(FrequencyBand(low=2.5 * units.MHz, high=7.0 * units.MHz))) == 2
+    assert len(x.intersect(x)) == 2  # touching endpoints do not overlap
+    assert x.overlapping(FrequencyBand(low=6.0 * units.MHz, high=7.0 * units.MHz)).names == ('b',)
+    assert np.allclose(x.center(units.MHz).value, [3.0, 6.25])
+    assert np.allclose(x.buffer(0.5 * units.MHz).bandwidth(units.MHz).value, [5.0, 3.5])
+    assert x['b'] == FrequencyBand(low=5.0 * units.MHz, high=7.5 * units.MHz)
+    with pytest.raises(ValueError):
+        x.harmonics([0, 1])
+    with pytest.raises(ValueError):
+        BandSet(names=['a'], low_hz=[1.0, 2.0], high_hz=[3.0, 4.0])
@@ -0,0 +1,26 @@
+import os
+from lib.frequency.amateur_bands import read_bands
+from lib.frequency.band_set import BandSet
+from lib.frequency.harmonics import harmonic_overlaps
+from path_data import path_data
+
+
+def test_harmonic_overlaps_multiple_per_pair():
+    bands = read_bands(os.path.join(path_data, 'bands.json'))
+    band_set = BandSet.from_bands(bands)
+    orders = range(2, 101)
+    overlaps = harmonic_overlaps(rx_bands=band_set, tx_bands=band_set, orders=orders)
+
+    expected = {}
+    for (rx_id, rx_band) in bands.items():
+        for (tx_id, tx_band) in bands.items():
+            for n in orders:
+                x = rx_band.intersect(tx_band.harmonic(n))
+                if x:
+                    expected[(rx_id, tx_id, n)] = x
+    assert overlaps.to_dict() == expected
+    assert len(overlaps) == len(expected)
+
+    pairs = [(rx_id, tx_id) for (rx_id, tx_id, _) in expected]
+    assert any(pairs.count(x) > 1 for x in pairs)
+    assert set(overlaps.for_rx('70cm').rx) == {band_set.index('70cm')}
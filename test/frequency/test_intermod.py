@@ -0,0 +1,42 @@
+import itertools
+import os
+from lib.frequency.band_set import BandSet
+from lib.frequency.intermod import intermod_products, coefficient_patterns
+from path_data import path_data
+
+
+def test_coefficient_patterns():
+    assert coefficient_patterns(num_tx=1, max_order=3).tolist() == [[2], [3]]
+    patterns = coefficient_patterns(num_tx=2, max_order=3).tolist()
+    assert [2, -1] in patterns and [1, 1] in patterns
+    assert [-2, 1] not in patterns
+
+
+def test_intermod_products_matches_brute_force():
+    victims = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    tx_bands = victims[[victims.index(x) for x in ('40m', '20m', '15m')]]
+    products = intermod_products(tx_bands=tx_bands, max_order=5, victim_bands=victims)
+    result = set()
+    for (i, v) in zip(products.overlaps.left, products.overlaps.right):
+        c = [0, 0, 0]
+        for (k, x) in zip(products.tx[i], products.coeff[i]):
+            if x != 0:
+                c[k] = int(x)
+        result.add((tuple(c), v))
+
+    expected = set()
+    for c in itertools.product(range(-5, 6), repeat=3):
+        used = [i for i in range(3) if c[i]]
+        if not 2 <= sum(abs(x) for x in c) <= 5 or c[used[0]] < 0:
+            continue
+        low = sum(c[i] * (tx_bands.low_hz[i] if c[i] > 0 else tx_bands.high_hz[i]) for i in used)
+        high = sum(c[i] * (tx_bands.high_hz[i] if c[i] > 0 else tx_bands.low_hz[i]) for i in used)
+        if high <= 0:
+            low, high = -high, -low
+        if low < 0:
+            low, high = 0.0, max(-low, high)
+        for v in range(len(victims)):
+            if low < victims.high_hz[v] and high > victims.low_hz[v]:
+                expected.add((c, v))
+    assert result == expected
+    assert products.describe(products.overlaps.left[0])
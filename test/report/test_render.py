@@ -0,0 +1,60 @@
+import os
+import numpy as np
+from lib.frequency.band_set import BandSet
+from lib.frequency.harmonics import harmonic_overlaps
+from lib.report.figures import bar_collection, harmonic_overlap_figure, harmonic_panel_figure, harmonic_panels, \
+    s12_figure
+import lib.report.render as render
+from lib.report.render import FigureJob, job_fingerprint, render_figures
+from path_data import path_data
+
+
+def test_harmonic_panels_and_bar_collection():
+    bands = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    overlaps = harmonic_overlaps(rx_bands=bands, tx_bands=bands, orders=range(2, 6))
+    (tx_names, panels) = harmonic_panels(overlaps)
+    assert sum(len(x['tx']) for x in panels) == len(overlaps)
+    assert len(tx_names) == len(np.unique(overlaps.tx))
+    for panel in panels:
+        assert np.all(np.diff(panel['high_mhz'] - panel['low_mhz']) <= 0)
+    collection = bar_collection(panels[0]['low_mhz'], panels[0]['high_mhz'], np.arange(len(panels[0]['tx'])),
+                                'k')
+    assert len(collection.get_paths()) == len(panels[0]['tx'])
+
+
+def test_harmonic_overlap_figure_without_overlaps(tmp_path):
+    empty = {'rx': '6m', 'rx_low_mhz': 50.0, 'rx_high_mhz': 54.0, 'tx': np.empty(0, dtype=np.intp),
+             'order': np.empty(0, dtype=np.intp), 'low_mhz': np.empty(0), 'high_mhz': np.empty(0)}
+    jobs = [FigureJob(file='none.png', draw=harmonic_overlap_figure, inputs={'tx_names': [], 'panels': []}, dpi=20),
+            FigureJob(file='empty.png', draw=harmonic_overlap_figure, inputs={'tx_names': [], 'panels': [empty]},
+                      dpi=20)]
+    assert [x.error for x in render_figures(jobs, path_dir=str(tmp_path), workers=1)] == [None, None]
+
+
+def test_render_figures_skips_unchanged(tmp_path):
+    freq = np.linspace(1.0, 30.0, 50)
+    jobs = [FigureJob(file='s12.png', draw=s12_figure, inputs={'series': {'a': (freq, -freq)}}, dpi=20),
+            FigureJob(file=os.path.join('panels', 'bad.png'), draw=harmonic_panel_figure, inputs={}, dpi=20)]
+    first = render_figures(jobs, path_dir=str(tmp_path), workers=1)
+    assert first[0].rendered and first[0].error is None
+    assert os.path.exists(os.path.join(tmp_path, 's12.png'))
+    assert first[1].error is not None
+
+    second = render_figures(jobs[:1], path_dir=str(tmp_path), workers=1)
+    assert not second[0].rendered and second[0].error is None
+    changed = jobs[0]._replace(inputs={'series': {'a': (freq, freq)}})
+    assert render_figures([changed], path_dir=str(tmp_path), workers=1)[0].rendered
+    assert render_figures([changed], path_dir=str(tmp_path), workers=1, force=True)[0].rendered
+
+
+def test_job_fingerprint_covers_the_draw_module(monkeypatch):
+    job = FigureJob(file='s12.png', draw=s12_figure, inputs={'series': {}})
+    key = job_fingerprint(job)
+    assert job_fingerprint(job) == key
+    # an edit to any helper in lib.report.figures, not only to s12_figure itself
+    source = render._module_source(s12_figure.__module__)
+    monkeypatch.setattr(render, '_module_source', lambda name: source.replace('def _legend(', 'def _legend2('))
+    assert job_fingerprint(job) != key
+    monkeypatch.undo()
+    monkeypatch.setattr(render, 'RENDER_VERSION', render.RENDER_VERSION + 1)
+    assert job_fingerprint(job) != key
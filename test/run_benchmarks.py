@@ -0,0 +1,42 @@
+import sys
+import os
+import json
+import argparse
+
+test_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(test_root))
+sys.path.append(os.path.join(test_root, 'benchmark'))
+
+import benchmarks
+
+parser = argparse.ArgumentParser(description='time parsing, band algebra, harmonic and s12 workloads')
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--max-exponent', type=int, default=6, help='synthetic traces go up to 10**n points')
+parser.add_argument('--max-harmonic', type=int, default=100)
+parser.add_argument('--select', default=None, help='regex on suite names')
+parser.add_argument('--output', default=None, help='write results as json')
+parser.add_argument('--compare', default=None, help='baseline json to compare against')
+parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio reported as a regression')
+args = parser.parse_args()
+
+results = benchmarks.run(repeat=args.repeat, max_exponent=args.max_exponent,
+                         max_harmonic=args.max_harmonic, select=args.select)
+
+print('%-60s %12s %14s %12s' % ('benchmark', 'best [s]', 'items/s', 'peak [MiB]'))
+for x in results['results']:
+    print('%-60s %12.6f %14s %12.2f' % (benchmarks.result_key(x), x['seconds_min'],
+                                        '%.4g' % x['items_per_second'] if x['items_per_second'] else '-',
+                                        x['peak_bytes'] / 2**20))
+
+if args.output:
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+retcode = 0
+if args.compare:
+    with open(args.compare, 'r') as f:
+        rows = benchmarks.compare(json.load(f), results, threshold=args.threshold)
+    for row in rows:
+        print('%-60s %8.3fx%s' % (row['benchmark'], row['ratio'], '  REGRESSION' if row['regression'] else ''))
+    retcode = int(any(x['regression'] for x in rows))
+sys.exit(retcode)
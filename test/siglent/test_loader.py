@@ -0,0 +1,59 @@
+import os
+import shutil
+import numpy as np
+from lib.siglent.loader import load_trace_dir
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from lib.siglent.trace_cache import TraceCache
+from path_data import path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def test_load_trace_dir_parallel(tmp_path):
+    for file in ('10m.csv.bz2', '12m.csv.bz2', 'nothing.csv.bz2'):
+        shutil.copy(os.path.join(path_dunestar, file), str(tmp_path / file))
+    (tmp_path / 'broken.csv.bz2').write_bytes(b'not bz2')
+
+    results = load_trace_dir(str(tmp_path), workers=2)
+    assert [os.path.basename(x.file) for x in results] == \
+        ['10m.csv.bz2', '12m.csv.bz2', 'broken.csv.bz2', 'nothing.csv.bz2']
+    assert results[2].error is not None and results[2].trace_set is None
+    expected = Ssa3021xTraceSet.from_csv(str(tmp_path / '12m.csv.bz2'))
+    assert np.array_equal(results[1].trace_set.traces[0].pwr.value, expected.traces[0].pwr.value)
+
+    cache = TraceCache(path_cache=str(tmp_path / 'cache'))
+    cached = load_trace_dir(str(tmp_path), workers=2, cache=cache)
+    assert [x.error is None for x in cached] == [True, True, False, True]
+    assert np.array_equal(cached[1].trace_set.traces[0].pwr.value, expected.traces[0].pwr.value)
+    assert cache.lookup(str(tmp_path / 'nothing.csv.bz2')) is not None
+
+
+class EvictingCache(TraceCache):
+    # fills the cache like TraceCache in the workers, then fails when 12m is mapped back in the parent, as if
+    # its entry had been evicted; counts the loads made in this process
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parent = os.getpid()
+        self.calls = 0
+
+    def load(self, file: str):
+        self.calls += 1
+        if os.path.basename(file) == '12m.csv.bz2' and os.getpid() == self.parent:
+            raise OSError('entry evicted')
+        return super().load(file)
+
+
+def test_load_trace_dir_isolates_cache_errors(tmp_path):
+    for file in ('10m.csv.bz2', '12m.csv.bz2', 'nothing.csv.bz2'):
+        shutil.copy(os.path.join(path_dunestar, file), str(tmp_path / file))
+    cache = EvictingCache(path_cache=str(tmp_path / 'cache'))
+    results = load_trace_dir(str(tmp_path), workers=2, cache=cache)
+    assert [x.error is None for x in results] == [True, False, True]
+    assert isinstance(results[1].error, OSError) and results[1].trace_set is None
+    assert results[2].trace_set is not None
+    assert cache.lookup(str(tmp_path / '12m.csv.bz2')) is not None
+
+    # in process every file goes through the cache once
+    cache.calls = 0
+    results = load_trace_dir(str(tmp_path), workers=1, cache=cache)
+    assert cache.calls == 3 and [x.error is None for x in results] == [True, False, True]
@@ -0,0 +1,31 @@
+import os
+import numpy as np
+from astropy import units
+from lib.frequency.band_set import BandSet
+from lib.siglent.rejection import rejection_matrix
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from path_data import path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def test_rejection_matrix_matches_masked_stats():
+    traces = {x: Ssa3021xTraceSet.from_csv(os.path.join(path_dunestar, '%s.csv.bz2' % x)).traces[0]
+              for x in ('10m', '20m', '40m')}
+    bands = BandSet.from_json(os.path.join(path_dunestar, 'band-coverage.json'))
+    result = rejection_matrix(traces=traces, bands=bands, percentiles=[10, 90])
+    assert result.values.shape == (3, len(bands), 5)
+    assert result.stats == ('min', 'max', 'avg', 'p10', 'p90')
+
+    for (i, key) in enumerate(result.rows):
+        freq = traces[key].freq.to_value(units.Hz)
+        for (k, name) in enumerate(result.columns):
+            mask = np.logical_and(freq > bands.low_hz[k], freq < bands.high_hz[k])
+            values = -traces[key].pwr.value[mask]
+            if not np.any(mask):
+                assert np.all(np.isnan(result.values[i, k]))
+                continue
+            expected = [values.min(), values.max(), values.mean(), *np.percentile(values, [10, 90])]
+            assert np.allclose(result.values[i, k], expected)
+
+    assert result.to_dict()[('20m', '20m')]['max'] == result.get('max')[1, bands.index('20m')] * units.dB(1)
@@ -0,0 +1,68 @@
+import os
+import csv
+import numpy as np
+import pytest
+from lib.frequency.band_set import BandSet
+from lib.siglent.rejection import rejection_matrix
+from lib.siglent.rejection_store import RejectionStore
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from path_data import path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def test_rejection_store_round_trip_and_append(tmp_path):
+    traces = {x: Ssa3021xTraceSet.from_csv(os.path.join(path_dunestar, '%s.csv.bz2' % x)).traces[0]
+              for x in ('10m', '20m', '40m')}
+    bands = BandSet.from_json(os.path.join(path_dunestar, 'band-coverage.json'))
+    first = rejection_matrix(traces=traces, bands=bands, percentiles=[50])
+    second = rejection_matrix(traces={'10m': traces['10m']}, bands=bands[:2])
+
+    store = RejectionStore(str(tmp_path))
+    assert store.append(first) == '0000'
+    # rows stream in one at a time
+    with store.writer(second.columns, second.stats, name='later', dtype=np.float32) as writer:
+        writer.append('10m', second.values[0])
+    with pytest.raises(ValueError):
+        store.writer(second.columns, second.stats, name='later')
+    with pytest.raises(RuntimeError):
+        with store.writer(second.columns, second.stats, name='broken') as writer:
+            writer.append('10m', second.values[0])
+            raise RuntimeError()
+    for name in ('../escape', 'a/b', '..', '.hidden'):
+        with pytest.raises(ValueError):
+            store.writer(second.columns, second.stats, name=name)
+
+    store = RejectionStore(str(tmp_path))
+    assert [x['name'] for x in store.runs] == ['0000', 'later']
+    result = store.matrix(0)
+    assert isinstance(result.values, np.memmap)
+    assert (result.rows, result.columns, result.stats) == (first.rows, first.columns, first.stats)
+    assert np.array_equal(result.values, first.values, equal_nan=True)
+    # the run files are plain .npy
+    assert np.array_equal(np.load(os.path.join(str(tmp_path), 'run-later.npy')),
+                          second.values.astype(np.float32), equal_nan=True)
+    assert store.matrix('later').values.dtype == np.float32
+
+    with open(os.path.join(str(tmp_path), 'rejection.csv'), 'r') as f:
+        lines = list(csv.DictReader(f))
+    assert len(lines) == first.values.size + second.values.size
+    assert lines[0]['run'] == '0000' and lines[0]['source'] == first.rows[0] and lines[0]['stat'] == 'min'
+    assert np.isclose(float(lines[0]['rejection_db']), first.values[0, 0, 0], equal_nan=True)
+
+
+def test_rejection_store_abort_keeps_concurrent_csv_lines(tmp_path):
+    traces = {'10m': Ssa3021xTraceSet.from_csv(os.path.join(path_dunestar, '10m.csv.bz2')).traces[0]}
+    bands = BandSet.from_json(os.path.join(path_dunestar, 'band-coverage.json'))
+    matrix = rejection_matrix(traces=traces, bands=bands[:2])
+    store = RejectionStore(str(tmp_path))
+    aborted = store.writer(matrix.columns, matrix.stats, name='aborted')
+    aborted.append('10m', matrix.values[0])
+    with store.writer(matrix.columns, matrix.stats, name='kept') as writer:
+        writer.append('10m', matrix.values[0])
+    aborted.abort()
+
+    with open(os.path.join(str(tmp_path), 'rejection.csv'), 'r') as f:
+        lines = list(csv.DictReader(f))
+    assert len(lines) == matrix.values.size and {x['run'] for x in lines} == {'kept'}
+    assert sorted(os.listdir(str(tmp_path))) == ['index.json', 'rejection.csv', 'run-kept.npy']
@@ -0,0 +1,49 @@
+import os
+import asyncio
+import numpy as np
+from lib.siglent.scpi import Ssa3021xClient, acquire
+from lib.siglent.simulator import Ssa3021xSimulator
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from path_data import path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+files = [os.path.join(path_dunestar, '%s.csv.bz2' % x) for x in ('10m', '20m', 'nothing')]
+
+
+def test_client_reads_simulated_sweeps():
+    captures = [Ssa3021xTraceSet.from_csv(x) for x in files]
+
+    async def run():
+        async with Ssa3021xSimulator(captures) as simulator:
+            async with Ssa3021xClient(*simulator.address, binary=False) as client:
+                first = await client.fetch()
+                pipelined = [x async for x in client.sweeps(5, depth=3)]
+                assert await client.query(':NOT:A:COMMand?') == b''
+                assert await client.query(':SYSTem:ERRor?') == b'-113,"Undefined header"'
+            async with Ssa3021xClient(*simulator.address, binary=True) as client:
+                binary = await client.fetch(traces=(1, 2))
+        return first, pipelined, binary
+
+    (first, pipelined, binary) = asyncio.run(run())
+    for key in ('Machine Module', 'Y Axis Unit', 'Number of Points', 'Start Frequency', 'Stop Frequency',
+                'Average Type'):
+        assert first.meta[key] == captures[0].meta[key]
+    assert first.traces[0].meta['Trace Type'] == captures[0].traces[0].meta['Trace Type']
+    # ascii sweeps reproduce the exported captures exactly and play them back in turn
+    for (i, x) in enumerate([first, *pipelined]):
+        expected = captures[i % len(captures)].traces[0]
+        assert np.array_equal(x.traces[0].freq_hz, expected.freq_hz)
+        assert np.array_equal(x.traces[0].pwr_dbm, expected.pwr_dbm)
+    assert len(binary.traces) == 2 and binary.traces[1].meta['Trace Name'] == 'Trace B'
+    assert np.allclose(binary.traces[0].pwr_dbm, captures[0].traces[0].pwr_dbm, atol=1e-4)
+
+
+def test_acquire_from_several_analyzers():
+    async def run():
+        async with Ssa3021xSimulator.from_csv(files[:1]) as a, Ssa3021xSimulator.from_csv(files[1:2]) as b:
+            return await acquire([a.address, b.address]), a.address, b.address
+
+    (results, a, b) = asyncio.run(run())
+    assert list(results) == ['%s:%d' % a, '%s:%d' % b]
+    for (result, file) in zip(results.values(), files):
+        assert np.allclose(result.traces[0].pwr_dbm, Ssa3021xTraceSet.from_csv(file).traces[0].pwr_dbm, atol=1e-4)
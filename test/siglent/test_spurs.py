@@ -0,0 +1,51 @@
+import os
+import numpy as np
+from lib.frequency.band_index import NO_BAND
+from lib.frequency.band_set import BandSet
+from lib.siglent.spurs import attribute_harmonics, detect_spurs, find_peaks, noise_floor
+from lib.siglent.ssa3021x import Ssa3021xTrace, Ssa3021xTraceSet
+from path_data import path_data, path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def test_noise_floor_and_peaks():
+    rng = np.random.default_rng(0)
+    pwr = -90.0 + rng.normal(0.0, 0.5, size=(4, 2000))
+    pwr[:, 500] += 30.0
+    pwr[2, 1500:1503] += 20.0
+    floor = noise_floor(pwr, window=101)
+    assert np.allclose(floor, -90.0, atol=0.5)
+    peaks = find_peaks(pwr, floor, threshold_db=6.0, min_distance=5)
+    # the three-bin spur is reported once
+    assert [x[0] for x in peaks] == [0, 1, 2, 2, 3]
+    assert [x[1] for x in peaks if x[1] != 500] in ([1500], [1501], [1502])
+
+    # within min_distance only the higher peak survives, also at the ends of the sweep
+    pwr = np.full((1, 50), -90.0)
+    pwr[0, [0, 3, 20, 26, 46, 49]] = [-60.0, -50.0, -55.0, -60.0, -52.0, -51.0]
+    assert [x[1] for x in find_peaks(pwr, -90.0, min_distance=4)] == [3, 20, 26, 49]
+    assert [x[1] for x in find_peaks(pwr, -90.0, min_distance=7)] == [3, 20, 49]
+
+
+def test_detect_spurs_attributes_harmonics():
+    bands = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    capture = Ssa3021xTraceSet.from_csv(os.path.join(path_dunestar, 'nothing.csv.bz2')).traces[0]
+    pwr = np.array(capture.pwr_dbm)
+    freq = capture.freq_hz
+    spurs = {14.2e6: ('40m', 2), 11.25e6: ('80m', 3), 22.5e6: (None, None)}
+    for f in spurs:
+        pwr[np.argmin(np.abs(freq - f))] += 25.0
+    sweeps = [Ssa3021xTrace.from_arrays(meta={}, freq_hz=freq, pwr=pwr)] * 3
+    result = detect_spurs(sweeps, tx_bands=bands, orders=range(2, 4), threshold_db=10.0, tolerance_hz=20e3)
+    assert len(result) == 3 * len(spurs)
+    for x in result:
+        f = min(spurs, key=lambda y: abs(y - x['freq_hz']))
+        assert abs(f - x['freq_hz']) < 20e3
+        assert (x['source'], x['order']) == spurs[f]
+        assert x['excess_db'] > 10.0
+
+    (source, order, offset) = attribute_harmonics(np.array([14.3e6, 14.65e6, 1.0e6]), bands, orders=[2],
+                                                  tolerance_hz=100e3)
+    assert list(source[:2]) == [bands.index('40m')] * 2 and source[2] == NO_BAND
+    assert list(order[:2]) == [2, 2] and offset[0] == 0.0 and np.isclose(offset[1], 50e3)
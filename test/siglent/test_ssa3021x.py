@@ -0,0 +1,145 @@
+import bz2
+import io
+import os
+import numpy as np
+import pytest
+from astropy import units
+from lib import profiling
+from lib.siglent.ssa3021x import Ssa3021xTrace, Ssa3021xTraceSet, read_points
+from path_data import path_data_measurements
+
+file_bz2 = os.path.join(path_data_measurements, 'dunestar', '10m.csv.bz2')
+
+
+def test_from_csv_bz2_and_plain(tmp_path):
+    file_csv = tmp_path / '10m.csv'
+    with open(file_bz2, 'rb') as f:
+        file_csv.write_bytes(bz2.decompress(f.read()))
+
+    x = Ssa3021xTraceSet.from_csv(file_bz2)
+    y = Ssa3021xTraceSet.from_csv(str(file_csv))
+    assert x.meta == y.meta
+    assert x.meta['Number of Points'] == 751
+    assert x.meta['Trace Name'] == 'Trace A'
+    assert len(x.traces) == 1
+    assert len(x.traces[0].freq) == 751
+    assert x.traces[0].freq[0] == 1.0 * units.MHz
+    assert x.traces[0].pwr[0] == -56.95 * units.dB(units.mW)
+    assert np.array_equal(x.traces[0].pwr, y.traces[0].pwr)
+
+
+def test_from_csv_truncated(tmp_path):
+    with open(file_bz2, 'rb') as f:
+        lines = bz2.decompress(f.read()).decode('utf-8').splitlines(keepends=True)
+    file_csv = tmp_path / 'truncated.csv'
+    file_csv.write_text(''.join(lines[:100]))
+    with pytest.raises(ValueError):
+        Ssa3021xTraceSet.from_csv(str(file_csv))
+    with pytest.raises(ValueError):
+        Ssa3021xTraceSet.from_csv(str(tmp_path / 'missing.csv'))
+
+    file_csv.write_text(''.join(lines).replace('Trace Name,', 'Trace Label,'))
+    with pytest.raises(ValueError, match='malformed trace header'):
+        Ssa3021xTraceSet.read_meta(str(file_csv))
+
+    file_csv.write_text(''.join(lines).replace('Y Axis Unit,dBm', 'Y Axis Unit,V'))
+    for lazy in (False, True):
+        with pytest.raises(ValueError, match="unsupported Y Axis Unit 'V'"):
+            Ssa3021xTraceSet.from_csv(str(file_csv), lazy=lazy)
+
+
+def test_from_csv_lazy(tmp_path):
+    with open(file_bz2, 'rb') as f:
+        lines = bz2.decompress(f.read()).decode('utf-8').splitlines(keepends=True)
+    i = lines.index('Trace Data\n')
+    second = ['Trace Name,Trace B\n', 'Trace Type,Max Hold\n', 'Trace Data\n',
+              *[x.replace(',-', ',-1') for x in lines[i+1:i+752]]]
+    file_csv = tmp_path / 'two-traces.csv.bz2'
+    file_csv.write_bytes(bz2.compress(''.join([*lines[:i+752], *second, *lines[i+752:]]).encode('utf-8')))
+
+    expected = Ssa3021xTraceSet.from_csv(str(file_csv))
+    assert Ssa3021xTraceSet.read_meta(str(file_csv)) == expected.meta
+
+    x = Ssa3021xTraceSet.from_csv(str(file_csv), lazy=True)
+    assert x.meta == expected.meta
+    assert x.traces.meta(1)['Trace Type'] == 'Max Hold'
+    assert len(x.traces) == len(expected.traces) == 2
+    assert np.array_equal(x.traces[1].pwr, expected.traces[1].pwr)
+    assert np.array_equal(x.traces[0].freq, expected.traces[0].freq)
+    assert x.traces[-1] is x.traces[1]
+    with pytest.raises(IndexError):
+        x.traces[2]
+
+
+def test_trace_compact_storage():
+    x = Ssa3021xTraceSet.from_csv(file_bz2, pwr_dtype=np.float32).traces[0]
+    y = Ssa3021xTraceSet.from_csv(file_bz2).traces[0]
+    assert x.freq_axis is not None and x.freq_axis[2] == 751
+    assert x.nbytes == 751 * 4
+    assert np.array_equal(x.freq_hz, y.freq_hz)
+    assert x.freq_hz[1] == 1038667.0
+    assert np.allclose(x.pwr_dbm, y.pwr_dbm, atol=1e-4)
+    # the frequency axis stays compact after it has been used
+    assert x.freq_in(units.MHz)[0] == 1.0 * units.MHz
+    assert x.nbytes == 751 * 4
+    assert x.pwr_in() is x.pwr_in()
+    assert x.nbytes == 751 * 4
+    x.pwr_in(units.dB(units.W))
+    assert x.nbytes == 2 * 751 * 4
+    with pytest.raises(ValueError):
+        x.freq_hz[0] = 0.0
+
+    z = Ssa3021xTrace.from_arrays(meta={}, freq_hz=[1.0e6, 2.0e6, 4.0e6], pwr=[0.0, 1.0, 2.0], pwr_unit='dBW')
+    assert z.freq_axis is None
+    assert np.array_equal(z.pwr_dbm, [30.0, 31.0, 32.0])
+    assert z.pwr.unit == units.dB(units.mW)
+    assert z.nbytes == 3 * 8 * 2 + 3 * 8
+    with pytest.raises(ValueError):
+        Ssa3021xTrace.from_arrays(meta={}, freq_hz=[1.0], pwr=[0.0], pwr_unit='V')
+
+
+def test_from_csv_lazy_decompresses_once(tmp_path):
+    with open(file_bz2, 'rb') as f:
+        text = bz2.decompress(f.read()).decode('utf-8')
+    lines = text.splitlines(keepends=True)
+    i = lines.index('Trace Data\n')
+    extra = [['Trace Name,Trace %s\n' % x, 'Trace Data\n', *lines[i+1:i+752]] for x in 'BCDEF']
+    content = ''.join([*lines[:i+752], *[x for block in extra for x in block], *lines[i+752:]]).encode('utf-8')
+    file_csv = tmp_path / 'six-traces.csv.bz2'
+    file_csv.write_bytes(bz2.compress(content))
+
+    # opening reads one buffer for the header and holds no file open
+    with profiling.profiled() as profiler:
+        x = Ssa3021xTraceSet.from_csv(str(file_csv), lazy=True)
+        assert x.traces._f is None
+        traces = [trace for trace in x.traces]
+    assert len(traces) == 6 and x.traces.meta(-1)['Trace Name'] == 'Trace F'
+    assert profiler.stages['bz2'].nbytes <= len(content) + (1 << 16)
+    assert x.traces._f is None
+    with pytest.raises(IndexError):
+        x.traces.meta(6)
+    with pytest.raises(IndexError):
+        x.traces.meta(-7)
+
+    # going back to an earlier trace rewinds once, reading on from there does not decompress again
+    with profiling.profiled() as profiler:
+        y = Ssa3021xTraceSet.from_csv(str(file_csv), lazy=True)
+        y.traces[4]
+        y.traces[1]
+        y.traces[5]
+    assert profiler.stages['bz2'].nbytes <= 2 * len(content) + (1 << 16)
+    assert np.array_equal(y.traces[5].pwr_dbm, traces[5].pwr_dbm)
+
+    with Ssa3021xTraceSet.from_csv(str(file_csv), lazy=True).traces as z:
+        assert np.array_equal(z[2].pwr_dbm, traces[2].pwr_dbm)
+        assert z._f is not None
+    assert z._f is None
+    assert np.array_equal(z[3].pwr_dbm, traces[3].pwr_dbm)
+
+
+def test_read_points_checks_row_structure():
+    good = io.BytesIO(b'1,2\n3,4\n')
+    assert [list(x) for x in read_points(good, 2)] == [[1.0, 3.0], [2.0, 4.0]]
+    for text in (b'1,2,3\n4\n', b'1,2\n3;4\n', b'1,2\n3,x\n', b'1,2\n'):
+        with pytest.raises(ValueError, match='malformed or truncated'):
+            read_points(io.BytesIO(text), 2)
@@ -0,0 +1,39 @@
+import os
+import numpy as np
+from lib.frequency.band_set import BandSet
+from lib.siglent.rejection import rejection_matrix
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from lib.siglent.streaming import BandReduction, iter_trace_chunks, reduce_files
+from path_data import path_data, path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+keys = ('10m', '15m', '20m', '40m', 'nothing')
+files = [os.path.join(path_dunestar, '%s.csv.bz2' % x) for x in keys]
+
+
+def test_streaming_reduction_matches_in_memory():
+    bands = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    traces = {k: Ssa3021xTraceSet.from_csv(x).traces[0] for (k, x) in zip(keys, files)}
+    expected = rejection_matrix(traces, bands, percentiles=[10, 50, 90])
+
+    chunks = list(iter_trace_chunks(files, chunk_size=2))
+    assert [len(x) for x in chunks] == [2, 2, 1]
+    result = reduce_files(files, bands, workers=1, chunk_size=2).to_matrix(rows=keys, percentiles=[10, 50, 90])
+    assert result.rows == expected.rows and result.columns == expected.columns and result.stats == expected.stats
+    found = ~np.isnan(expected.values)
+    assert np.array_equal(found, ~np.isnan(result.values))
+    assert np.array_equal(result.get('min'), expected.get('min'), equal_nan=True)
+    assert np.array_equal(result.get('max'), expected.get('max'), equal_nan=True)
+    assert np.allclose(result.get('avg'), expected.get('avg'), equal_nan=True)
+    # percentiles come from the histogram sketch
+    assert np.allclose(result.values[:, :, 3:], expected.values[:, :, 3:], atol=0.1, equal_nan=True)
+
+    # partial reductions merge to the same result in any grouping
+    parts = [BandReduction(bands) for _ in range(3)]
+    for (i, chunk) in enumerate(iter_trace_chunks(files, chunk_size=1)):
+        parts[i % 3].update_chunk(chunk)
+    merged = parts[2].merge(parts[0]).merge(parts[1]).to_matrix(rows=keys, percentiles=[10, 50, 90])
+    assert np.allclose(merged.values, result.values, equal_nan=True)
+    # the histogram stays small next to the traces it summarizes
+    row = parts[0].rows[keys[0]]
+    assert row['hist'].dtype == np.uint32 and row['hist'].nbytes == len(bands) * 2000 * 4
@@ -0,0 +1,79 @@
+import os
+import numpy as np
+import pytest
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from lib.siglent.sweep_store import SweepStore
+from path_data import path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def test_sweep_store_running_stats_match_history():
+    trace_set = Ssa3021xTraceSet.from_csv(os.path.join(path_dunestar, 'nothing.csv.bz2'))
+    trace = trace_set.traces[0]
+    store = SweepStore.from_trace(trace, set_meta=trace_set.meta, capacity=8)
+    assert store.average_type == trace_set.meta['Average Type']
+    rng = np.random.default_rng(0)
+    sweeps = trace.pwr_dbm + rng.normal(0.0, 2.0, size=(20, len(trace)))
+    store.append(trace, timestamp=-1.0)
+    store.extend(sweeps, timestamps=range(20))
+    history = np.vstack([trace.pwr_dbm, sweeps])
+
+    assert store.count == 21 and len(store) == 8
+    assert np.allclose(store.max_hold, history.max(axis=0))
+    assert np.allclose(store.min_hold, history.min(axis=0))
+    assert np.allclose(store.average('Log Pwr'), history.mean(axis=0))
+    assert np.allclose(store.average('Pwr'), 10 * np.log10(np.mean(10 ** (history / 10), axis=0)))
+    assert np.allclose(store.average('Voltage'), 20 * np.log10(np.mean(10 ** (history / 20), axis=0)))
+    assert np.all(np.abs(store.percentile(50) - np.percentile(history, 50, axis=0)) <= 2.0)
+    assert np.array_equal(store.view('Max Hold'), store.max_hold)
+    assert np.array_equal(store.view('Clear Write'), sweeps[-1])
+
+    # only the last 8 sweeps are buffered, windows are inclusive
+    stats = store.window(start=14, stop=17, percentiles=[50])
+    expected = sweeps[14:18].astype(np.float32).astype(np.float64)
+    assert stats.count == 4
+    assert np.allclose(stats.max, expected.max(axis=0))
+    assert np.allclose(stats.avg_log, expected.mean(axis=0))
+    assert np.allclose(stats.percentiles[50], np.median(expected, axis=0))
+    assert store.window(start=0, stop=11).count == 0
+    times, buffered = store.sweeps()
+    assert np.array_equal(times, np.arange(12, 20))
+    assert buffered.shape == (8, len(trace))
+
+    with pytest.raises(ValueError):
+        store.append(sweeps[0, :10])
+
+
+def test_sweep_store_on_disk(tmp_path):
+    store = SweepStore(freq_hz=np.linspace(1e6, 2e6, 5), capacity=3, path=str(tmp_path), hist_step_db=None)
+    for t in range(5):
+        store.append(np.full(5, -float(t)), timestamp=t)
+    assert np.array_equal(np.load(os.path.join(tmp_path, 'times.npy')), [3.0, 4.0, 2.0])
+    assert store.window(start=3).count == 2
+    assert np.array_equal(store.max_hold, np.zeros(5))
+    with pytest.raises(ValueError):
+        store.percentile(90)
+
+    # reopening keeps the buffered sweeps and continues after the newest one
+    store.close()
+    assert store.closed and np.array_equal(store.max_hold, np.zeros(5))
+    with pytest.raises(ValueError):
+        store.append(np.zeros(5))
+    with SweepStore(freq_hz=np.linspace(1e6, 2e6, 5), capacity=3, path=str(tmp_path), hist_step_db=None) as store:
+        assert len(store) == 3 and np.array_equal(store.latest, np.full(5, -4.0))
+        assert np.array_equal(store.max_hold, np.full(5, -2.0))
+        store.append(np.full(5, -5.0), timestamp=5)
+        store.flush()
+        assert np.array_equal(np.load(os.path.join(tmp_path, 'times.npy')), [3.0, 4.0, 5.0])
+    assert store.closed
+    with pytest.raises(ValueError):
+        SweepStore(freq_hz=np.linspace(1e6, 2e6, 5), capacity=4, path=str(tmp_path))
+
+
+def test_sweep_store_copies_the_latest_sweep():
+    store = SweepStore(freq_hz=np.linspace(1e6, 2e6, 5), capacity=2)
+    buffer = np.full(5, -10.0)
+    store.append(buffer)
+    buffer[:] = 0.0
+    assert np.array_equal(store.view('Clear Write'), np.full(5, -10.0))
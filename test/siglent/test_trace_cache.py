@@ -0,0 +1,37 @@
+import os
+import shutil
+import numpy as np
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from lib.siglent.trace_cache import TraceCache
+from path_data import path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def test_trace_cache_roundtrip_and_invalidation(tmp_path):
+    file = str(tmp_path / '10m.csv.bz2')
+    shutil.copy(os.path.join(path_dunestar, '10m.csv.bz2'), file)
+    cache = TraceCache(path_cache=str(tmp_path / 'cache'))
+
+    expected = Ssa3021xTraceSet.from_csv(file)
+    assert cache.lookup(file) is None
+    cache.load(file)
+    x = cache.lookup(file)
+    assert x.meta == expected.meta
+    assert x.traces[0].meta == expected.traces[0].meta
+    assert np.array_equal(x.traces[0].freq, expected.traces[0].freq)
+    assert np.array_equal(x.traces[0].pwr.value, expected.traces[0].pwr.value)
+
+    # touched but unchanged content stays valid
+    os.utime(file, ns=(0, 0))
+    assert cache.lookup(file) is not None
+
+    shutil.copy(os.path.join(path_dunestar, '12m.csv.bz2'), file)
+    assert cache.lookup(file) is None
+    x = cache.load(file)
+    assert np.array_equal(x.traces[0].pwr.value, Ssa3021xTraceSet.from_csv(file).traces[0].pwr.value)
+
+    cache.clear()
+    assert cache.lookup(file) is None
+    assert TraceCache(path_cache=str(tmp_path / 'off'), enabled=False).load(file) is not None
+    assert not os.path.exists(str(tmp_path / 'off'))
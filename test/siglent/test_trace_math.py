@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pytest
+from lib.siglent.ssa3021x import Ssa3021xTrace, Ssa3021xTraceSet
+from lib.siglent.trace_math import TraceMatrix, common_grid
+from path_data import path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def test_trace_matrix_resampling_and_math():
+    traces = {x: Ssa3021xTraceSet.from_csv(os.path.join(path_dunestar, '%s.csv.bz2' % x)).traces[0]
+              for x in ('10m', '20m', 'barrel1', 'barrel2')}
+    # a coarser, narrower capture on its own axis
+    freq = np.linspace(2.0e6, 2.0e7, 101)
+    traces['coarse'] = Ssa3021xTrace.from_arrays(meta={}, freq_hz=freq, pwr=np.interp(freq, traces['10m'].freq_hz,
+                                                                                     traces['10m'].pwr_dbm))
+    matrix = TraceMatrix.from_traces(traces)
+    assert matrix.values.shape == (5, 751)
+    assert matrix.freq_hz[0] == 2.0e6 and matrix.freq_hz[-1] == 2.0e7
+    for (i, name) in enumerate(matrix.names):
+        expected = np.interp(matrix.freq_hz, traces[name].freq_hz, traces[name].pwr_dbm)
+        assert np.allclose(matrix.values[i], expected)
+
+    full = TraceMatrix.from_traces(traces, overlap=False)
+    assert np.isnan(full.row('coarse')[0]) and not np.any(np.isnan(full.row('10m')))
+    assert np.array_equal(TraceMatrix.from_traces(traces, freq_hz=traces['20m'].freq_hz).row('20m'),
+                          traces['20m'].pwr_dbm)
+
+    baseline = matrix.average(['barrel1', 'barrel2'])
+    assert np.allclose(baseline, (matrix.row('barrel1') + matrix.row('barrel2')) / 2)
+    pwr = matrix.average(['barrel1', 'barrel2'], domain='pwr')
+    assert np.all(pwr >= baseline - 1e-9)
+    relative = matrix.subtract(['barrel1', 'barrel2'])
+    assert relative.names == ('10m', '20m', 'coarse')
+    assert np.allclose(relative.row('20m'), matrix.row('20m') - baseline)
+
+    for stat in ('mean', 'rms', 'max'):
+        result = matrix.difference_matrix(stat, max_block=1000)
+        for i in range(len(matrix)):
+            for k in range(len(matrix)):
+                diff = matrix.values[i] - matrix.values[k]
+                expected = {'mean': diff.mean(), 'rms': np.sqrt(np.mean(diff**2)), 'max': np.abs(diff).max()}[stat]
+                assert result[i, k] == pytest.approx(expected, abs=1e-6)
+    with pytest.raises(ValueError):
+        matrix.difference_matrix('median')
+    with pytest.raises(ValueError):
+        common_grid([traces['10m'], Ssa3021xTrace.from_arrays({}, freq_hz=[1e9, 2e9], pwr=[0.0, 0.0])])
+    assert set(relative.to_traces()) == {'10m', '20m', 'coarse'}
+    assert (matrix.unit, relative.unit, relative.select('20m').unit) == ('dBm', 'dB', 'dB')
+    trace = relative.to_traces()['20m']
+    assert trace.pwr_unit == 'dB' and trace.relative
+    assert np.array_equal(trace.pwr_db, relative.row('20m')) and str(trace.pwr.unit) == 'dB'
+    with pytest.raises(ValueError):
+        trace.pwr_dbm
+    assert TraceMatrix.from_traces(relative.to_traces()).unit == 'dB'
+    with pytest.raises(ValueError):
+        TraceMatrix.from_traces({'20m': trace, '10m': traces['10m']})
+    with pytest.raises(KeyError, match='unrecognized trace: barrel9'):
+        matrix.subtract(['barrel1', 'barrel9'])
@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+path_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# wall-clock budget for importing lib and answering a band or trace header query, in seconds. timing depends on
+# the machine, so it is only checked on request: AC3H_TIMING_TESTS=1
+import_budget = 0.1
+
+probe = '''
+import sys, time, json
+start = time.perf_counter()
+import lib.frequency.amateur_bands as amateur_bands
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+amateur_bands.bands['20m'].low_hz
+Ssa3021xTraceSet.read_meta('data/measurements/dunestar/10m.csv.bz2')
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))
+'''
+
+
+def run_probe(code: str = probe) -> dict:
+    return json.loads(subprocess.run([sys.executable, '-c', code], cwd=path_root, check=True,
+                                     capture_output=True, text=True).stdout)
+
+
+def test_import_avoids_heavy_modules():
+    modules = run_probe()['modules']
+    for heavy in ('astropy', 'numpy', 'sympy', 'matplotlib'):
+        assert heavy not in modules
+
+
+
+def test_rejection_import_defers_astropy():
+    # the rejection path only needs astropy once it builds quantities
+    code = 'import sys, json\nimport lib.siglent.rejection\nprint(json.dumps({"modules": sorted(sys.modules)}))'
+    assert 'astropy' not in run_probe(code)['modules']
+
+
+@pytest.mark.skipif(not os.environ.get('AC3H_TIMING_TESTS'), reason='timing checks run with AC3H_TIMING_TESTS=1')
+def test_import_time_budget():
+    assert min(run_probe()['elapsed'] for _ in range(3)) < import_budget
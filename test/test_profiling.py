@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import shutil
+import subprocess
+from astropy import units as u
+from lib import profiling
+from lib.frequency.band import FrequencyBand
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from path_data import path_root, path_data_measurements
+
+file = os.path.join(path_data_measurements, 'dunestar', '10m.csv.bz2')
+
+
+def test_profiled_records_stages():
+    assert profiling.current() is None
+    with profiling.profiled() as profiler:
+        trace_set = Ssa3021xTraceSet.from_csv(file)
+        trace_set.traces[0].freq_in(u.MHz)
+        FrequencyBand.from_hz(1e6, 5e6).intersect(FrequencyBand.from_hz(2e6, 7e6))
+    assert profiling.current() is None
+    stages = profiler.to_dict()['stages']
+    for stage in ('bz2', 'line_split.header', 'line_split.points', 'meta_dict', 'trace_units', 'band_intersect'):
+        assert stages[stage]['count'] > 0 and stages[stage]['seconds'] >= 0
+    assert stages['bz2']['bytes'] >= stages['line_split.points']['bytes'] > 0
+    assert profiler.summary().splitlines()[0].split()[0] == 'stage'
+
+    # nothing is recorded outside the block
+    Ssa3021xTraceSet.from_csv(file)
+    assert profiler.to_dict()['stages'] == stages
+    assert profiling.Profiler().merge(profiler).merge(profiler).stages['meta_dict'].count == \
+        2 * stages['meta_dict']['count']
+
+
+def test_profile_from_environment(tmp_path):
+    dump = str(tmp_path / 'profile.json')
+    probe = 'from lib.siglent.ssa3021x import Ssa3021xTraceSet; Ssa3021xTraceSet.read_meta(%r)' % file
+    env = dict(os.environ, **{profiling.ENV_VAR: dump})
+    env.pop(profiling.OWNER_ENV_VAR, None)
+    subprocess.run([sys.executable, '-c', probe], cwd=path_root, check=True, env=env)
+    with open(dump, 'r') as f:
+        stages = json.load(f)['stages']
+    assert stages['meta_dict']['count'] >= 1 and stages['bz2']['bytes'] > 0
+
+
+def test_profiled_collects_worker_stats(tmp_path):
+    from lib.siglent.loader import load_trace_dir
+    from lib.siglent.streaming import reduce_files
+    from lib.frequency.band_set import BandSet
+    for key in ('10m', '12m', '15m', 'nothing'):
+        shutil.copy(os.path.join(path_data_measurements, 'dunestar', '%s.csv.bz2' % key), str(tmp_path))
+    with profiling.profiled() as serial:
+        load_trace_dir(str(tmp_path), workers=1)
+    with profiling.profiled() as parallel:
+        load_trace_dir(str(tmp_path), workers=2)
+    for stage in ('bz2', 'meta_dict', 'line_split.points'):
+        assert parallel.stages[stage].count == serial.stages[stage].count
+        assert parallel.stages[stage].nbytes == serial.stages[stage].nbytes
+
+    files = sorted(str(x) for x in tmp_path.iterdir())
+    bands = BandSet(names=['a'], low_hz=[1e6], high_hz=[30e6])
+    with profiling.profiled() as profiler:
+        reduce_files(files, bands, workers=2)
+    assert profiler.stages['line_split.points'].count == 4
+
+
+def test_profile_from_environment_includes_workers(tmp_path):
+    dump = str(tmp_path / 'profile.json')
+    probe = ('from lib.siglent.loader import load_trace_dir; '
+             'load_trace_dir(%r, workers=2)' % os.path.join(path_data_measurements, 'dunestar'))
+    env = dict(os.environ, **{profiling.ENV_VAR: dump})
+    env.pop(profiling.OWNER_ENV_VAR, None)
+    subprocess.run([sys.executable, '-c', probe], cwd=path_root, check=True, env=env)
+    with open(dump, 'r') as f:
+        stages = json.load(f)['stages']
+    assert stages['line_split.points']['count'] == len([x for x in os.listdir(
+        os.path.join(path_data_measurements, 'dunestar')) if x.endswith('.bz2')])
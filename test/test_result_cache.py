@@ -0,0 +1,117 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from lib.frequency.band_set import BandSet
+from lib.frequency.harmonics import cached_harmonic_overlaps, harmonic_overlaps
+from lib.result_cache import ResultCache, fingerprint
+from lib.siglent.rejection import FIRST_TRACE, _first_trace, cached_rejection_matrix, rejection_matrix
+from lib.siglent.ssa3021x import Ssa3021xTraceSet
+from path_data import path_data, path_data_measurements
+
+path_dunestar = os.path.join(path_data_measurements, 'dunestar')
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    with ResultCache(path_cache=str(tmp_path), max_bytes=3500) as cache:
+        for key in ('a', 'b', 'c'):
+            cache.put(key, {'x': np.zeros(100)})
+        assert cache.get('a') is not None
+        cache.put('d', {'x': np.zeros(100)})
+        # b was used least recently
+        assert cache.get('b') is None
+        assert cache.get('a') is not None and cache.get('d') is not None
+        assert cache.nbytes <= 3500
+        # nothing is written to the index before the flush
+        assert not os.path.exists(os.path.join(str(tmp_path), 'index.json'))
+    assert ResultCache(path_cache=str(tmp_path)).get('d') is not None
+    assert sorted(x for x in os.listdir(str(tmp_path)) if 'tmp' in x) == []
+
+    assert fingerprint(np.arange(3)) != fingerprint(np.arange(3.0))
+    assert fingerprint({'a': 1, 'b': 2}) == fingerprint({'b': 2, 'a': 1})
+
+
+def test_result_cache_index_merges_concurrent_runs(tmp_path):
+    (first, second) = (ResultCache(path_cache=str(tmp_path)), ResultCache(path_cache=str(tmp_path)))
+    first.put('a', {'x': np.zeros(10)})
+    first.flush()
+    assert second.get('a') is not None
+    second.put('b', {'x': np.ones(10)})
+    second.flush()
+    first.put('c', {'x': np.ones(10)})
+    first.flush()
+    assert sorted(ResultCache(path_cache=str(tmp_path))._load_index()['entries']) == ['a', 'b', 'c']
+
+    # a hit is written only on flush, with the later use kept
+    mtime = os.stat(os.path.join(str(tmp_path), 'index.json')).st_mtime_ns
+    with ResultCache(path_cache=str(tmp_path)) as cache:
+        assert cache.get('b') is not None
+        used = cache._load_index()['entries']['b']['last_used']
+        assert os.stat(os.path.join(str(tmp_path), 'index.json')).st_mtime_ns == mtime
+    assert ResultCache(path_cache=str(tmp_path))._load_index()['entries']['b']['last_used'] == used
+
+
+def test_cached_rejection_matrix_recomputes_only_what_changed(tmp_path):
+    for key in ('10m', '20m', 'nothing'):
+        shutil.copy(os.path.join(path_dunestar, '%s.csv.bz2' % key), str(tmp_path))
+    files = {k: os.path.join(str(tmp_path), '%s.csv.bz2' % k) for k in ('10m', '20m', 'nothing')}
+    bands = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    loaded = []
+
+    def load(file):
+        loaded.append(os.path.basename(file))
+        return _first_trace(file)
+
+    def cached(load_key=FIRST_TRACE):
+        return cached_rejection_matrix(files, bands, cache, percentiles=[50], load=load, load_key=load_key)
+
+    traces = {k: Ssa3021xTraceSet.from_csv(x).traces[0] for (k, x) in files.items()}
+    expected = rejection_matrix(traces, bands, percentiles=[50])
+    cache = ResultCache(path_cache=str(tmp_path / 'cache'))
+    result = cached_rejection_matrix(files, bands[:5], cache, percentiles=[50], load=load, load_key=FIRST_TRACE)
+    assert np.array_equal(result.values, expected.values[:, :5], equal_nan=True)
+    assert len(loaded) == 3
+
+    # a new column loads every trace once for that column only; a repeat loads nothing
+    loaded.clear()
+    result = cached()
+    assert np.array_equal(result.values, expected.values, equal_nan=True)
+    assert result.columns == expected.columns and result.rows == expected.rows
+    assert len(loaded) == 3
+    loaded.clear()
+    cached()
+    assert loaded == []
+    # the default loader shares the rows; a loader under another key, or without one, does not
+    cached_rejection_matrix(files, bands, cache, percentiles=[50])
+    assert cache.misses == 3
+    cached('baseline')
+    assert len(loaded) == 3
+    with pytest.raises(ValueError):
+        cached_rejection_matrix(files, bands, cache, percentiles=[50], load=load)
+
+    # a changed capture recomputes its own row
+    loaded.clear()
+    shutil.copy(os.path.join(path_dunestar, '40m.csv.bz2'), files['20m'])
+    result = cached()
+    assert loaded == ['20m.csv.bz2']
+    expected = rejection_matrix({'20m': Ssa3021xTraceSet.from_csv(files['20m']).traces[0]}, bands, percentiles=[50])
+    assert np.array_equal(result.values[1], expected.values[0], equal_nan=True)
+
+    # a cold run writes the index once, on flush
+    writes = []
+    cache = ResultCache(path_cache=str(tmp_path / 'cold'))
+    cache._write_index = lambda: writes.append(1)
+    cached()
+    assert writes == []
+    cache.flush()
+    assert writes == [1]
+
+def test_cached_harmonic_overlaps(tmp_path):
+    bands = BandSet.from_json(os.path.join(path_data, 'bands.json'))
+    (rx, tx) = (bands, bands[:6])
+    expected = harmonic_overlaps(rx, tx, range(2, 6))
+    cache = ResultCache(path_cache=str(tmp_path))
+    for _ in range(2):
+        result = cached_harmonic_overlaps(rx, tx, range(2, 6), cache=cache)
+        assert result.to_dict() == expected.to_dict()
+    assert (cache.hits, cache.misses) == (1, 1)